@@ -1,8 +1,10 @@
 import datamapper.errors as errors
 from datamapper.changeset import Changeset
 from datamapper.model import Associations, BelongsTo, HasMany, HasOne, Model
-from datamapper.query import Query, call, raw
+from datamapper.multi import Multi
+from datamapper.query import Query, agg, call, dec, expr, inc, raw, ref
 from datamapper.repo import Repo
+from datamapper.transaction import Retry
 
 __version__ = "0.1.0"
 
@@ -13,9 +15,16 @@ __all__ = [
     "HasMany",
     "HasOne",
     "Model",
+    "Multi",
     "Query",
     "Repo",
+    "Retry",
+    "agg",
     "call",
+    "dec",
     "errors",
+    "expr",
+    "inc",
     "raw",
+    "ref",
 ]
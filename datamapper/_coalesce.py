@@ -0,0 +1,83 @@
+import asyncio
+from contextvars import Context
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, List, Set, Tuple
+
+from sqlalchemy import Table
+
+from datamapper.changeset import Changeset
+
+Key = Tuple[Table, FrozenSet[str]]
+Pending = Tuple[Changeset, asyncio.Future]
+InsertRows = Callable[[List[Changeset]], Awaitable[List[Any]]]
+
+
+class InsertCoalescer:
+    """
+    Collects inserts that arrive within a short window and writes them
+    together with `insert_rows`.
+
+    Inserts are grouped by table and by the columns that they set. A batch
+    is written when the window elapses or when it reaches `size` rows. When
+    a batch fails, each row is retried on its own so that only the callers
+    whose rows failed receive the error. `insert_rows` must write each call
+    atomically, so that a failed batch leaves nothing behind.
+    """
+
+    def __init__(self, insert_rows: InsertRows, window: float, size: int):
+        self.insert_rows = insert_rows
+        self.window = window
+        self.size = size
+        self.batches: Dict[Key, List[Pending]] = {}
+        self.timers: Dict[Key, asyncio.TimerHandle] = {}
+        self.tasks: Set[asyncio.Task] = set()
+
+    async def insert(self, changeset: Changeset) -> Any:
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        key = (changeset.data.__table__, frozenset(changeset.changes))
+
+        batch = self.batches.setdefault(key, [])
+        batch.append((changeset, future))
+
+        # Batches are written outside of the caller's context, so that they
+        # don't share the caller's connection.
+        if len(batch) >= self.size:
+            Context().run(self.__flush, key)
+        elif len(batch) == 1:
+            timer = loop.call_later(self.window, self.__flush, key, context=Context())
+            self.timers[key] = timer
+
+        return await future
+
+    def __flush(self, key: Key) -> None:
+        batch = self.batches.pop(key, None)
+        timer = self.timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        if batch:
+            task = asyncio.ensure_future(self.__write(batch))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def __write(self, batch: List[Pending]) -> None:
+        try:
+            ids = await self.insert_rows([changeset for changeset, _ in batch])
+        except Exception as error:
+            if len(batch) == 1:
+                _resolve(batch[0][1], error=error)
+            else:
+                for pending in batch:
+                    await self.__write([pending])
+            return
+
+        for (_, future), record_id in zip(batch, ids):
+            _resolve(future, result=record_id)
+
+
+def _resolve(future: asyncio.Future, result: Any = None, error: Any = None) -> None:
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
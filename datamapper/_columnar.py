@@ -0,0 +1,65 @@
+from array import array
+from datetime import date, datetime
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Type
+
+from sqlalchemy.types import TypeEngine
+
+try:
+    import numpy
+
+    HAS_NUMPY = True
+except ImportError:  # pragma: no cover
+    HAS_NUMPY = False
+
+NUMPY_DTYPES: Dict[Any, str] = {
+    bool: "bool",
+    int: "int64",
+    float: "float64",
+    datetime: "datetime64[us]",
+    date: "datetime64[D]",
+}
+
+ARRAY_TYPECODES: Dict[Any, str] = {int: "q", float: "d"}
+
+
+def to_columns(
+    names: List[str], types: List[TypeEngine], rows: Sequence[Mapping]
+) -> Dict[str, Any]:
+    """
+    Transposes rows into a mapping of column name to array of values.
+
+    When NumPy is installed, each column is a `numpy.ndarray`. Otherwise,
+    numeric columns are an `array.array` and the others are a `list`.
+    """
+    values = list(zip(*[row.values() for row in rows]))
+    if not values:
+        values = [() for _ in names]
+
+    return {
+        name: to_array(column, _python_type(type_))
+        for name, type_, column in zip(names, types, values)
+    }
+
+
+def to_array(values: Sequence, python_type: Optional[Type]) -> Any:
+    """
+    Convert a column of values to the most specific array type available.
+
+    Columns that contain `NULL` can't be represented by a typed array, so
+    they fall back to generic objects.
+    """
+    nullable = any(value is None for value in values)
+
+    if HAS_NUMPY:
+        dtype = None if nullable else NUMPY_DTYPES.get(python_type)
+        return numpy.array(values, dtype=dtype or object)
+
+    typecode = None if nullable else ARRAY_TYPECODES.get(python_type)
+    return array(typecode, values) if typecode else list(values)
+
+
+def _python_type(type_: TypeEngine) -> Optional[Type]:
+    try:
+        return type_.python_type
+    except NotImplementedError:
+        return None
@@ -1,4 +1,4 @@
-from typing import List, TypeVar, Union
+from typing import Any, List, Mapping, TypeVar, Union
 
 from sqlalchemy import Column, Table
 from sqlalchemy.sql.expression import Alias
@@ -48,6 +48,17 @@ def to_tree(paths: List[str]) -> dict:
     return result
 
 
+def get_value(record: Any, name: str) -> Any:
+    """
+    Read a field from a query result, which is either a mapping or an
+    object with attributes.
+    """
+
+    if isinstance(record, Mapping):
+        return record[name]
+    return getattr(record, name)
+
+
 def get_column(table: Union[Table, Alias], name: str) -> Column:
     """
     Retrieve a column from a table or table alias.
@@ -50,25 +50,15 @@ class Changeset(Generic[Data]):
         Applies `params` as changes to the changeset, provided that their keys are in `permitted` and their types are correct.
         """
         self.empty_values = set(empty_values)
-        self.params = {
-            k: v for (k, v) in params.items() if self._keep_param(k, v, set(permitted))
-        }
-        (changes, errors) = validators.validate_types(
-            params=self.params,
-            types=self._wrapped_data.types,
+        (self.params, self.changes, self.errors) = self._wrapped_data.schema.cast(
+            params=params,
+            permitted=frozenset(permitted),
             data=self._wrapped_data.attributes,
+            empty_values=self.empty_values,
+            unloaded=self._wrapped_data.unloaded,
         )
-        self.changes = changes
-        self.errors = errors
         return self
 
-    def _keep_param(self, key: str, value: Any, permitted: Iterable[str]) -> bool:
-        return (
-            key in permitted
-            and value != self._wrapped_data.get(key)
-            and value not in self.empty_values
-        )
-
     def put_assoc(self, name: str, value: Any) -> Changeset:
         """
         Put an association as a change on the changeset.
@@ -187,8 +177,7 @@ class Changeset(Generic[Data]):
             return self
 
     def add_error(self, field: str, error: str) -> Changeset:
-        existing_errors: List[str] = self.errors.get(field, [])
-        self.errors[field] = [*existing_errors, error]
+        self.errors.setdefault(field, []).append(error)
         return self
 
     def pipe(self, f: Callable[[Changeset], Changeset]) -> Changeset:
@@ -1,9 +1,8 @@
 from __future__ import annotations
 
-from typing import Any, Dict, Generic, Optional, Tuple, Type
-
-from sqlalchemy.types import TypeEngine
+from typing import AbstractSet, Any, Generic, Optional, Tuple
 
+from datamapper.changeset.schema import ChangesetSchema, model_schema
 from datamapper.changeset.types import Data
 from datamapper.changeset.utils import dict_merge
 from datamapper.model import Association, Model
@@ -26,9 +25,13 @@ class ChangesetDataWrapper(Generic[Data]):
         raise NotImplementedError()  # pragma: no cover
 
     @property
-    def types(self) -> Dict[str, Type]:
+    def schema(self) -> ChangesetSchema:
         raise NotImplementedError()  # pragma: no cover
 
+    @property
+    def unloaded(self) -> AbstractSet[str]:
+        return frozenset()
+
     def __repr__(self) -> str:
         return self.data.__repr__()  # pragma: no cover
 
@@ -36,7 +39,7 @@ class ChangesetDataWrapper(Generic[Data]):
 class DictChangesetDataWrapper(ChangesetDataWrapper[dict]):
     def __init__(self, data: Tuple[dict, dict]):
         self.data: dict = data[0]
-        self._types: dict = data[1]
+        self._schema = ChangesetSchema(data[1])
 
     def apply_changes(self, changes: dict) -> dict:
         return dict_merge(self.data, changes)
@@ -49,8 +52,8 @@ class DictChangesetDataWrapper(ChangesetDataWrapper[dict]):
         return self.data  # pragma: no cover
 
     @property
-    def types(self) -> Dict[str, Type]:
-        return self._types
+    def schema(self) -> ChangesetSchema:
+        return self._schema
 
 
 class ModelChangesetDataWrapper(ChangesetDataWrapper[Model]):
@@ -59,7 +62,9 @@ class ModelChangesetDataWrapper(ChangesetDataWrapper[Model]):
 
     def apply_changes(self, changes: dict) -> Model:
         attrs = {**self.data.attributes, **changes}
-        return type(self.data)(**attrs)
+        model = type(self.data)(**attrs)
+        model._copy_state(self.data)
+        return model
 
     def association(self, field: str) -> Association:
         return self.data.association(field)
@@ -69,10 +74,9 @@ class ModelChangesetDataWrapper(ChangesetDataWrapper[Model]):
         return self.data.attributes  # pragma: no cover
 
     @property
-    def types(self) -> dict:
-        columns: dict = self.data.__table__.columns
-        return {k: self._to_python_type(v.type) for (k, v) in columns.items()}
+    def schema(self) -> ChangesetSchema:
+        return model_schema(type(self.data))
 
-    @classmethod
-    def _to_python_type(cls, type_: TypeEngine) -> Type:
-        return type_.python_type
+    @property
+    def unloaded(self) -> AbstractSet[str]:
+        return self.data._unloaded_columns()
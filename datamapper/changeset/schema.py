@@ -0,0 +1,73 @@
+from typing import AbstractSet, Any, Dict, Mapping, Tuple, Type
+
+from datamapper.changeset.validators import human_type_name
+from datamapper.model import Model
+
+TypeCheck = Tuple[Type, str]
+
+
+class ChangesetSchema:
+    """
+    The types of the fields that a changeset can cast, along with the error
+    message for each type. The schema of a model is built once and cached,
+    see `model_schema`.
+    """
+
+    def __init__(self, types: Mapping[str, Type]):
+        self.types = dict(types)
+        self.checks: Dict[str, TypeCheck] = {
+            key: (type_, f"Not a valid {human_type_name(type_.__name__)}.")
+            for key, type_ in self.types.items()
+        }
+
+    def cast(
+        self,
+        params: Mapping[str, Any],
+        permitted: AbstractSet[str],
+        data: Mapping[str, Any],
+        empty_values: AbstractSet[Any],
+        unloaded: AbstractSet[str] = frozenset(),
+    ) -> Tuple[dict, dict, dict]:
+        """
+        Filters and type checks `params` in a single pass. Returns the params
+        that were kept, the changes and the errors. Columns in `unloaded` have
+        no known value, so any value given for them is a change.
+        """
+        checks = self.checks
+        kept: dict = {}
+        changes: dict = {}
+        errors: dict = {}
+
+        for key, value in params.items():
+            if key not in permitted or value in empty_values:
+                continue
+            if key not in unloaded and value == data.get(key):
+                continue
+
+            kept[key] = value
+            check = checks.get(key)
+            if check is None:
+                continue
+
+            type_, message = check
+            if value is None or isinstance(value, type_):
+                changes[key] = value
+            else:
+                errors[key] = [message]
+
+        return (kept, changes, errors)
+
+
+_model_schemas: Dict[Type[Model], ChangesetSchema] = {}
+
+
+def model_schema(model: Type[Model]) -> ChangesetSchema:
+    """
+    Returns the schema for the columns of a model, building it on first use.
+    """
+    schema = _model_schemas.get(model)
+    if schema is None:
+        columns = model.__table__.columns
+        types = {key: column.type.python_type for key, column in columns.items()}
+        schema = _model_schemas[model] = ChangesetSchema(types)
+    return schema
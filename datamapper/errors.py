@@ -13,11 +13,19 @@ __all__ = [
     "NoResultsError",
     "MultipleResultsError",
     "NotLoadedError",
+    "ColumnNotLoadedError",
     "MissingJoinError",
     "ConflictingAliasError",
     "InvalidExpressionError",
     "InvalidSelectError",
+    "InvalidAggregateError",
+    "InvalidLockError",
     "InvalidChangesetError",
+    "InvalidCursorError",
+    "InvalidQueryError",
+    "ConflictingStepError",
+    "MultiStepError",
+    "MissingIndexWarning",
 ]
 
 
@@ -55,6 +63,11 @@ class NotLoadedError(Error):
         super().__init__(f"association '{name}' is not loaded for model '{model}'")
 
 
+class ColumnNotLoadedError(Error):
+    def __init__(self, model: str, name: str):
+        super().__init__(f"column '{name}' is not loaded for model '{model}'")
+
+
 class MissingJoinError(Error):
     def __init__(self, parent: str, child: str):
         super().__init__(f"can't join '{child}' without joining '{parent}'")
@@ -75,6 +88,16 @@ class InvalidSelectError(Error):
         super().__init__("expected at least one select expression but got none")
 
 
+class InvalidAggregateError(Error):
+    def __init__(self, name: str):
+        super().__init__(f"aggregate function '{name}' is not supported")
+
+
+class InvalidLockError(Error):
+    def __init__(self, mode: str):
+        super().__init__(f"lock mode '{mode}' is not supported")
+
+
 class InvalidChangesetError(Error):
     def __init__(self, action: str, changeset: Changeset):
         super().__init__(
@@ -83,3 +106,32 @@ class InvalidChangesetError(Error):
 
         self.action = action
         self.changeset = changeset
+
+
+class InvalidCursorError(Error):
+    def __init__(self, reason: str) -> None:
+        super().__init__(f"invalid cursor: {reason}")
+
+
+class InvalidQueryError(Error):
+    def __init__(self, reason: str) -> None:
+        super().__init__(f"invalid query: {reason}")
+
+
+class ConflictingStepError(Error):
+    def __init__(self, name: str):
+        super().__init__(f"step '{name}' conflicts with an existing step")
+
+
+class MultiStepError(Error):
+    def __init__(self, step: str, error: Exception, results: dict):
+        super().__init__(f"step '{step}' failed: {error}")
+
+        self.step = step
+        self.error = error
+        self.results = results
+
+
+class MissingIndexWarning(UserWarning):
+    def __init__(self, table: str, name: str):
+        super().__init__(f"column '{name}' is not indexed for table '{table}'")
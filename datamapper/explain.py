@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import json
+import re
+import warnings
+from typing import Any, Iterator, List, Mapping, Optional, Sequence
+
+from sqlalchemy import Column, Table, UniqueConstraint
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import Alias, ClauseElement, Executable
+
+from datamapper.errors import MissingIndexWarning
+
+MYSQL_LINE = re.compile(
+    r"^(?P<indent>\s*)-> (?P<detail>.*?)(?:\s{2}\((?P<stats>(?:cost|actual).*))?$"
+)
+MYSQL_COST = re.compile(r"cost=(?P<cost>[\d.e+]+)")
+MYSQL_ROWS = re.compile(r"^(?!actual)[^)]*\brows=(?P<rows>[\d.e+]+)")
+MYSQL_ACTUAL = re.compile(r"actual time=\S+ rows=(?P<rows>[\d.e+]+)")
+MYSQL_NODE = re.compile(r"^(?P<node_type>.*?)(?::| on |$)")
+MYSQL_RELATION = re.compile(r" on (?P<relation>\S+)")
+MYSQL_INDEX = re.compile(r" using (?P<index>\S+)")
+SQLITE_NODE = re.compile(r"^(?P<node_type>SCAN|SEARCH)(?: TABLE)? (?P<relation>\S+)")
+SQLITE_INDEX = re.compile(r"USING (?:COVERING )?(?:INDEX (?P<index>\S+)|(?P<pk>.*KEY))")
+
+
+class Explain(Executable, ClauseElement):
+    """
+    Wraps a statement in the dialect's `EXPLAIN` command.
+    """
+
+    def __init__(self, statement: ClauseElement, analyze: bool = False):
+        self.statement = statement
+        self.analyze = analyze
+
+
+class Plan:
+    """
+    A single node of a normalized query plan.
+
+    The attributes that a database doesn't report are `None`. For example,
+    SQLite doesn't report row estimates or costs.
+    """
+
+    def __init__(
+        self,
+        node_type: str,
+        relation: Optional[str] = None,
+        index: Optional[str] = None,
+        rows: Optional[float] = None,
+        actual_rows: Optional[float] = None,
+        cost: Optional[float] = None,
+        detail: Optional[str] = None,
+        children: Optional[List[Plan]] = None,
+    ):
+        self.node_type = node_type
+        self.relation = relation
+        self.index = index
+        self.rows = rows
+        self.actual_rows = actual_rows
+        self.cost = cost
+        self.detail = detail
+        self.children = children or []
+
+    def walk(self) -> Iterator[Plan]:
+        """
+        Iterate over this node and all of its descendants, depth first.
+
+        Example::
+
+            plan = await repo.explain(Query(User).where(id=1))
+            assert all(node.index for node in plan.walk() if node.relation)
+        """
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def __repr__(self) -> str:  # pragma: no cover
+        klass = self.__class__.__name__
+        return f'<{klass} node_type="{self.node_type}" index={self.index}>'
+
+
+def parse_plan(dialect: str, rows: Sequence[Mapping]) -> Plan:
+    """
+    Converts the rows returned by `EXPLAIN` into a `Plan`.
+    """
+    if dialect == "postgresql":
+        return parse_postgresql(list(rows[0].values())[0])
+    if dialect == "mysql":
+        return parse_mysql(list(rows[0].values())[0])
+    if dialect == "sqlite":
+        return parse_sqlite([tuple(row.values()) for row in rows])
+    raise NotImplementedError(f"EXPLAIN is not supported for '{dialect}'")
+
+
+def parse_postgresql(value: Any) -> Plan:
+    """
+    Parse the output of `EXPLAIN (FORMAT JSON)`.
+    """
+    if isinstance(value, str):
+        value = json.loads(value)
+    return _postgresql_node(value[0]["Plan"])
+
+
+def _postgresql_node(node: dict) -> Plan:
+    return Plan(
+        node_type=node["Node Type"],
+        relation=node.get("Relation Name"),
+        index=node.get("Index Name"),
+        rows=node.get("Plan Rows"),
+        actual_rows=node.get("Actual Rows"),
+        cost=node.get("Total Cost"),
+        children=[_postgresql_node(child) for child in node.get("Plans", [])],
+    )
+
+
+def parse_mysql(value: str) -> Plan:
+    """
+    Parse the output of `EXPLAIN FORMAT=TREE` or `EXPLAIN ANALYZE`.
+    """
+    root = Plan("Query Plan")
+    stack = [(-1, root)]
+
+    for line in value.splitlines():
+        match = MYSQL_LINE.match(line)
+        if match is None:
+            continue
+
+        indent = len(match.group("indent"))
+        node = _mysql_node(match.group("detail"), match.group("stats") or "")
+
+        while stack[-1][0] >= indent:
+            stack.pop()
+
+        stack[-1][1].children.append(node)
+        stack.append((indent, node))
+
+    return _unwrap(root)
+
+
+def _mysql_node(detail: str, stats: str) -> Plan:
+    return Plan(
+        node_type=_group(MYSQL_NODE, detail, "node_type") or detail,
+        relation=_group(MYSQL_RELATION, detail, "relation"),
+        index=_group(MYSQL_INDEX, detail, "index"),
+        rows=_number(_group(MYSQL_ROWS, stats, "rows")),
+        actual_rows=_number(_group(MYSQL_ACTUAL, stats, "rows")),
+        cost=_number(_group(MYSQL_COST, stats, "cost")),
+        detail=detail,
+    )
+
+
+def parse_sqlite(rows: Sequence[tuple]) -> Plan:
+    """
+    Parse the output of `EXPLAIN QUERY PLAN`.
+    """
+    root = Plan("Query Plan")
+    nodes = {0: root}
+
+    for node_id, parent_id, _, detail in rows:
+        node = _sqlite_node(detail)
+        nodes.get(parent_id, root).children.append(node)
+        nodes[node_id] = node
+
+    return _unwrap(root)
+
+
+def _sqlite_node(detail: str) -> Plan:
+    index_match = SQLITE_INDEX.search(detail)
+    index = None
+    if index_match is not None:
+        index = index_match.group("index") or index_match.group("pk")
+
+    return Plan(
+        node_type=_group(SQLITE_NODE, detail, "node_type") or detail,
+        relation=_group(SQLITE_NODE, detail, "relation"),
+        index=index,
+        detail=detail,
+    )
+
+
+def check_indexes(columns: List[Column]) -> None:
+    """
+    Warns about each column that isn't the leading column of an index,
+    unique constraint or primary key in the table's metadata.
+    """
+    for column in columns:
+        table = column.table
+        if isinstance(table, Alias):
+            table = table.original
+
+        if not is_indexed(table, column.name):
+            warnings.warn(MissingIndexWarning(table.name, column.name), stacklevel=3)
+
+
+def is_indexed(table: Table, name: str) -> bool:
+    """
+    Check if a column is the leading column of an index, unique constraint or
+    primary key.
+    """
+    candidates = [table.primary_key, *table.indexes]
+    candidates += [c for c in table.constraints if isinstance(c, UniqueConstraint)]
+
+    for candidate in candidates:
+        columns = list(candidate.columns)
+        if columns and columns[0].name == name:
+            return True
+
+    return False
+
+
+def _unwrap(root: Plan) -> Plan:
+    return root.children[0] if len(root.children) == 1 else root
+
+
+def _group(pattern: re.Pattern, value: str, group: str) -> Optional[str]:
+    match = pattern.search(value)
+    return match.group(group) if match else None
+
+
+def _number(value: Optional[str]) -> Optional[float]:
+    return float(value) if value is not None else None
+
+
+def _compile_statement(element: Explain, compiler: Any, **kw: Any) -> str:
+    sql = compiler.process(element.statement, **kw)
+    # The rows returned by EXPLAIN don't match the columns of the statement.
+    compiler._result_columns = []
+    return sql
+
+
+@compiles(Explain)
+def _compile_explain(element: Explain, compiler: Any, **kw: Any) -> str:
+    prefix = "EXPLAIN ANALYZE" if element.analyze else "EXPLAIN"
+    return f"{prefix} {_compile_statement(element, compiler, **kw)}"
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain_postgresql(element: Explain, compiler: Any, **kw: Any) -> str:
+    options = "ANALYZE, FORMAT JSON" if element.analyze else "FORMAT JSON"
+    return f"EXPLAIN ({options}) {_compile_statement(element, compiler, **kw)}"
+
+
+@compiles(Explain, "mysql")
+def _compile_explain_mysql(element: Explain, compiler: Any, **kw: Any) -> str:
+    prefix = "EXPLAIN ANALYZE" if element.analyze else "EXPLAIN FORMAT=TREE"
+    return f"{prefix} {_compile_statement(element, compiler, **kw)}"
+
+
+@compiles(Explain, "sqlite")
+def _compile_explain_sqlite(element: Explain, compiler: Any, **kw: Any) -> str:
+    return f"EXPLAIN QUERY PLAN {_compile_statement(element, compiler, **kw)}"
@@ -2,13 +2,17 @@ from __future__ import annotations
 
 import enum
 import importlib
-from typing import Any, Iterator, Mapping, Type, Union, cast
+from typing import Any, FrozenSet, Iterator, Mapping, Optional, Tuple, Type, Union, cast
 
 from sqlalchemy import Table
 from sqlalchemy.ext.hybrid import hybrid_method
 
 import datamapper.query as query
-from datamapper.errors import NotLoadedError, UnknownAssociationError
+from datamapper.errors import (
+    ColumnNotLoadedError,
+    NotLoadedError,
+    UnknownAssociationError,
+)
 
 
 class Associations(Mapping[str, "Association"]):
@@ -28,12 +32,60 @@ class Associations(Mapping[str, "Association"]):
 class Model:
     __table__: Table
     __associations__: Associations = Associations()
+    __deferred__: Tuple[str, ...] = ()
 
     @classmethod
-    def _deserialize(cls, row: Mapping) -> Model:
+    def _deserialize(
+        cls, row: Mapping, lazy: bool = False, unloaded: FrozenSet[str] = frozenset()
+    ) -> Model:
+        """
+        Builds an instance from a database row. Columns in `unloaded` were
+        not selected, so reading them raises `ColumnNotLoadedError`.
+        """
+        if lazy:
+            instance = cls.__from_row(row)
+        else:
+            names = cls.__table__.columns.keys()
+            values = {name: row.get(name) for name in names if name not in unloaded}
+            instance = cls(**values)
+            instance.__loaded = row
+
+        instance.__unloaded = unloaded
+        return instance
+
+    @classmethod
+    def __from_row(cls, row: Mapping) -> Model:
+        """
+        Builds an instance that reads each column from the row the first
+        time it is accessed. The row is copied in full as soon as the
+        instance's attributes are needed as a whole or changed.
+        """
+        instance = cls.__new__(cls)
+        instance.__attributes = {}
+        instance.__loaded_associations = {}
+        instance.__row = row
+        instance.__loaded = row
+        return instance
+
+    @classmethod
+    def _restore(
+        cls,
+        values: tuple,
+        associations: Optional[dict],
+        loaded: Optional[tuple] = None,
+        unloaded: FrozenSet[str] = frozenset(),
+    ) -> Model:
+        """
+        Rebuilds an instance from the compact form created by `__reduce__`.
+        """
         names = cls.__table__.columns.keys()
-        values = {name: row.get(name) for name in names}
-        return cls(**values)
+        values = {k: v for k, v in zip(names, values) if k not in unloaded}
+        instance = cls(**values)
+        instance.__loaded_associations.update(associations or {})
+        instance.__unloaded = unloaded
+        if loaded is not None:
+            instance.__loaded = dict(zip(names, loaded))
+        return instance
 
     @classmethod
     def association(cls, name: str) -> Association:
@@ -53,8 +105,11 @@ class Model:
         columns = self.__class__.__table__.columns
         associations = self.__class__.__associations__
 
-        self.attributes: dict = {}
+        self.__attributes: dict = {}
         self.__loaded_associations: dict = {}
+        self.__row: Optional[Mapping] = None
+        self.__loaded: Optional[Mapping] = None
+        self.__unloaded: FrozenSet[str] = frozenset()
 
         for key, value in attributes.items():
             if key in columns or key in associations:
@@ -68,7 +123,13 @@ class Model:
         loaded = self.__loaded_associations
 
         if key in columns:
-            return self.attributes.get(key)
+            attributes = self.__attributes
+            if key in self.__unloaded and key not in attributes:
+                raise ColumnNotLoadedError(self.__class__.__name__, key)
+            if key in attributes or self.__row is None:
+                return attributes.get(key)
+            value = attributes[key] = self.__row[key]
+            return value
         elif key in associations:
             if key not in loaded:
                 raise NotLoadedError(self.__class__.__name__, key)
@@ -92,11 +153,96 @@ class Model:
         else:
             super().__setattr__(key, value)
 
+    @property
+    def attributes(self) -> dict:
+        """
+        The values of the model's columns.
+        """
+        row = self.__row
+        if row is not None:
+            self.__materialize(row)
+        return self.__attributes
+
+    @property
+    def changed_attributes(self) -> dict:
+        """
+        The values of the columns that differ from the values that were
+        loaded from the database. When the instance wasn't loaded from the
+        database, this includes all of its attributes.
+
+        Values are compared with `==`, so mutating a value in place, such as
+        a `dict` in a JSON column, is not detected.
+        """
+        loaded = self.__loaded
+        if loaded is None:
+            return dict(self.attributes)
+
+        # Columns that were never read from a lazy row can't have changed.
+        attributes = self.__attributes if self.__row is not None else self.attributes
+        return {
+            name: value
+            for name, value in attributes.items()
+            if name not in loaded or loaded[name] != value
+        }
+
+    def _is_loaded(self) -> bool:
+        return self.__loaded is not None
+
+    def _unloaded_columns(self) -> FrozenSet[str]:
+        """
+        The columns that were not selected when the instance was loaded and
+        haven't been assigned since.
+        """
+        return self.__unloaded.difference(self.__attributes)
+
+    def _copy_state(self, other: Model) -> None:
+        """
+        Take over what another instance knows about its row in the database:
+        the values that were loaded, so that only changes are saved, and the
+        columns that were not selected, so that reading them still raises
+        `ColumnNotLoadedError`.
+        """
+        self.__loaded = other.__loaded
+        self.__unloaded = other._unloaded_columns()
+
+    def _load_columns(self, values: Mapping[str, Any]) -> None:
+        """
+        Fill in columns that were loaded after the instance was built.
+        """
+        self.__attributes.update(values)
+        if self.__loaded is not None:
+            self.__loaded = {**self.__loaded, **values}
+
+    def _mark_loaded(self) -> None:
+        """
+        Remember the current attributes as the values in the database.
+        """
+        self.__loaded = dict(self.attributes)
+
+    def __materialize(self, row: Mapping) -> None:
+        attributes = self.__attributes
+        unloaded = self.__unloaded
+        for name in self.__class__.__table__.columns.keys():
+            if name not in attributes and name not in unloaded:
+                attributes[name] = row[name]
+        self.__row = None
+
     def __raise_invalid_attribute(self, key: str) -> None:
         raise AttributeError(
             f"'{self.__class__.__name__}' object has no attribute '{key}'"
         )
 
+    def __reduce__(self) -> tuple:
+        names = self.__class__.__table__.columns.keys()
+        attributes = self.attributes
+        values = tuple(attributes.get(name) for name in names)
+        associations = self.__loaded_associations or None
+        loaded = self.__loaded
+        if loaded is not None:
+            loaded = tuple(loaded.get(name) for name in names)
+        unloaded = self._unloaded_columns()
+        return (self.__class__._restore, (values, associations, loaded, unloaded))
+
     def __repr__(self) -> str:
         return f"<{type(self).__name__} {self.attributes}>"  # pragma: no cover
 
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from datamapper.errors import ConflictingStepError
+
+INSERT = "insert"
+UPDATE = "update"
+DELETE = "delete"
+RUN = "run"
+
+Results = Dict[str, Any]
+
+
+class Step(NamedTuple):
+    name: str
+    action: str
+    value: Any
+
+
+class Multi:
+    """
+    Collects named operations that are performed in a single transaction
+    by `Repo.multi`.
+
+    Each operation accepts either a value or a function. Functions are called
+    with a dict of the results of the previous steps, so a step can depend
+    on records that were created before it.
+
+    Examples::
+
+        multi = (
+            Multi()
+            .insert("user", User(name="Fred"))
+            .insert("pet", lambda results: Pet(owner_id=results["user"].id))
+        )
+
+        results = await repo.multi(multi)
+        results["pet"].owner_id
+    """
+
+    __slots__ = ["_steps"]
+
+    _steps: List[Step]
+
+    def __init__(self, steps: Optional[List[Step]] = None):
+        self._steps = steps or []
+
+    @property
+    def steps(self) -> List[Step]:
+        return list(self._steps)
+
+    def insert(self, name: str, value: Any) -> Multi:
+        """
+        Insert a `Model` or `Changeset`.
+
+        Consecutive inserts into the same table are performed as a single
+        statement when they set the same columns.
+        """
+        return self.__add(name, INSERT, value)
+
+    def update(self, name: str, value: Any) -> Multi:
+        """
+        Update the record of a `Changeset`.
+        """
+        return self.__add(name, UPDATE, value)
+
+    def delete(self, name: str, value: Any) -> Multi:
+        """
+        Delete a `Model`.
+        """
+        return self.__add(name, DELETE, value)
+
+    def run(self, name: str, func: Callable[[Any, Results], Any]) -> Multi:
+        """
+        Call an async function with the `Repo` and the results of the previous
+        steps. The return value is stored as the result of the step.
+
+        Examples::
+
+            async def touch(repo, results):
+                query = Query(Home).where(owner_id=results["user"].id)
+                await repo.update_all(query, name="Home")
+
+            multi = Multi().insert("user", User(name="Fred")).run("touch", touch)
+        """
+        return self.__add(name, RUN, func)
+
+    def __add(self, name: str, action: str, value: Any) -> Multi:
+        if any(step.name == name for step in self._steps):
+            raise ConflictingStepError(name)
+        return Multi([*self._steps, Step(name, action, value)])
@@ -1,3 +1,4 @@
-from .query import Query, call, raw
+from .query import Query, agg, call, raw, ref
+from .update import dec, expr, inc
 
-__all__ = ["Query", "raw", "call"]
+__all__ = ["Query", "raw", "call", "agg", "ref", "inc", "dec", "expr"]
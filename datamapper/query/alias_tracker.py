@@ -1,5 +1,7 @@
+from __future__ import annotations
+
 from collections import defaultdict
-from typing import DefaultDict, Dict, Optional
+from typing import DefaultDict, Dict, List, Optional, Union
 
 from sqlalchemy import Table
 from sqlalchemy.sql.expression import Alias
@@ -8,26 +10,61 @@ from datamapper.errors import ConflictingAliasError, UnknownAliasError
 
 
 class AliasTracker:
+    """
+    Keeps track of the aliases that are available to a query.
+
+    The table of the query can be referenced by its name. It is the root
+    that columns without an alias belong to, unless the query selects from
+    a subquery. When a query is used as a subquery, names that aren't found
+    are looked up in the enclosing query's tracker, so that the subquery
+    can be correlated.
+    """
+
     _aliases: Dict[str, Alias]
+    _tables: List[Alias]
     _counter: DefaultDict[str, int]
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        root: Optional[Union[Table, Alias]] = None,
+        parent: Optional[AliasTracker] = None,
+    ) -> None:
         self._aliases = {}
+        self._tables = []
         self._counter = defaultdict(int)
+        self._root = root
+        self._parent = parent
+
+    @property
+    def root(self) -> Optional[Union[Table, Alias]]:
+        return self._root
 
-    def fetch(self, alias_name: str) -> Alias:
-        try:
+    @property
+    def tables(self) -> List[Alias]:
+        """
+        The aliases of the tables that were joined to the root, in order.
+        """
+        return list(self._tables)
+
+    def fetch(self, alias_name: str) -> Union[Table, Alias]:
+        if alias_name in self._aliases:
             return self._aliases[alias_name]
-        except KeyError:
-            raise UnknownAliasError(alias_name)
+        if self._root is not None and alias_name == self._root.name:
+            return self._root
+        if self._parent is not None:
+            return self._parent.fetch(alias_name)
+        raise UnknownAliasError(alias_name)
 
     def put(self, table: Table, alias_name: Optional[str] = None) -> Alias:
         alias_name = alias_name or self.__generate(table.name[0])
+        alias = self.add(alias_name, table.alias(alias_name))
+        self._tables.append(alias)
+        return alias
 
+    def add(self, alias_name: str, alias: Alias) -> Alias:
         if alias_name in self._aliases:
             raise ConflictingAliasError(alias_name)
 
-        alias = table.alias(alias_name)
         self._aliases[alias_name] = alias
         return alias
 
@@ -0,0 +1,97 @@
+from typing import Any, List
+
+from sqlalchemy import and_, exists, func, select, true
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.elements import _anonymous_label
+from sqlalchemy.sql.expression import (
+    CTE,
+    BindParameter,
+    ClauseElement,
+    ColumnElement,
+    Select,
+)
+from sqlalchemy.sql.visitors import cloned_traverse, iterate
+
+
+class DistinctOnPrefix(ClauseElement):
+    """
+    The `DISTINCT ON (...)` that follows `SELECT` on PostgreSQL.
+    """
+
+    def __init__(self, columns: List[ColumnElement]):
+        self.columns = columns
+
+
+class DistinctOnFilter(ColumnElement):
+    """
+    A condition that emulates `DISTINCT ON` with `ROW_NUMBER()`. It is only
+    rendered on databases other than PostgreSQL.
+    """
+
+    def __init__(self, clause: ColumnElement):
+        self.clause = clause
+
+
+def distinct_on(
+    sql: Select,
+    keys: List[ColumnElement],
+    columns: List[ColumnElement],
+    order: List[Any],
+) -> Select:
+    """
+    Keeps the first row for each distinct value of the columns, according to
+    the order. PostgreSQL uses `DISTINCT ON`. Other databases rank the rows
+    of each group in a subquery and only keep the rows that are ranked first.
+
+    The keys identify each row, so they must include the primary key of every
+    joined table.
+    """
+    rank = func.row_number().over(partition_by=columns, order_by=order or None)
+    labels = [key.label(f"distinct_key{index}") for index, key in enumerate(keys)]
+    ranked = sql.with_only_columns(labels + [rank.label("distinct_rank")])
+
+    # The subquery repeats the clauses of the query, so its parameters are
+    # copied with new names. Common table expressions are only rendered once,
+    # at the top, so they are shared.
+    ctes = [element for element in iterate(ranked, {}) if isinstance(element, CTE)]
+    ranked = cloned_traverse(ranked, {"stop_on": ctes}, {"bindparam": _rename_bind})
+    ranked = ranked.correlate(None).alias("ranked")
+    first = select([ranked.c.distinct_key0]).where(ranked.c.distinct_rank == 1)
+
+    if len(keys) == 1:
+        clause = keys[0].in_(first)
+    else:
+        # The keys of an outer join are NULL when there is no joined row.
+        matches = [
+            ranked.c[label.name].isnot_distinct_from(key)
+            for label, key in zip(labels, keys)
+        ]
+        clause = exists(first.where(and_(*matches)))
+
+    sql = sql.where(DistinctOnFilter(clause))
+    return sql.prefix_with(DistinctOnPrefix(columns), dialect="postgresql")
+
+
+def _rename_bind(bind: BindParameter) -> None:
+    # Some drivers bind parameters by position, with one value for each name.
+    name = bind._orig_key or "param"
+    bind.key = _anonymous_label(f"%({id(bind)} {name})s")
+    bind.unique = True
+
+
+@compiles(DistinctOnPrefix)
+def _compile_prefix(element: DistinctOnPrefix, compiler: Any, **kw: Any) -> str:
+    columns = ", ".join(compiler.process(c, **kw) for c in element.columns)
+    return f"DISTINCT ON ({columns})"
+
+
+@compiles(DistinctOnFilter)
+def _compile_filter(element: DistinctOnFilter, compiler: Any, **kw: Any) -> str:
+    return compiler.process(element.clause, **kw)
+
+
+@compiles(DistinctOnFilter, "postgresql")
+def _compile_filter_postgresql(
+    element: DistinctOnFilter, compiler: Any, **kw: Any
+) -> str:
+    return compiler.process(true(), **kw)
@@ -0,0 +1,150 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import Boolean, and_, false, literal, or_, tuple_
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, ColumnElement
+
+from datamapper.errors import InvalidCursorError
+from datamapper.query.parser import ASC
+
+DECODERS: Dict[str, Callable[[str], Any]] = {
+    "datetime": datetime.fromisoformat,
+    "date": date.fromisoformat,
+    "decimal": Decimal,
+    "uuid": UUID,
+}
+
+# Dialects that sort `NULL` after every other value in ascending order. The
+# others sort it first.
+NULLS_HIGH = frozenset(["postgresql", "oracle"])
+
+
+class Keyset(ColumnElement):
+    """
+    Matches the rows that come after the given values in the given order.
+
+    Dialects that support row values compile this to `(a, b) > (:a, :b)`
+    when all columns are sorted in the same direction and can't be `NULL`.
+    Otherwise, it is expanded to `a > :a OR (a = :a AND b > :b)`, with
+    `IS NULL` checks placed according to where the dialect sorts `NULL`.
+    """
+
+    type = Boolean()
+
+    def __init__(
+        self, columns: List[ColumnElement], directions: List[str], values: list
+    ):
+        self.columns = columns
+        self.directions = directions
+        self.values = values
+
+    @property
+    def is_uniform(self) -> bool:
+        return len(set(self.directions)) == 1
+
+    @property
+    def is_nullable(self) -> bool:
+        return any(_is_nullable(column) for column in self.columns)
+
+    def row_value(self) -> ClauseElement:
+        columns = tuple_(*self.columns)
+        values = tuple_(*[self.__literal(index) for index in range(len(self.columns))])
+        if self.directions[0] == ASC:
+            return columns > values
+        return columns < values
+
+    def expanded(self, nulls_high: bool = False) -> ClauseElement:
+        clauses = []
+        for index in range(len(self.columns)):
+            after = self.__after(index, nulls_high)
+            if after is not None:
+                equals = [self.__equals(prior) for prior in range(index)]
+                clauses.append(and_(*equals, after))
+        return or_(*clauses) if clauses else false()
+
+    def __equals(self, index: int) -> ClauseElement:
+        column = self.columns[index]
+        if self.values[index] is None:
+            return column.is_(None)
+        return column == self.__literal(index)
+
+    def __after(self, index: int, nulls_high: bool) -> Optional[ClauseElement]:
+        column = self.columns[index]
+        ascending = self.directions[index] == ASC
+        nulls_last = nulls_high == ascending
+
+        if self.values[index] is None:
+            return None if nulls_last else column.isnot(None)
+
+        value = self.__literal(index)
+        after = column > value if ascending else column < value
+        if nulls_last and _is_nullable(column):
+            return or_(after, column.is_(None))
+        return after
+
+    def __literal(self, index: int) -> ColumnElement:
+        # Each use needs its own bind parameter for positional paramstyles.
+        return literal(self.values[index], self.columns[index].type)
+
+
+def encode_cursor(values: list) -> str:
+    """
+    Encode the values of a row's sort columns as an opaque string.
+    """
+    data = json.dumps([_encode_value(value) for value in values])
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> list:
+    """
+    Decode a string that was created with `encode_cursor`.
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return [_decode_value(value) for value in data]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise InvalidCursorError("cursor is malformed")
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"datetime": value.isoformat()}
+    if isinstance(value, date):
+        return {"date": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"decimal": str(value)}
+    if isinstance(value, UUID):
+        return {"uuid": str(value)}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        ((kind, encoded),) = value.items()
+        return DECODERS[kind](encoded)
+    return value
+
+
+def _is_nullable(column: ColumnElement) -> bool:
+    return getattr(column, "nullable", True)
+
+
+@compiles(Keyset)
+def _compile_keyset(element: Keyset, compiler: Any, **kw: Any) -> str:
+    nulls_high = compiler.dialect.name in NULLS_HIGH
+    return compiler.process(element.expanded(nulls_high), **kw)
+
+
+@compiles(Keyset, "mysql")
+@compiles(Keyset, "postgresql")
+@compiles(Keyset, "sqlite")
+def _compile_keyset_row_value(element: Keyset, compiler: Any, **kw: Any) -> str:
+    if element.is_uniform and not element.is_nullable:
+        return compiler.process(element.row_value(), **kw)
+    return _compile_keyset(element, compiler, **kw)
@@ -0,0 +1,68 @@
+from typing import Any
+
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement
+
+LOCK_MODES = {
+    "update": "FOR UPDATE",
+    "no_key_update": "FOR NO KEY UPDATE",
+    "share": "FOR SHARE",
+    "key_share": "FOR KEY SHARE",
+}
+
+# MySQL doesn't have key locks, so they fall back to the closest mode.
+MYSQL_LOCK_MODES = {
+    "update": "FOR UPDATE",
+    "no_key_update": "FOR UPDATE",
+    "share": "FOR SHARE",
+    "key_share": "FOR SHARE",
+}
+
+
+class Lock(ClauseElement):
+    """
+    The locking clause at the end of a `SELECT`, like `FOR UPDATE SKIP LOCKED`.
+    """
+
+    def __init__(self, mode: str, skip_locked: bool = False, nowait: bool = False):
+        if skip_locked and nowait:
+            raise ValueError("a lock can't both skip locked rows and not wait")
+
+        self.mode = mode
+        self.skip_locked = skip_locked
+        self.nowait = nowait
+
+    @property
+    def options(self) -> str:
+        if self.nowait:
+            return " NOWAIT"
+        if self.skip_locked:
+            return " SKIP LOCKED"
+        return ""
+
+
+@compiles(Lock)
+def _compile_lock(element: Lock, compiler: Any, **kw: Any) -> str:
+    return "FOR UPDATE" + element.options
+
+
+@compiles(Lock, "postgresql")
+def _compile_lock_postgresql(element: Lock, compiler: Any, **kw: Any) -> str:
+    return LOCK_MODES[element.mode] + element.options
+
+
+@compiles(Lock, "mysql")
+def _compile_lock_mysql(element: Lock, compiler: Any, **kw: Any) -> str:
+    clause = MYSQL_LOCK_MODES[element.mode]
+
+    # `FOR SHARE` and the options were added in MySQL 8.0. Without options,
+    # the older `LOCK IN SHARE MODE` works on every version.
+    if clause == "FOR SHARE" and not element.options:
+        return "LOCK IN SHARE MODE"
+    return clause + element.options
+
+
+@compiles(Lock, "sqlite")
+def _compile_lock_sqlite(element: Lock, compiler: Any, **kw: Any) -> str:
+    # SQLite doesn't lock rows.
+    return ""
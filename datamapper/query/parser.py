@@ -21,6 +21,7 @@ OPERATIONS = {
     "lt": "__lt__",
     "lte": "__le__",
 }
+AGGREGATES = {"count", "sum", "avg", "min", "max"}
 
 
 def parse_column(value: str) -> Tuple[str, Optional[str]]:
@@ -77,3 +78,18 @@ def parse_where(value: str) -> Tuple[str, str]:
     else:
         op = EQUALS
     return (SEPARATOR.join(parts), op)
+
+
+def parse_having(value: str) -> Tuple[str, str, str]:
+    """
+    Parse a having expression. The first part names the aggregate function.
+
+    >>> parse_having("count__id__gt")
+    ("count", "id", "__gt__")
+
+    >>> parse_having("sum__p__age")
+    ("sum", "p__age", "__eq__")
+    """
+    function, _, rest = value.partition(SEPARATOR)
+    name, op = parse_where(rest)
+    return (function, name, op)
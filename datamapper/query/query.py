@@ -1,22 +1,78 @@
 from __future__ import annotations
 
-from typing import Any, Callable, List, Mapping, Optional, Type, Union
-
-from sqlalchemy import Column, Table, text
-from sqlalchemy.sql.expression import ClauseElement, Delete, FromClause, Select, Update
+from collections import namedtuple
+from functools import lru_cache
+from typing import Any, Callable, List, Mapping, Optional, Tuple, Type, Union
+
+from sqlalchemy import (
+    Column,
+    Table,
+    column,
+    exists,
+    func,
+    intersect,
+    select,
+    text,
+    union,
+    union_all,
+)
+from sqlalchemy.sql.expression import (
+    Alias,
+    ClauseElement,
+    CompoundSelect,
+    Delete,
+    FromClause,
+    Select,
+    TextAsFrom,
+    Update,
+)
 
 import datamapper.model as model
-from datamapper._utils import get_column
-from datamapper.errors import InvalidExpressionError, InvalidSelectError
+from datamapper._utils import get_column, get_value, to_tree
+from datamapper.errors import (
+    InvalidAggregateError,
+    InvalidCursorError,
+    InvalidExpressionError,
+    InvalidLockError,
+    InvalidQueryError,
+    InvalidSelectError,
+    UnknownColumnError,
+)
 from datamapper.query.alias_tracker import AliasTracker
+from datamapper.query.distinct import distinct_on
 from datamapper.query.join import Join, to_join_tree
-from datamapper.query.parser import parse_column, parse_order, parse_where
+from datamapper.query.keyset import Keyset, decode_cursor, encode_cursor
+from datamapper.query.lock import LOCK_MODES, Lock
+from datamapper.query.parser import (
+    AGGREGATES,
+    ASC,
+    parse_column,
+    parse_having,
+    parse_order,
+    parse_where,
+)
 
 Statement = Union[Select, Update, Delete]
-SelectClause = Union[ClauseElement, str, list, dict, "raw", "call"]
-WhereClause = Union[ClauseElement, dict]
+SelectClause = Union[ClauseElement, str, list, dict, "raw", "call", "agg"]
+WhereClause = Union[ClauseElement, dict, "Exists"]
 OrderClause = Union[ClauseElement, str]
 
+MODEL = "model"
+LAZY = "lazy"
+TUPLE = "tuple"
+DICT = "dict"
+RECORD = "record"
+
+# The primary key of the model, selected alongside the values of `select`
+# when `distinct_roots` is used.
+ROOT_KEY = "root_key_for_distinct"
+
+COMPOUNDS = {
+    "union": union,
+    "union_all": union_all,
+    "intersect": intersect,
+}
+
 
 class Query:
     __slots__ = [
@@ -28,6 +84,17 @@ class Query:
         "_offset",
         "_joins",
         "_preloads",
+        "_result",
+        "_keyset",
+        "_group_bys",
+        "_havings",
+        "_ctes",
+        "_only",
+        "_lock",
+        "_compounds",
+        "_source",
+        "_distinct",
+        "_distinct_roots",
     ]
 
     _model: Type[model.Model]
@@ -38,6 +105,17 @@ class Query:
     _limit: Optional[int]
     _offset: Optional[int]
     _preloads: List[str]
+    _result: str
+    _keyset: Optional[list]
+    _group_bys: List[Union[ClauseElement, str]]
+    _havings: List[WhereClause]
+    _ctes: List[Tuple[str, Query]]
+    _only: Optional[Tuple[str, ...]]
+    _lock: Optional[Lock]
+    _compounds: List[Tuple[str, Query]]
+    _source: Optional[TextAsFrom]
+    _distinct: Optional[Tuple[str, ...]]
+    _distinct_roots: bool
 
     def __init__(self, model: Type[model.Model]):
         self._model = model
@@ -48,27 +126,216 @@ class Query:
         self._limit = None
         self._offset = None
         self._preloads = []
+        self._result = MODEL
+        self._keyset = None
+        self._group_bys = []
+        self._havings = []
+        self._ctes = []
+        self._only = None
+        self._lock = None
+        self._compounds = []
+        self._source = None
+        self._distinct = None
+        self._distinct_roots = False
 
     def to_query(self) -> Query:
         return self
 
     def to_sql(self) -> Select:
-        return self.__compile(self._model.__table__.select())
+        return self.__compile_select()
 
     def to_update_sql(self) -> Update:
+        self._check_writable()
         return self.__compile(self._model.__table__.update())
 
     def to_delete_sql(self) -> Delete:
+        self._check_writable()
         return self.__compile(self._model.__table__.delete())
 
-    def _deserialize(self, row: Mapping) -> Any:
+    def _check_writable(self) -> None:
+        """
+        Raises `InvalidQueryError` when the query doesn't select rows of the
+        model's table directly, so it can't be used to update or delete.
+        """
+        if self._compounds:
+            raise InvalidQueryError("compound queries can't update or delete")
+        if self._source is not None:
+            raise InvalidQueryError("raw SQL queries can't update or delete")
+
+    def _referenced_columns(self) -> List[Column]:
+        """
+        Lists the columns that are referenced by name in the `WHERE` and
+        `ORDER BY` clauses of the query.
+        """
+        # The clauses of a compound query refer to a subquery, which has no
+        # indexes, so only the columns of its parts are listed.
+        if self._compounds:
+            parts = [query for _, query in self._compounds]
+            return [column for part in parts for column in part._referenced_columns()]
+        if self._source is not None:
+            return []
+
+        tracker = self.__tracker()
+        columns = []
+
+        if self._joins:
+            self.__build_joins(self._model.__table__.select(), tracker)
+
+        for where in self._wheres:
+            if isinstance(where, dict):
+                for name in where.keys():
+                    name, _ = parse_where(name)
+                    columns.append(self.__column(name, tracker))
+
+        for order_by in self._order_bys:
+            if isinstance(order_by, str):
+                name, _ = parse_order(order_by)
+                columns.append(self.__column(name, tracker))
+
+        return columns
+
+    def _column_names(self) -> List[str]:
+        """
+        Names each column returned by the query. Only flat `select` clauses
+        of strings and SQLAlchemy columns can be named. The columns of a raw
+        SQL query are only known once it runs, so it has no names unless it
+        selects columns.
+        """
+        shape = self.__shape()
+        if shape is not self:
+            return shape._column_names()
+
+        if self._select is None and self._source is not None:
+            return []
+
         if self._select is None:
-            return self._model._deserialize(dict(row))
+            return self._loaded_columns()
+
+        if isinstance(self._select, dict):
+            items = self._select.items()
+        elif isinstance(self._select, (list, tuple)):
+            items = [(None, item) for item in self._select]
         else:
-            values = list(row.values())
-            result = _build_result(self._select, values)
-            assert len(values) == 0
-            return result
+            items = [(None, self._select)]
+
+        names = []
+        for index, (key, item) in enumerate(items):
+            if isinstance(item, str):
+                names.append(key or item)
+            elif isinstance(item, ClauseElement):
+                names.append(key or getattr(item, "name", None) or f"column{index}")
+            elif isinstance(item, agg):
+                names.append(key or item.function)
+            else:
+                raise InvalidExpressionError(item)
+        return names
+
+    def _loaded_columns(self) -> List[str]:
+        """
+        Names the columns that are selected when building models. These are
+        the columns given to `only`, or every column that isn't deferred. The
+        primary key and the keys that the preloads are looked up by are always
+        selected.
+        """
+        table = self._model.__table__
+        names = table.columns.keys()
+
+        keys = set(table.primary_key.columns.keys())
+        for name in to_tree(self._preloads):
+            keys.add(self._model.association(name).owner_key)
+
+        if self._only is None:
+            deferred = self._model.__deferred__
+            return [name for name in names if name not in deferred or name in keys]
+
+        return [name for name in names if name in self._only or name in keys]
+
+    def _keyset_order(self) -> List[Tuple[str, str]]:
+        """
+        The columns and directions that a paginated query is sorted by. The
+        primary key is added to break ties, so that the order is unique.
+        """
+        order = []
+        for order_by in self._order_bys:
+            if not isinstance(order_by, str):
+                raise InvalidCursorError("queries must be ordered by column names")
+            order.append(parse_order(order_by))
+
+        if "id" not in [name for name, _ in order]:
+            order.append(("id", ASC))
+
+        return order
+
+    def _root_key(self) -> str:
+        """
+        The name of the column that `distinct_roots` collapses rows by.
+        """
+        return "id" if self._select is None else ROOT_KEY
+
+    def _check_cursor(self) -> None:
+        """
+        Raises `InvalidCursorError` unless each result of the query holds the
+        columns that it is sorted by, so that a cursor can be read from it.
+        """
+        shape = self.__shape()
+        if self._result == TUPLE or shape._select is not None:
+            raise InvalidCursorError("tuples and selected values have no position")
+
+        # The columns of raw SQL are only known once it runs.
+        if shape._source is not None:
+            return
+
+        loaded = shape._loaded_columns()
+        for name, _ in self._keyset_order():
+            if name not in loaded:
+                raise InvalidCursorError(f"column '{name}' is not in the results")
+
+    def _cursor(self, record: Any) -> str:
+        """
+        Encodes the position of a record returned by this query.
+        """
+        self._check_cursor()
+        values = [get_value(record, name) for name, _ in self._keyset_order()]
+        return encode_cursor(values)
+
+    def _deserialize(self, row: Mapping) -> Any:
+        return self._deserializer()(row)
+
+    def _deserializer(self) -> Callable[[Mapping], Any]:
+        """
+        Builds the function that converts a row into a result, so that the
+        work of choosing how to build results happens once per query.
+        """
+        if self._result == TUPLE:
+            return _to_tuple
+
+        if self._result == DICT:
+            return dict
+
+        shape = self.__shape()
+        if shape is not self:
+            return shape.__update(_result=self._result)._deserializer()
+
+        if self._source is not None and self._select is None:
+            return self.__raw_deserializer()
+
+        if self._result == RECORD:
+            names = tuple(self._column_names())
+            record = _record_type(self._model.__name__, names)
+            return lambda row: record._make(row.values())
+
+        model = self._model
+        loaded = self._loaded_columns()
+        unloaded = frozenset(model.__table__.columns.keys()).difference(loaded)
+
+        if self._select is None and self._result == LAZY:
+            return lambda row: model._deserialize(row, lazy=True, unloaded=unloaded)
+
+        if self._select is None:
+            return lambda row: model._deserialize(dict(row), unloaded=unloaded)
+
+        select = self._select
+        return lambda row: _deserialize_select(select, row)
 
     def select(self, value: SelectClause) -> Query:
         """
@@ -85,9 +352,134 @@ class Query:
         """
         return self.__update(_select=value)
 
-    def limit(self, value: int) -> Query:
+    def only(self, *names: str) -> Query:
+        """
+        Only select some of the columns of the model. The primary key, and the
+        keys that preloads are looked up by, are always selected. Reading any
+        other column of the resulting models raises `ColumnNotLoadedError`,
+        until it is loaded with `Repo.load_columns`.
+
+        This can also be used to select columns that the model defers.
+
+        Examples::
+
+            Query(User).only("name")
+            # SELECT users.id, users.name FROM users
+        """
+        for name in names:
+            get_column(self._model.__table__, name)
+        return self.__update(_only=names)
+
+    def from_sql(self, sql: str, **params: Any) -> Query:
+        """
+        Run a raw SQL statement instead of building one. Parameters are
+        written as `:name` in the SQL and given as keyword arguments.
+
+        The columns of the results are mapped to the query's model by name,
+        and columns that aren't returned are left unloaded, like with
+        `only`. The statement is selected from as a subquery, so clauses
+        such as `where`, `order_by` and `limit` apply to its results, and
+        strings refer to its columns by name. Raw SQL queries can't be
+        joined, locked, updated or deleted.
+
+        Examples::
+
+            Query(User).from_sql("SELECT * FROM users WHERE name = :name", name="Fred")
+            Query(User).from_sql("SELECT id FROM users").preload("pets")
+
+            sql = "SELECT name, count(*) AS n FROM users GROUP BY name"
+            Query(User).from_sql(sql).where(n__gt=1).select({"name": "name", "count": "n"})
+            # SELECT anon_1.name, anon_1.n FROM (
+            #   SELECT name, count(*) AS n FROM users GROUP BY name
+            # ) AS anon_1 WHERE anon_1.n > 1
+        """
+        source = text(sql).bindparams(**params).columns()
+        return self.__update(_source=source)
+
+    def lazy(self) -> Query:
+        """
+        Build models that read each column from the database row on first
+        access, instead of copying every column up front. This is cheaper
+        when only a few columns of a wide table are used.
+
+        A lazy model copies the rest of the row as soon as it is changed or
+        its attributes are used as a whole, like when it is passed to a
+        `Changeset`.
+
+        Examples::
+
+            users = await repo.all(Query(User).lazy())
+            [user.name for user in users]
+        """
+        return self.__update(_result=LAZY)
+
+    def as_tuples(self) -> Query:
+        """
+        Return each row as a plain tuple instead of building a model.
+
+        Associations can't be loaded onto tuples, so preloads are ignored.
+
+        Examples::
+
+            Query(User).as_tuples()
+            # [(1, "Fred"), (2, "Sue")]
+        """
+        return self.__update(_result=TUPLE)
+
+    def as_dicts(self) -> Query:
+        """
+        Return each row as a plain dict, keyed by column name, instead of
+        building a model.
+
+        Associations can't be loaded onto dicts, so preloads are ignored.
+
+        Examples::
+
+            Query(User).as_dicts()
+            # [{"id": 1, "name": "Fred"}, {"id": 2, "name": "Sue"}]
+        """
+        return self.__update(_result=DICT)
+
+    def as_records(self) -> Query:
         """
-        Add a `LIMIT` clause to the query.
+        Return each row as a lightweight named tuple instead of building a
+        model. The record type is generated once for each set of columns.
+
+        Associations can't be loaded onto records, so preloads are ignored.
+
+        Examples::
+
+            Query(User).as_records()
+            # [UserRecord(id=1, name="Fred"), UserRecord(id=2, name="Sue")]
+        """
+        return self.__update(_result=RECORD)
+
+    def paginate_after(self, cursor: Optional[str], limit: int) -> Query:
+        """
+        Fetch the page of results that comes after the cursor. When the
+        cursor is `None`, the first page is fetched.
+
+        Rather than using `OFFSET`, the query filters on the values of the
+        columns that it is ordered by, so that deep pages are as fast as
+        the first one. The primary key is always used as the last sort
+        column, so that the order is unique.
+
+        Examples::
+
+            Query(User).order_by("-name").paginate_after(None, 10)
+            # SELECT * FROM users ORDER BY users.name DESC, users.id ASC LIMIT 10
+
+            Query(User).order_by("name").paginate_after(cursor, 10)
+            # SELECT * FROM users WHERE (users.name, users.id) > ('Fred', 9)
+            # ORDER BY users.name ASC, users.id ASC LIMIT 10
+        """
+        values = decode_cursor(cursor) if cursor is not None else []
+        return self.__update(_keyset=values, _limit=limit)
+
+    def limit(self, value: Optional[int]) -> Query:
+        """
+        Add a `LIMIT` clause to the query. When called with `None`, the limit
+        is removed.
 
         Examples::
 
@@ -96,6 +488,30 @@ class Query:
         """
         return self.__update(_limit=value)
 
+    def lock(
+        self, mode: str = "update", skip_locked: bool = False, nowait: bool = False
+    ) -> Query:
+        """
+        Lock the selected rows until the end of the transaction. The mode is
+        one of `update`, `no_key_update`, `share` or `key_share`.
+
+        With `skip_locked`, rows that are locked by another transaction are
+        left out instead of waiting for them. With `nowait`, an error is
+        raised instead. The two options can't be combined. MySQL has no key locks, so `no_key_update` and
+        `key_share` lock like `update` and `share`. SQLite doesn't lock rows,
+        so the lock is left out.
+
+        Examples::
+
+            Query(Job).where(status="pending").lock(skip_locked=True)
+            # SELECT * FROM jobs WHERE jobs.status = 'pending'
+            # FOR UPDATE SKIP LOCKED
+        """
+        if mode not in LOCK_MODES:
+            raise InvalidLockError(mode)
+
+        return self.__update(_lock=Lock(mode, skip_locked=skip_locked, nowait=nowait))
+
     def offset(self, value: int) -> Query:
         """
         Add an `OFFSET` clause to the query.
@@ -158,6 +574,15 @@ class Query:
             Query(Pet).where(age__lte=1)
             # SELECT * FROM pets WHERE pets.age <= 1
 
+        You can compare with the results of another query::
+
+            Query(User).where(id__in=Query(Pet).select("owner_id"))
+            # SELECT * FROM users WHERE users.id IN (SELECT pets.owner_id FROM pets)
+
+            Query(User).where(id=Query(Pet).select("owner_id").where(name="Fido"))
+            # SELECT * FROM users
+            # WHERE users.id = (SELECT pets.owner_id FROM pets WHERE pets.name = 'Fido')
+
         You can query a joined table by it's alias.::
 
             Query(Pet).join("owner", "o").where(o__name="Fred")
@@ -180,6 +605,69 @@ class Query:
         """
         return self.__update(_wheres=self._wheres + list(args) + [kwargs])
 
+    def where_exists(self, query: Union[Query, str], **kwargs: Any) -> Query:
+        """
+        Add a `WHERE EXISTS` clause with a subquery. Use `ref` to compare a
+        column of the subquery to a column of this query.
+
+        Instead of a query, you can give the name of an association. Keyword
+        arguments filter the associated records, just like `where`. Unlike a
+        join, this never returns the same row more than once.
+
+        Examples::
+
+            Query(User).where_exists(Query(Pet).where(owner_id=ref("users__id")))
+            # SELECT * FROM users
+            # WHERE EXISTS (SELECT * FROM pets WHERE pets.owner_id = users.id)
+
+            Query(User).where_exists("pets", name="Fido")
+            # SELECT * FROM users
+            # WHERE EXISTS (
+            #   SELECT * FROM pets
+            #   WHERE pets.name = 'Fido' AND pets.owner_id = users.id
+            # )
+
+            Query(Home).where_exists("owner.pets", name="Fido")
+            # SELECT * FROM homes
+            # WHERE EXISTS (
+            #   SELECT * FROM users
+            #   WHERE EXISTS (
+            #     SELECT * FROM pets
+            #     WHERE pets.name = 'Fido' AND pets.owner_id = users.id
+            #   ) AND users.id = homes.owner_id
+            # )
+        """
+        subquery = self.__exists_query(query, kwargs)
+        return self.__update(_wheres=self._wheres + [Exists(subquery)])
+
+    def where_not_exists(self, query: Union[Query, str], **kwargs: Any) -> Query:
+        """
+        Add a `WHERE NOT EXISTS` clause. This accepts the same arguments as
+        `where_exists`.
+
+        Examples::
+
+            Query(User).where_not_exists("pets")
+            # SELECT * FROM users
+            # WHERE NOT EXISTS (SELECT * FROM pets WHERE pets.owner_id = users.id)
+        """
+        subquery = self.__exists_query(query, kwargs)
+        return self.__update(_wheres=self._wheres + [Exists(subquery, negate=True)])
+
+    def with_cte(self, name: str, query: Query) -> Query:
+        """
+        Add a common table expression to the query. Its columns can be
+        referenced by name, just like a joined table.
+
+        Examples::
+
+            owners = Query(Pet).where(name="Fido").select("owner_id")
+            Query(User).with_cte("o", owners).where(id=ref("o__owner_id"))
+            # WITH o AS (SELECT pets.owner_id FROM pets WHERE pets.name = 'Fido')
+            # SELECT * FROM users, o WHERE users.id = o.owner_id
+        """
+        return self.__update(_ctes=self._ctes + [(name, query)])
+
     def order_by(self, *args: Union[str, ClauseElement]) -> Query:
         """
         Add an `ORDER BY` clause to the query.
@@ -207,6 +695,156 @@ class Query:
         """
         return self.__update(_order_bys=self._order_bys + list(args))
 
+    def reorder(self, *args: Union[str, ClauseElement]) -> Query:
+        """
+        Replace the `ORDER BY` clause of the query. When called without
+        arguments, the ordering is removed.
+
+        Examples::
+
+            Query(User).order_by("name").reorder("-id")
+            # SELECT * FROM users ORDER BY users.id DESC
+        """
+        return self.__update(_order_bys=list(args))
+
+    def union(self, other: Query) -> Query:
+        """
+        Combine the results of this query with the results of another query,
+        leaving out duplicates. Both queries must select the same columns.
+
+        The combined results are selected from a subquery. The ordering,
+        limits and result shape of this query apply to them, and the
+        ordering of the other query is ignored. Clauses that are added
+        afterwards, such as `where` or `select`, also apply to the combined
+        results, and refer to the columns of the subquery by name. Compound
+        queries can't be joined, locked, updated or deleted.
+
+        Examples::
+
+            Query(User).where(name="Fred").union(Query(User).where(name="Sue"))
+            # SELECT anon_1.* FROM (
+            #   SELECT * FROM users WHERE users.name = 'Fred'
+            #   UNION SELECT * FROM users WHERE users.name = 'Sue'
+            # ) AS anon_1
+
+            Query(User).where(id=1).union(Query(User).where(id=2)).order_by("-name")
+            # SELECT anon_1.* FROM (
+            #   SELECT * FROM users WHERE users.id = 1
+            #   UNION SELECT * FROM users WHERE users.id = 2
+            # ) AS anon_1 ORDER BY anon_1.name DESC
+        """
+        return self.__compound("union", other)
+
+    def union_all(self, other: Query) -> Query:
+        """
+        Like `union`, but keeps duplicates, which saves the database from
+        having to remove them.
+
+        Examples::
+
+            Query(User).where(name="Fred").union_all(Query(User).where(name="Sue"))
+            # SELECT anon_1.* FROM (
+            #   SELECT * FROM users WHERE users.name = 'Fred'
+            #   UNION ALL SELECT * FROM users WHERE users.name = 'Sue'
+            # ) AS anon_1
+        """
+        return self.__compound("union_all", other)
+
+    def intersect(self, other: Query) -> Query:
+        """
+        Only keep the results of this query that are also returned by the
+        other query. See `union` for how the queries are combined. MySQL
+        supports this since version 8.0.31.
+
+        Examples::
+
+            Query(User).where(name="Fred").intersect(Query(User).where(id=1))
+            # SELECT anon_1.* FROM (
+            #   SELECT * FROM users WHERE users.name = 'Fred'
+            #   INTERSECT SELECT * FROM users WHERE users.id = 1
+            # ) AS anon_1
+        """
+        return self.__compound("intersect", other)
+
+    def distinct(self) -> Query:
+        """
+        Add `DISTINCT` to the query, so that duplicate rows are left out.
+
+        Examples::
+
+            Query(Pet).select("name").distinct()
+            # SELECT DISTINCT pets.name FROM pets
+        """
+        return self.__update(_distinct=())
+
+    def distinct_on(self, *names: str) -> Query:
+        """
+        Only keep the first row for each distinct value of the given columns,
+        according to the `ORDER BY` of the query.
+
+        PostgreSQL uses `DISTINCT ON`, which requires the `ORDER BY` to start
+        with the same columns. Other databases rank the rows of each group
+        with `ROW_NUMBER()` in a subquery instead.
+
+        Examples::
+
+            Query(Pet).distinct_on("owner_id").order_by("owner_id", "-age")
+            # SELECT DISTINCT ON (pets.owner_id) * FROM pets
+            # ORDER BY pets.owner_id, pets.age DESC
+        """
+        return self.__update(_distinct=names)
+
+    def distinct_roots(self) -> Query:
+        """
+        Only build one model for each primary key. Joining a `HasMany`
+        association repeats the rows of the model for each associated
+        record, and this collapses them without asking the database to
+        compare whole rows. When the query selects values, the primary key
+        is selected with them, and only the first row of each model is kept.
+
+        Examples::
+
+            Query(User).join("pets", "p").where(p__name="Fido").distinct_roots()
+        """
+        return self.__update(_distinct_roots=True)
+
+    def group_by(self, *args: Union[str, ClauseElement]) -> Query:
+        """
+        Add a `GROUP BY` clause to the query. Use `agg` in the `select` to
+        compute an aggregate for each group.
+
+        Examples::
+
+            Query(Pet).group_by("owner_id").select(("owner_id", agg("count")))
+            # SELECT pets.owner_id, count(pets.id) FROM pets GROUP BY pets.owner_id
+
+            query = Query(User).join("pets", "p").group_by("name")
+            query.select(("name", agg("max", "p__age")))
+            # SELECT users.name, max(p.age) FROM users
+            # JOIN pets AS p ON p.owner_id = users.id
+            # GROUP BY users.name
+        """
+        return self.__update(_group_bys=self._group_bys + list(args))
+
+    def having(self, *args: ClauseElement, **kwargs: Any) -> Query:
+        """
+        Add a `HAVING` clause to the query. Each keyword starts with the name
+        of an aggregate function, followed by a column and an optional
+        operator, like in `where`.
+
+        Examples::
+
+            Query(Pet).group_by("owner_id").having(count__id__gt=1).select("owner_id")
+            # SELECT pets.owner_id FROM pets
+            # GROUP BY pets.owner_id HAVING count(pets.id) > 1
+
+            Query(User).join("pets", "p").group_by("name").having(max__p__age__lt=3)
+            # SELECT ... FROM users
+            # JOIN pets AS p ON p.owner_id = users.id
+            # GROUP BY users.name HAVING max(p.age) < 3
+        """
+        return self.__update(_havings=self._havings + list(args) + [kwargs])
+
     def preload(self, preload: str) -> Query:
         """
         Load records that are associated with this query's results.
@@ -259,8 +897,13 @@ class Query:
         join = Join(self._model, name.split("."), alias=alias, outer=True)
         return self.__update(_joins=self._joins + [join])
 
-    def __compile(self, sql: Statement) -> ClauseElement:
-        tracker = AliasTracker()
+    def __compile(
+        self,
+        sql: Statement,
+        parent: Optional[AliasTracker] = None,
+        root: Optional[Alias] = None,
+    ) -> ClauseElement:
+        tracker = self.__tracker(parent, root)
 
         if self._joins:
             sql = self.__build_joins(sql, tracker)
@@ -268,11 +911,24 @@ class Query:
         if self._wheres:
             sql = self.__build_where(sql, tracker)
 
-        if self._order_bys:
+        if self._group_bys:
+            sql = self.__build_group(sql, tracker)
+
+        if self._havings:
+            sql = self.__build_having(sql, tracker)
+
+        if self._distinct is not None and isinstance(sql, Select):
+            sql = self.__build_distinct(sql, tracker)
+
+        if self._keyset is not None:
+            sql = self.__build_keyset(sql, tracker)
+        elif self._order_bys:
             sql = self.__build_order(sql, tracker)
 
         if self._select is not None:
             sql = self.__build_select(sql, tracker)
+            if self._distinct_roots and isinstance(sql, Select):
+                sql = sql.column(self.__column("id", tracker).label(ROOT_KEY))
 
         if self._limit is not None:
             sql = sql.limit(self._limit)
@@ -280,6 +936,9 @@ class Query:
         if self._offset is not None:
             sql = sql.offset(self._offset)
 
+        if self._lock is not None and isinstance(sql, Select):
+            sql = sql.suffix_with(self._lock)
+
         return sql
 
     def __build_where(self, sql: Statement, tracker: AliasTracker) -> Statement:
@@ -291,21 +950,102 @@ class Query:
                 for name, value in where.items():
                     name, op = parse_where(name)
                     column = self.__column(name, tracker)
+                    value = self.__value(value, op, tracker)
                     clause = getattr(column, op)(value)
                     sql = sql.where(clause)
 
+            elif isinstance(where, Exists):
+                subquery = self.__subquery(where.query, tracker)
+                clause = exists(subquery)
+                sql = sql.where(~clause if where.negate else clause)
+
             else:
                 raise InvalidExpressionError(where)
 
         return sql
 
+    def __value(self, value: Any, op: str, tracker: AliasTracker) -> Any:
+        if isinstance(value, ref):
+            return self.__column(value.name, tracker)
+
+        if isinstance(value, Query):
+            subquery = self.__subquery(value, tracker)
+            return subquery if op == "in_" else subquery.as_scalar()
+
+        return value
+
+    def __subquery(self, query: Query, tracker: AliasTracker) -> Select:
+        return query.__compile_select(parent=tracker)
+
+    def __compile_select(self, parent: Optional[AliasTracker] = None) -> Select:
+        if self._source is not None:
+            return self.__compile_outer(self._source.alias(), parent)
+        if self._compounds:
+            return self.__compile_outer(self.__compile_compound().alias(), parent)
+        return self.__compile(self.__base_select(), parent)
+
+    def __base_select(self) -> Select:
+        table = self._model.__table__
+        if self._select is not None:
+            return table.select()
+
+        loaded = self._loaded_columns()
+        if len(loaded) == len(table.columns):
+            return table.select()
+
+        return select([get_column(table, name) for name in loaded])
+
+    def __build_group(self, sql: Statement, tracker: AliasTracker) -> Statement:
+        clauses = []
+
+        for group_by in self._group_bys:
+            if isinstance(group_by, ClauseElement):
+                clauses.append(group_by)
+            elif isinstance(group_by, str):
+                clauses.append(self.__column(group_by, tracker))
+            else:
+                raise InvalidExpressionError(group_by)
+
+        return sql.group_by(*clauses)
+
+    def __build_having(self, sql: Statement, tracker: AliasTracker) -> Statement:
+        for having in self._havings:
+            if isinstance(having, ClauseElement):
+                sql = sql.having(having)
+
+            elif isinstance(having, dict):
+                for name, value in having.items():
+                    function, name, op = parse_having(name)
+                    column = self.__aggregate(agg(function, name), tracker)
+                    sql = sql.having(getattr(column, op)(value))
+
+            else:
+                raise InvalidExpressionError(having)
+
+        return sql
+
     def __build_joins(self, sql: Statement, tracker: AliasTracker) -> Statement:
         table = self._model.__table__
         join_tree = to_join_tree(self._joins)
         clause = _walk_joins(table, table, join_tree, tracker)
         return sql.select_from(clause)
 
+    def __build_distinct(self, sql: Select, tracker: AliasTracker) -> Select:
+        if not self._distinct:
+            return sql.distinct()
+
+        # Each row is identified by the primary keys of the joined tables.
+        keys = [self.__column("id", tracker)]
+        keys.extend(column for table in tracker.tables for column in table.primary_key)
+
+        columns = [self.__column(name, tracker) for name in self._distinct]
+        order = self.__order_clauses(tracker)
+        return distinct_on(sql, keys, columns, order)
+
     def __build_order(self, sql: Statement, tracker: AliasTracker) -> Statement:
+        return sql.order_by(*self.__order_clauses(tracker))
+
+    def __order_clauses(self, tracker: AliasTracker) -> List[ClauseElement]:
         clauses = []
 
         for order_by in self._order_bys:
@@ -321,6 +1061,19 @@ class Query:
             else:
                 raise InvalidExpressionError(order_by)
 
+        return clauses
+
+    def __build_keyset(self, sql: Statement, tracker: AliasTracker) -> Statement:
+        order = self._keyset_order()
+        columns = [self.__column(name, tracker) for name, _ in order]
+        directions = [direction for _, direction in order]
+
+        if self._keyset:
+            if len(self._keyset) != len(order):
+                raise InvalidCursorError("cursor doesn't match the query's order")
+            sql = sql.where(Keyset(columns, directions, self._keyset))
+
+        clauses = [getattr(c, d)() for c, d in zip(columns, directions)]
         return sql.order_by(*clauses)
 
     def __build_select(self, sql: Statement, tracker: AliasTracker) -> Statement:
@@ -355,6 +1108,9 @@ class Query:
             self.__reduce_select(result, select.args, tracker)
             self.__reduce_select(result, select.kwargs, tracker)
 
+        elif isinstance(select, agg):
+            result.append(self.__aggregate(select, tracker))
+
         else:
             raise InvalidExpressionError(select)
 
@@ -363,10 +1119,172 @@ class Query:
     def __column(self, name: str, tracker: AliasTracker) -> Column:
         name, alias = parse_column(name)
         if alias:
-            table = tracker.fetch(alias)
-        else:
+            return get_column(tracker.fetch(alias), name)
+
+        root = tracker.root
+        if root is None or root is self._model.__table__:
+            return get_column(self._model.__table__, name)
+
+        # The query selects from a subquery, so names refer to its columns.
+        # Raw SQL doesn't declare them, so its names can't be checked.
+        if self._source is not None:
             table = self._model.__table__
-        return get_column(table, name)
+            type_ = table.columns[name].type if name in table.columns else None
+            return column(name, type_, _selectable=root)
+
+        if name not in root.columns:
+            raise UnknownColumnError(self._model.__table__.name, name)
+        return root.columns[name]
+
+    def __aggregate(self, aggregate: agg, tracker: AliasTracker) -> ClauseElement:
+        if aggregate.function not in AGGREGATES:
+            raise InvalidAggregateError(aggregate.function)
+        column = self.__column(aggregate.field, tracker)
+        return getattr(func, aggregate.function)(column)
+
+    def __exists_query(self, query: Union[Query, str], filters: dict) -> Query:
+        if isinstance(query, Query):
+            return query.where(**filters)
+
+        name, _, rest = query.partition(".")
+        assoc = self._model.association(name)
+        subquery = Query(assoc.related)
+
+        if rest:
+            subquery = subquery.where_exists(rest, **filters)
+        else:
+            subquery = subquery.where(**filters)
+
+        owner_column = get_column(self._model.__table__, assoc.owner_key)
+        related_column = get_column(assoc.related.__table__, assoc.related_key)
+        return subquery.where(related_column == owner_column)
+
+    def __raw_deserializer(self) -> Callable[[Mapping], Any]:
+        if self._result == RECORD:
+            name = self._model.__name__
+            record = None
+
+            # Every row of a result has the same columns, so the type of the
+            # records is built from the first row.
+            def to_record(row: Mapping) -> Any:
+                nonlocal record
+                if record is None:
+                    record = _record_type(name, tuple(row.keys()))
+                return record._make(row.values())
+
+            return to_record
+
+        model = self._model
+        lazy = self._result == LAZY
+        names = frozenset(model.__table__.columns.keys())
+
+        def deserialize(row: Mapping) -> Any:
+            unloaded = names.difference(row.keys())
+            return model._deserialize(
+                row if lazy else dict(row), lazy=lazy, unloaded=unloaded
+            )
+
+        return deserialize
+
+    def __compound(self, operator: str, other: Query) -> Query:
+        if self._compounds and self.__is_bare():
+            return self.__update(_compounds=self._compounds + [(operator, other)])
+
+        # The query so far becomes the first part. Its ordering, limits and
+        # result shape apply to the combined results instead.
+        first = self.__update(
+            _order_bys=[],
+            _limit=None,
+            _offset=None,
+            _preloads=[],
+            _result=MODEL,
+            _keyset=None,
+            _lock=None,
+            _distinct_roots=False,
+        )
+        return Query(self._model).__update(
+            _order_bys=self._order_bys,
+            _limit=self._limit,
+            _offset=self._offset,
+            _preloads=self._preloads,
+            _result=self._result,
+            _keyset=self._keyset,
+            _lock=self._lock,
+            _distinct_roots=self._distinct_roots,
+            _compounds=[("", first), (operator, other)],
+        )
+
+    def __is_bare(self) -> bool:
+        """
+        Checks that nothing was added to a compound query that applies to
+        the combined results, other than ordering, limits and the result
+        shape.
+        """
+        return (
+            self._select is None
+            and not self._wheres
+            and not self._joins
+            and not self._group_bys
+            and not self._havings
+            and not self._ctes
+            and self._only is None
+            and self._distinct is None
+        )
+
+    def __shape(self) -> Query:
+        """
+        The query that determines the columns of each row. A compound query
+        returns the columns of its first part, unless it selects others.
+        """
+        if self._compounds and self._select is None:
+            return self._compounds[0][1].__shape()
+        return self
+
+    def __compile_compound(self) -> CompoundSelect:
+        (_, first), *rest = self._compounds
+
+        # The parts are compiled without ordering, because SQLite doesn't
+        # allow an `ORDER BY` or `LIMIT` in the parts of a compound select.
+        # Mixed operators are nested, so that they apply from left to right.
+        selects = [first.to_sql()]
+        current = None
+        for operator, query in rest:
+            if current is not None and operator != current:
+                selects = [COMPOUNDS[current](*selects).alias().select()]
+            selects.append(query.reorder().to_sql())
+            current = operator
+
+        assert current is not None
+        return COMPOUNDS[current](*selects)
+
+    def __compile_outer(
+        self, source: Alias, parent: Optional[AliasTracker] = None
+    ) -> Select:
+        kind = "compound" if self._compounds else "raw SQL"
+        if self._joins:
+            raise InvalidQueryError(f"{kind} queries can't be joined")
+        if self._distinct_roots and self._source is not None:
+            raise InvalidQueryError(f"{kind} queries can't use distinct_roots")
+        if self._lock is not None:
+            raise InvalidQueryError(f"{kind} queries can't be locked")
+
+        # Raw SQL doesn't declare its columns, so all of them are selected,
+        # and the rows are read by the names that the database returns.
+        if self._source is not None:
+            sql = select([text("*")]).select_from(source)
+        else:
+            sql = source.select()
+        return self.__compile(sql, parent, root=source)
+
+    def __tracker(
+        self, parent: Optional[AliasTracker] = None, root: Optional[Alias] = None
+    ) -> AliasTracker:
+        if root is None:
+            root = self._model.__table__
+        tracker = AliasTracker(root=root, parent=parent)
+        for name, query in self._ctes:
+            tracker.add(name, self.__subquery(query, tracker).cte(name))
+        return tracker
 
     def __update(self, **kwargs: Any) -> Query:
         query = self.__class__(self._model)
@@ -398,7 +1316,7 @@ def _walk_joins(
 
 
 def _build_result(select: SelectClause, values: list) -> Any:
-    if isinstance(select, str) or isinstance(select, ClauseElement):
+    if isinstance(select, (str, ClauseElement, agg)):
         return values.pop(0)
 
     if isinstance(select, list):
@@ -422,6 +1340,22 @@ def _build_result(select: SelectClause, values: list) -> Any:
     raise InvalidExpressionError(select)
 
 
+def _to_tuple(row: Mapping) -> tuple:
+    return tuple(row.values())
+
+
+@lru_cache(maxsize=256)
+def _record_type(name: str, fields: Tuple[str, ...]) -> Any:
+    return namedtuple(f"{name}Record", fields, rename=True)
+
+
+def _deserialize_select(select: SelectClause, row: Mapping) -> Any:
+    values = list(row.values())
+    result = _build_result(select, values)
+    assert len(values) == 0
+    return result
+
+
 class raw:
     """
     Used to return a literal value from a query without ever sending it to the
@@ -464,3 +1398,52 @@ class call:
         self.func = func
         self.args = args
         self.kwargs = kwargs
+
+
+class agg:
+    """
+    Used to select an aggregate function of a column. The supported functions
+    are `count`, `sum`, `avg`, `min` and `max`.
+
+    Example::
+
+        Query(Pet).group_by("owner_id").select(
+            {"owner_id": "owner_id", "pets": agg("count"), "age": agg("avg", "age")}
+        )
+        # SELECT pets.owner_id, count(pets.id), avg(pets.age)
+        # FROM pets GROUP BY pets.owner_id
+    """
+
+    def __init__(self, function: str, field: str = "id"):
+        self.function = function
+        self.field = field
+
+
+class ref:
+    """
+    Used to compare with another column in `where`, rather than a value.
+
+    Names are resolved like in `where`, except that a subquery can also
+    reference the tables and aliases of the queries that enclose it. A table
+    can be referenced by its name.
+
+    Example::
+
+        Query(Pet).join("owner", "o").where(name=ref("o__name"))
+        # SELECT * FROM pets
+        # JOIN users AS o ON o.id = pets.owner_id
+        # WHERE pets.name = o.name
+
+        Query(User).where_exists(Query(Pet).where(owner_id=ref("users__id")))
+        # SELECT * FROM users
+        # WHERE EXISTS (SELECT * FROM pets WHERE pets.owner_id = users.id)
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+class Exists:
+    def __init__(self, query: Query, negate: bool = False):
+        self.query = query
+        self.negate = negate
@@ -0,0 +1,84 @@
+from typing import Any, Callable, Dict, Mapping
+
+from sqlalchemy import Column, Table
+from sqlalchemy.sql.expression import ClauseElement
+
+from datamapper._utils import get_column
+
+
+class UpdateExpression:
+    """
+    A value for an update that is computed by the database from the current
+    value of the column.
+    """
+
+    def to_expression(self, column: Column) -> ClauseElement:
+        raise NotImplementedError()  # pragma: no cover
+
+
+class inc(UpdateExpression):
+    """
+    Increments a column in an update.
+
+    Example::
+
+        await repo.update_all(Query(Post).where(id=1), views=inc())
+        # UPDATE posts SET views = posts.views + 1 WHERE posts.id = 1
+    """
+
+    def __init__(self, amount: Any = 1):
+        self.amount = amount
+
+    def to_expression(self, column: Column) -> ClauseElement:
+        return column + self.amount
+
+
+class dec(UpdateExpression):
+    """
+    Decrements a column in an update.
+
+    Example::
+
+        await repo.update_all(Query(Product).where(id=1), stock=dec(2))
+        # UPDATE products SET stock = products.stock - 2 WHERE products.id = 1
+    """
+
+    def __init__(self, amount: Any = 1):
+        self.amount = amount
+
+    def to_expression(self, column: Column) -> ClauseElement:
+        return column - self.amount
+
+
+class expr(UpdateExpression):
+    """
+    Sets a column to an expression built from the column itself.
+
+    Example::
+
+        await repo.update_all(Query(User), name=expr(lambda name: name + "!"))
+        # UPDATE users SET name = users.name || '!'
+    """
+
+    def __init__(self, func: Callable[[Column], ClauseElement]):
+        self.func = func
+
+    def to_expression(self, column: Column) -> ClauseElement:
+        return self.func(column)
+
+
+def to_update_values(table: Table, values: Mapping[str, Any]) -> Dict[str, Any]:
+    """
+    Converts each `UpdateExpression` in the values of an update to a SQL
+    expression for its column.
+    """
+    return {
+        name: value.to_expression(get_column(table, name))
+        if isinstance(value, UpdateExpression)
+        else value
+        for name, value in values.items()
+    }
+
+
+def has_expressions(values: Mapping[str, Any]) -> bool:
+    return any(isinstance(value, UpdateExpression) for value in values.values())
@@ -0,0 +1,82 @@
+from typing import Any, Dict, List, Sequence
+
+from sqlalchemy import Table, case, cast, column, literal, null
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ColumnClause, ColumnElement, FromClause, Update
+
+
+class Values(FromClause):
+    """
+    A `VALUES` list that can be used as a table in a `FROM` clause.
+
+    Each value is cast to the type of its column, because PostgreSQL can't
+    infer the types of parameters in a `VALUES` list.
+    """
+
+    named_with_column = True
+
+    def __init__(self, columns: List[ColumnClause], rows: Sequence[tuple], name: str):
+        self._column_args = columns
+        self.rows = rows
+        self.name = name
+
+    def _populate_column_collection(self) -> None:
+        for column_ in self._column_args:
+            column_._make_proxy(self)
+
+
+def update_from_values(table: Table, rows: List[Dict[str, Any]]) -> Update:
+    """
+    Builds an `UPDATE ... FROM (VALUES ...)` statement that sets different
+    values for each row. Each row must contain the `id` and the same columns.
+    """
+    names = list(rows[0].keys())
+    columns = [column(name, table.c[name].type) for name in names]
+    values = Values(columns, [tuple(row.values()) for row in rows], "v")
+    changes = {name: values.c[name] for name in names if name != "id"}
+    return table.update().values(changes).where(table.c.id == values.c.id)
+
+
+def update_with_case(table: Table, rows: List[Dict[str, Any]]) -> Update:
+    """
+    Builds an `UPDATE ... SET column = CASE id WHEN ...` statement that sets
+    different values for each row. Each row must contain the `id` and the
+    same columns.
+    """
+    ids = [row["id"] for row in rows]
+    names = [name for name in rows[0].keys() if name != "id"]
+    changes = {}
+
+    for name in names:
+        target = table.c[name]
+        whens = [(row["id"], _literal(row[name], target.type)) for row in rows]
+        changes[name] = case(whens, value=table.c.id, else_=target)
+
+    return table.update().values(changes).where(table.c.id.in_(ids))
+
+
+def _literal(value: Any, type_: Any) -> ColumnElement:
+    return null() if value is None else literal(value, type_)
+
+
+@compiles(Values)
+def _compile_values(
+    element: Values, compiler: Any, asfrom: bool = False, **kw: Any
+) -> str:
+    columns = element._column_args
+    rows = ", ".join(
+        "(%s)"
+        % ", ".join(
+            compiler.process(cast(_literal(value, c.type), c.type), **kw)
+            for value, c in zip(row, columns)
+        )
+        for row in element.rows
+    )
+    sql = f"(VALUES {rows})"
+
+    if asfrom:
+        names = ", ".join(compiler.preparer.quote(c.name) for c in columns)
+        name = compiler.preparer.quote(element.name)
+        sql = f"{sql} AS {name} ({names})"
+
+    return sql
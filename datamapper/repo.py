@@ -1,14 +1,55 @@
-from typing import Any, List, Optional, Union
+import asyncio
+import math
+import sqlite3
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterator,
+    List,
+    Mapping,
+    MutableMapping,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+    cast,
+)
+from weakref import WeakKeyDictionary
 
 from databases import Database
-from sqlalchemy import func
+from databases.core import Connection
+from sqlalchemy import distinct, exists, func, literal_column, select, text
+from sqlalchemy.sql.expression import ColumnElement, Select
+from sqlalchemy.types import NullType
 from typing_extensions import Protocol
 
+from datamapper._coalesce import InsertCoalescer
+from datamapper._columnar import to_columns
 from datamapper._utils import assert_one, to_list, to_tree
 from datamapper.changeset import Changeset
-from datamapper.errors import InvalidChangesetError
+from datamapper.errors import (
+    InvalidAggregateError,
+    InvalidChangesetError,
+    MultiStepError,
+)
+from datamapper.explain import Explain, Plan, check_indexes, parse_plan
 from datamapper.model import Association, Cardinality, Model
-from datamapper.query import Query
+from datamapper.multi import DELETE, INSERT, RUN, UPDATE, Multi
+from datamapper.query import Query, agg
+from datamapper.query.parser import AGGREGATES
+from datamapper.query.query import LAZY, MODEL
+from datamapper.query.update import has_expressions, to_update_values
+from datamapper.query.values import update_from_values, update_with_case
+from datamapper.transaction import Retry, Transaction, pinned_connection
+
+TOTAL_FOR_PAGE = "total_for_page"
+ROW_COUNT = {"mysql": text("SELECT ROW_COUNT()"), "sqlite": text("SELECT changes()")}
 
 
 class Queryable(Protocol):
@@ -16,6 +57,18 @@ class Queryable(Protocol):
         ...  # pragma: no cover
 
 
+class BatchProgress(NamedTuple):
+    """
+    Reports the progress of a batched `update_all` or `delete_all`.
+
+    `affected` is the number of rows affected so far and `last_id` is the
+    primary key of the last entry that was processed.
+    """
+
+    affected: int
+    last_id: Any
+
+
 class Repo:
     """
     A `Repo` is used to dispatch queries to the database.
@@ -33,8 +86,44 @@ class Repo:
         repo = datamapper.Repo(database)
     """
 
-    def __init__(self, database: Database):
+    def __init__(
+        self,
+        database: Database,
+        coalesce: bool = False,
+        coalesce_window: float = 0.002,
+        coalesce_size: int = 500,
+    ):
         self.database = database
+        self.__coalescer: Optional[InsertCoalescer] = None
+        self.__savepoint_locks: MutableMapping[Connection, asyncio.Lock] = (
+            WeakKeyDictionary()
+        )
+        if coalesce:
+            self.__coalescer = InsertCoalescer(
+                self.__insert_savepoint, window=coalesce_window, size=coalesce_size
+            )
+
+    def transaction(self, retry: Optional[Retry] = None) -> Transaction:
+        """
+        Starts a transaction. All queries performed by the `Repo` inside of
+        the transaction use the same connection. Nested transactions use
+        savepoints.
+
+        When the transaction is used as a decorator, it can be retried after
+        serialization failures and deadlocks according to a `Retry` policy.
+        Only the outermost transaction is retried.
+
+        Examples::
+
+            async with repo.transaction():
+                user = await repo.insert(User(name="Fred"))
+                await repo.insert(Pet(owner_id=user.id))
+
+            @repo.transaction(retry=Retry(attempts=5))
+            async def rename(user_id, name):
+                await repo.update_all(Query(User).where(id=user_id), name=name)
+        """
+        return Transaction(self.database, retry=retry)
 
     async def all(self, queryable: Queryable) -> List[Model]:
         """
@@ -46,14 +135,268 @@ class Repo:
             await repo.all(Query(User).where(name="Fred"))
         """
         query = queryable.to_query()
-        rows = await self.database.fetch_all(query.to_sql())
-        records = [query._deserialize(row) for row in rows]
+        rows = await self.__connection().fetch_all(query.to_sql())
+        if query._distinct_roots:
+            rows = _distinct_roots(rows, query._root_key())
+
+        deserialize = query._deserializer()
+        records = [deserialize(row) for row in rows]
 
-        if query._preloads:
+        if query._preloads and query._result in (MODEL, LAZY):
             await self.preload(records, query._preloads)
 
         return records
 
+    async def all_raw(
+        self,
+        sql: str,
+        params: Optional[Dict[str, Any]] = None,
+        model: Optional[Type[Model]] = None,
+    ) -> List[Any]:
+        """
+        Fetches the results of a raw SQL statement. Parameters are written as
+        `:name` in the SQL.
+
+        When a model is given, each row is mapped to an instance of the model
+        by column name. Otherwise, each row is returned as a `dict`. Use
+        `Query.from_sql` to shape or preload the results.
+
+        Examples::
+
+            sql = "SELECT * FROM users WHERE name = :name"
+            users = await repo.all_raw(sql, {"name": "Fred"}, model=User)
+            rows = await repo.all_raw("SELECT count(*) AS n FROM users")
+        """
+        params = params or {}
+        if model is not None:
+            return await self.all(Query(model).from_sql(sql, **params))
+
+        rows = await self.__connection().fetch_all(text(sql), params)
+        return [dict(row) for row in rows]
+
+    async def all_columnar(self, queryable: Queryable) -> Dict[str, Any]:
+        """
+        Fetches all entries matching the given query as a mapping of column
+        name to an array of values, without building a record for each row.
+
+        Each column is a NumPy array when NumPy is installed. Otherwise,
+        numeric columns are returned as an `array.array` and the rest are
+        returned as a `list`. The types are inferred from the SQLAlchemy
+        column types.
+
+        Examples::
+
+            await repo.all_columnar(User)
+            # {"id": array([1, 2]), "name": array(["Fred", "Sue"], dtype=object)}
+
+            await repo.all_columnar(Query(Pet).select({"pet": "id", "owner": "o__id"}))
+            # {"pet": array([1, 2]), "owner": array([1, 1])}
+        """
+        query = queryable.to_query()
+        sql = query.to_sql()
+        rows = await self.__connection().fetch_all(sql)
+        if query._distinct_roots:
+            rows = _distinct_roots(rows, query._root_key())
+
+        names = query._column_names()
+        types = [column.type for column in sql.inner_columns]
+
+        # The columns of raw SQL are only known from its rows.
+        if query._source is not None and query._select is None:
+            table = query._model.__table__
+            names = list(rows[0].keys()) if rows else []
+            types = [
+                getattr(table.columns.get(name), "type", NullType()) for name in names
+            ]
+
+        return to_columns(names, types, rows)
+
+    async def paginate(
+        self, queryable: Queryable, limit: int, after: Optional[str] = None
+    ) -> Tuple[List[Any], Optional[str]]:
+        """
+        Fetches a page of results using keyset pagination. Returns the
+        results along with a cursor for the next page, or `None` when there
+        are no more results.
+
+        See `Query.paginate_after` for details.
+
+        Examples::
+
+            users, cursor = await repo.paginate(Query(User).order_by("name"), 10)
+            users, cursor = await repo.paginate(Query(User).order_by("name"), 10, cursor)
+        """
+        query = queryable.to_query().paginate_after(after, limit + 1)
+        query._check_cursor()
+        records = await self.all(query)
+
+        if len(records) <= limit:
+            return (records, None)
+
+        records = records[:limit]
+        return (records, query._cursor(records[-1]))
+
+    async def page(
+        self, queryable: Queryable, limit: int, offset: int = 0
+    ) -> Tuple[List[Any], int]:
+        """
+        Fetches a page of results using `LIMIT` and `OFFSET`, along with the
+        total number of entries that match the query.
+
+        The total is computed in the same query with `COUNT(*) OVER ()`.
+        Compound, raw and distinct queries, and SQLite versions without
+        window functions, count the entries with a separate query instead.
+        With `distinct_roots`, the limit applies to the joined rows, and the
+        total counts each model once.
+
+        Examples::
+
+            users, total = await repo.page(Query(User).order_by("name"), 20)
+            users, total = await repo.page(Query(User).order_by("name"), 20, 40)
+        """
+        query = queryable.to_query()
+        paged = query.limit(limit).offset(offset)
+
+        if not _can_count_over(self.database, query):
+            records, total = await asyncio.gather(self.all(paged), self.count(query))
+            return (records, total)
+
+        total_column = func.count().over().label(TOTAL_FOR_PAGE)
+        rows = await self.__connection().fetch_all(paged.to_sql().column(total_column))
+
+        deserialize = query._deserializer()
+        records = []
+        total = 0
+        for row in rows:
+            values = dict(row)
+            total = values.pop(TOTAL_FOR_PAGE)
+            records.append(deserialize(values))
+
+        # Past the last page, there are no rows to read the total from.
+        if not rows and offset > 0:
+            total = await self.count(query)
+
+        if query._preloads and query._result in (MODEL, LAZY):
+            await self.preload(records, query._preloads)
+
+        return (records, total)
+
+    async def chunked(
+        self,
+        queryable: Queryable,
+        size: int = 1000,
+        key: str = "id",
+        prefetch: bool = False,
+    ) -> AsyncIterator[List[Any]]:
+        """
+        Iterates over all entries matching the given query in batches of
+        `size`, walking the table in order of `key`, then of the primary key
+        when `key` repeats.
+
+        Each batch is fetched with its own short query that starts after
+        the last entry of the previous batch, like `paginate`, so no
+        long-running cursor is held open. The key is read from the results
+        by name, so they can't be tuples or selected values. Preloads are
+        loaded for each batch. When `prefetch` is `True`, the next batch is
+        fetched while the current one is being processed.
+
+        Examples::
+
+            async for users in repo.chunked(User, size=500):
+                ...
+
+            async for pets in repo.chunked(Query(Pet).preload("owner"), prefetch=True):
+                ...
+        """
+        query = queryable.to_query().reorder(key)
+        query._check_cursor()
+
+        async def fetch(after: Optional[str]) -> List[Any]:
+            return await self.all(query.paginate_after(after, size))
+
+        pending: Any = fetch(None)
+        try:
+            while True:
+                records = await pending
+                if len(records) < size:
+                    if records:
+                        yield records
+                    return
+
+                pending = fetch(query._cursor(records[-1]))
+                if prefetch:
+                    pending = asyncio.ensure_future(pending)
+                yield records
+        finally:
+            if asyncio.isfuture(pending):
+                pending.cancel()
+            else:
+                pending.close()
+
+    async def parallel_map(
+        self,
+        queryable: Queryable,
+        func: Callable[[Any], Any],
+        partitions: int = 4,
+        key: str = "id",
+        ordered: bool = True,
+        executor: Optional[Executor] = None,
+    ) -> AsyncIterator[Any]:
+        """
+        Calls `func` with each entry matching the given query in a pool of
+        worker processes, and yields the results.
+
+        The query is split into `partitions` ranges of the integer column
+        `key`. Each worker opens its own connection to the database, fetches
+        one range and applies `func` to each entry. When `ordered` is
+        `True`, results are yielded in order of `key`. Otherwise, they are
+        yielded as each partition finishes.
+
+        Both `func` and the query are sent to the workers, so they must be
+        picklable. Limits and offsets are not supported.
+
+        Examples::
+
+            def score(user):
+                return expensive_computation(user.name)
+
+            async for result in repo.parallel_map(User, score, partitions=8):
+                ...
+        """
+        query = queryable.to_query()
+        low, high = cast(tuple, await self.one(_key_bounds(query, key)))
+
+        if low is None:
+            return
+
+        url = str(self.database.url)
+        options = self.database.options
+        step = math.ceil((high - low + 1) / partitions)
+        owned = executor is None
+        pool = ProcessPoolExecutor(partitions) if executor is None else executor
+
+        try:
+            loop = asyncio.get_event_loop()
+            futures = []
+            for start in range(low, high + 1, step):
+                where = {f"{key}__gte": start, f"{key}__lt": start + step}
+                partition = query.reorder(key).where(**where)
+                futures.append(
+                    loop.run_in_executor(
+                        pool, _map_partition, url, options, partition, func
+                    )
+                )
+
+            if not ordered:
+                futures = list(asyncio.as_completed(futures))
+
+            for future in futures:
+                for result in await future:
+                    yield result
+        finally:
+            if owned:
+                pool.shutdown(wait=False)
+
     async def first(self, queryable: Queryable) -> Optional[Model]:
         """
         Fetches a single result from the query. Returns `None` if no result was found.
@@ -103,24 +446,133 @@ class Repo:
         """
         return await self.one(queryable.to_query().where(id=id))
 
-    async def count(self, queryable: Queryable) -> int:
+    async def count(self, queryable: Queryable, estimate: bool = False) -> int:
         """
         Get a count of the number of results in the query.
 
+        The ordering of the query is ignored. The query is wrapped in a
+        subquery when it has a limit, an offset, a `GROUP BY` clause or
+        `distinct`, when it combines queries like `union`, or when it runs raw
+        SQL. Otherwise, the rows are counted directly. With `distinct_roots`,
+        each primary key is counted once.
+
+        When `estimate` is `True`, the row estimate of the query planner is
+        returned instead, which avoids scanning huge tables. Databases that
+        don't report estimates, like SQLite, fall back to an exact count.
+
         Examples::
 
             await repo.count(User)
             await repo.count(Query(User).where(name="Fred"))
+            await repo.count(Event, estimate=True)
+        """
+        query = queryable.to_query().reorder()
+
+        if estimate:
+            plan = await self.explain(query)
+            if plan.rows is not None:
+                return int(plan.rows)
+
+        if query._distinct_roots:
+            subquery = query.to_sql().alias("subquery_for_count")
+            key = subquery.columns[query._root_key()]
+            sql = select([func.count(distinct(key))])
+        elif _is_simple(query):
+            sql = _select_from(query, func.count())
+        else:
+            sql = query.to_sql().alias("subquery_for_count")
+            sql = func.count().select().select_from(sql)
+
+        return await self.__connection().fetch_val(sql)
+
+    async def exists(self, queryable: Queryable) -> bool:
+        """
+        Check if the query has any results, without fetching them.
+
+        Examples::
+
+            await repo.exists(Query(User).where(name="Fred"))
+            # SELECT 1 FROM users WHERE users.name = 'Fred' LIMIT 1
+        """
+        query = queryable.to_query().reorder()
+
+        if _is_simple(query):
+            sql = _select_from(query, literal_column("1")).limit(1)
+        else:
+            sql = exists(query.to_sql()).select()
+
+        return bool(await self.__connection().fetch_val(sql))
+
+    async def aggregate(
+        self, queryable: Queryable, function: str, field: str = "id"
+    ) -> Any:
+        """
+        Compute an aggregate function of a column in the database. The
+        supported functions are `count`, `sum`, `avg`, `min` and `max`.
+
+        When the query has a limit or an offset, the aggregate is computed
+        over the rows that it returns.
+
+        Examples::
+
+            await repo.aggregate(Pet, "sum", "age")
+            await repo.aggregate(Query(Pet).where(owner_id=1), "max", "age")
+            await repo.aggregate(Query(User).join("pets", "p"), "avg", "p__age")
+        """
+        query = queryable.to_query().reorder()
+
+        if query._limit is None and query._offset is None:
+            sql = query.select(agg(function, field)).to_sql()
+        else:
+            if function not in AGGREGATES:
+                raise InvalidAggregateError(function)
+            subquery = query.select(field).to_sql().alias("subquery_for_aggregate")
+            (column,) = subquery.columns
+            sql = select([getattr(func, function)(column)])
+
+        return await self.__connection().fetch_val(sql)
+
+    async def explain(
+        self, queryable: Queryable, analyze: bool = False, check: bool = False
+    ) -> Plan:
         """
-        sql = queryable.to_query().to_sql()
-        sql = sql.alias("subquery_for_count")
-        sql = func.count().select().select_from(sql)
-        return await self.database.fetch_val(sql)
+        Runs the database's `EXPLAIN` for the query and returns the plan as a
+        tree of `Plan` nodes.
+
+        When `analyze` is `True`, the query is executed so that actual row
+        counts are reported. SQLite doesn't support this option.
+
+        When `check` is `True`, a `MissingIndexWarning` is emitted for each
+        column in the `WHERE` or `ORDER BY` clause that isn't indexed.
+
+        Examples::
+
+            plan = await repo.explain(Query(User).where(id=1))
+            assert plan.index is not None
+
+            plan = await repo.explain(Query(User).where(name="Fred"), check=True)
+            # MissingIndexWarning: column 'name' is not indexed for table 'users'
+        """
+        query = queryable.to_query()
+
+        if check:
+            check_indexes(query._referenced_columns())
+
+        sql = Explain(query.to_sql(), analyze=analyze)
+        rows = await self.__connection().fetch_all(sql)
+        return parse_plan(self.database.url.dialect, rows)
 
     async def insert(self, model_or_changeset: Union[Model, Changeset[Model]]) -> Model:
         """
         Insert a record into the database.
 
+        When the `Repo` was created with `coalesce=True`, inserts that are
+        made outside of a transaction within `coalesce_window` seconds of each
+        other are written together in one transaction, in batches of up to
+        `coalesce_size` rows. On PostgreSQL, each batch is a single multi-row
+        `INSERT`. Each caller still receives its own record, and a row that
+        fails to insert only fails its own caller.
+
         Examples::
 
             await repo.insert(User, name="Fred")
@@ -130,29 +582,115 @@ class Repo:
         if not changeset.is_valid:
             raise InvalidChangesetError(action="insert", changeset=changeset)
 
-        model = changeset.data
-        sql = model.__table__.insert().values(**changeset.changes)
-        record_id = await self.database.execute(sql)
-        return changeset.change({"id": record_id}).apply_changes()
+        if self.__coalescer is not None and pinned_connection(self.database) is None:
+            record_id = await self.__coalescer.insert(changeset)
+        else:
+            (record_id,) = await self.__insert_rows([changeset])
 
-    async def update(self, changeset: Changeset) -> Model:
+        return _saved(changeset.change({"id": record_id}).apply_changes())
+
+    async def update(self, changeset: Changeset, **values: Any) -> Model:
         """
         Update a record in the database.
 
+        Additional `values` are set along with the changes in the changeset.
+        These can be expressions such as `inc` and `dec`, in which case the
+        new values are read back from the database.
+
         Examples::
 
             user = await repo.get(User, 1)
             changeset = Changeset(user).cast({"name": "Fred"}, params=["name"])
             await repo.update(changeset)
+
+            await repo.update(Changeset(post), views=inc())
         """
         if not changeset.is_valid:
             raise InvalidChangesetError(action="update", changeset=changeset)
 
         record = changeset.data
         query = record.to_query()
-        sql = query.to_update_sql().values(changeset.changes)
-        await self.database.execute(sql)
-        return changeset.apply_changes()
+        changes = {**changeset.changes, **values}
+
+        if has_expressions(values):
+            updated = await self.update_all_with(query, changes, returning=True)
+            assert isinstance(updated, list)
+            assert_one(updated)
+            return _saved(changeset.change(updated[0].attributes).apply_changes())
+
+        sql = query.to_update_sql().values(changes)
+        await self.__connection().execute(sql)
+        return _saved(changeset.change(values).apply_changes())
+
+    async def save(self, record: Model) -> Model:
+        """
+        Insert a record that wasn't loaded from the database, or update only
+        the columns that changed since a record was loaded.
+
+        When nothing changed, the database is not queried.
+
+        Examples::
+
+            user = await repo.get(User, 1)
+            user.name = "Fred"
+            await repo.save(user)
+            # UPDATE users SET name = 'Fred' WHERE users.id = 1
+        """
+        if not record._is_loaded():
+            return await self.insert(record)
+
+        changes = record.changed_attributes
+        if changes:
+            sql = record.to_query().to_update_sql().values(changes)
+            await self.__connection().execute(sql)
+            record._mark_loaded()
+
+        return record
+
+    async def update_many(
+        self, changesets: List[Changeset], batch_size: int = 500
+    ) -> List[Model]:
+        """
+        Update many records with different values in as few statements as
+        possible.
+
+        All changesets are validated before anything is written. Changesets
+        that change the same columns of the same table are updated together,
+        with up to `batch_size` rows per statement. PostgreSQL uses
+        `UPDATE ... FROM (VALUES ...)` and other databases use
+        `SET column = CASE id WHEN ...`.
+
+        Examples::
+
+            changesets = [
+                Changeset(user).cast({"name": name}, ["name"])
+                for user, name in zip(users, names)
+            ]
+            await repo.update_many(changesets)
+        """
+        for changeset in changesets:
+            if not changeset.is_valid:
+                raise InvalidChangesetError(action="update", changeset=changeset)
+
+        groups: Dict[Tuple[Any, FrozenSet[str]], List[Changeset]] = {}
+        for changeset in changesets:
+            if changeset.changes:
+                key = (changeset.data.__table__, frozenset(changeset.changes))
+                groups.setdefault(key, []).append(changeset)
+
+        if self.database.url.dialect == "postgresql":
+            build = update_from_values
+        else:
+            build = update_with_case
+
+        async with self.transaction():
+            for (table, names), group in groups.items():
+                for start in range(0, len(group), batch_size):
+                    batch = group[start : start + batch_size]
+                    rows = [_update_row(changeset, names) for changeset in batch]
+                    await self.__connection().execute(build(table, rows))
+
+        return [_saved(changeset.apply_changes()) for changeset in changesets]
 
     async def delete(self, record: Model, **values: Any) -> Model:
         """
@@ -165,35 +703,239 @@ class Repo:
         """
         query = record.to_query()
         sql = query.to_delete_sql()
-        await self.database.execute(sql)
+        await self.__connection().execute(sql)
         return record
 
-    async def update_all(self, queryable: Queryable, **values: Any) -> None:
+    async def update_all(self, queryable: Queryable, **values: Any) -> int:
         """
-        Update all entries matching the given query.
+        Update all entries matching the given query and return the number of
+        rows that were updated.
+
+        Values can be expressions that are computed from the current value of
+        the column, such as `inc`, `dec` or `expr`.
 
         Examples::
 
             await repo.update_all(User, name="Fred")
             await repo.update_all(Query(User).where(name="Fred"), name="Freddy")
+            await repo.update_all(Query(Post).where(id=1), views=inc())
+        """
+        count = await self.update_all_with(queryable, values)
+        assert isinstance(count, int)
+        return count
+
+    async def update_all_with(
+        self,
+        queryable: Queryable,
+        values: Mapping[str, Any],
+        *,
+        returning: bool = False,
+        batch_size: Optional[int] = None,
+        sleep: float = 0,
+        after: Any = None,
+        progress: Optional[Callable[[BatchProgress], Any]] = None,
+    ) -> Union[int, List[Model]]:
+        """
+        The same as `update_all`, except the values are given as a mapping of
+        column names, so that they can't be mistaken for the options.
+
+        When `returning` is `True`, the updated entries are returned instead.
+        This uses `RETURNING` on PostgreSQL. Other databases find the matching
+        entries first and fetch them again after the update, in a transaction.
+
+        When `batch_size` is given, the entries are updated in chunks of that
+        many rows, in order of their primary key. See `delete_all` for the
+        batching options.
+
+        Examples::
+
+            await repo.update_all_with(Query(Job), {"progress": 0}, batch_size=100)
+
+            query = Query(Post).where(id=1)
+            posts = await repo.update_all_with(query, {"views": inc()}, returning=True)
+        """
+        query = queryable.to_query()
+        query._check_writable()
+
+        if batch_size is not None:
+
+            async def update_batch(batch: Query) -> Union[int, List[Model]]:
+                return await self.update_all_with(batch, values, returning=returning)
+
+            return await self.__batched(
+                query, update_batch, batch_size, sleep, after, progress, returning
+            )
+
+        table = query._model.__table__
+        values = to_update_values(table, values)
+
+        if returning:
+            if self.database.url.dialect == "postgresql":
+                sql = query.to_update_sql().values(values)
+                return await self.__fetch_returning(query, sql)
+
+            async with self.transaction():
+                query = await self.__where_ids(query)
+                await self.__connection().execute(query.to_update_sql().values(values))
+                return await self.all(query)
+
+        return await self.__execute_count(query.to_update_sql().values(values))
+
+    async def claim(self, queryable: Queryable, **values: Any) -> List[Model]:
+        """
+        Claim entries that match the query by updating them with the given
+        values, and return the claimed entries in the order of the query. The
+        values should make the entries stop matching the query, like setting
+        a status. A limit on the query caps how many entries are claimed at
+        once.
+
+        The entries are selected with `FOR UPDATE SKIP LOCKED` in the same
+        transaction as the update, so concurrent workers skip the entries
+        that another worker is claiming instead of waiting for it.
+
+        SQLite doesn't lock rows. Instead, each entry is updated on its own,
+        only if it still matches the query, so an entry that was claimed by
+        another worker in the meantime is left out.
+
+        Examples::
+
+            query = Query(Job).where(status="pending").order_by("id")
+            jobs = await repo.claim(query.limit(10), status="running")
         """
         query = queryable.to_query()
-        sql = query.to_update_sql()
-        sql = sql.values(**values)
-        await self.database.execute(sql)
+        candidates = query.select("id")
 
-    async def delete_all(self, queryable: Queryable) -> None:
+        if self.database.url.dialect == "sqlite":
+            ids = []
+            for record_id in await self.all(candidates):
+                claimed = query.reorder().limit(None).where(id=record_id)
+                if await self.update_all(claimed, **values):
+                    ids.append(record_id)
+            records = await self.all(Query(query._model).where(id__in=ids))
+            return _in_order(records, ids)
+
+        async with self.transaction():
+            candidates = candidates.lock("update", skip_locked=True)
+            ids = await self.all(candidates)
+            claimed = Query(query._model).where(id__in=ids)
+            updated = await self.update_all_with(claimed, values, returning=True)
+            assert isinstance(updated, list)
+            return _in_order(updated, ids)
+
+    async def delete_all(
+        self,
+        queryable: Queryable,
+        returning: bool = False,
+        batch_size: Optional[int] = None,
+        sleep: float = 0,
+        after: Any = None,
+        progress: Optional[Callable[[BatchProgress], Any]] = None,
+    ) -> Union[int, List[Model]]:
         """
-        Delete all entries matching the given query.
+        Delete all entries matching the given query and return the number of
+        rows that were deleted.
+
+        When `returning` is `True`, the deleted entries are returned instead.
+        This uses `RETURNING` on PostgreSQL. Other databases fetch the matching
+        entries before deleting them, in a transaction.
+
+        When `batch_size` is given, the entries are deleted in chunks of that
+        many rows, in order of their primary key. Each chunk is a separate
+        statement, so locks are only held for one chunk at a time. The job
+        waits `sleep` seconds between chunks. After each chunk, `progress` is
+        called with a `BatchProgress`. Its `last_id` can be passed as `after`
+        to resume an interrupted job.
 
         Examples::
 
             await repo.delete_all(User)
             await repo.delete_all(Query(User).where(name="Fred"))
+
+            query = Query(Event).where(created_at__lt=cutoff)
+            await repo.delete_all(query, batch_size=1000, sleep=0.1, progress=print)
         """
         query = queryable.to_query()
-        sql = query.to_delete_sql()
-        await self.database.execute(sql)
+        query._check_writable()
+
+        if batch_size is not None:
+
+            async def delete_batch(batch: Query) -> Union[int, List[Model]]:
+                return await self.delete_all(batch, returning=returning)
+
+            return await self.__batched(
+                query, delete_batch, batch_size, sleep, after, progress, returning
+            )
+
+        if returning:
+            if self.database.url.dialect == "postgresql":
+                return await self.__fetch_returning(query, query.to_delete_sql())
+
+            async with self.transaction():
+                records = await self.all(query)
+                ids = [record.id for record in records]
+                query = Query(query._model).where(id__in=ids)
+                await self.__connection().execute(query.to_delete_sql())
+                return records
+
+        return await self.__execute_count(query.to_delete_sql())
+
+    async def multi(self, multi: Multi) -> Dict[str, Any]:
+        """
+        Performs the steps of a `Multi` in a single transaction and returns
+        the result of each step by name.
+
+        Consecutive inserts into the same table that set the same columns are
+        merged into a single multi-row `INSERT` when the IDs of the rows are
+        known, either because they are given or because the database returns
+        them, like PostgreSQL. When a step fails, the transaction is rolled
+        back and a `MultiStepError` is raised. When the step was merged, the
+        first step of the statement is reported.
+
+        Examples::
+
+            multi = (
+                Multi()
+                .insert("user", User(name="Fred"))
+                .insert("pet", lambda results: Pet(owner_id=results["user"].id))
+            )
+
+            results = await repo.multi(multi)
+        """
+        results: Dict[str, Any] = {}
+        pending: List[Tuple[str, Changeset]] = []
+
+        async with self.transaction():
+            for name, action, value in multi.steps:
+                if action == INSERT and not callable(value):
+                    changeset = self.__step(name, results, _insert_changeset, value)
+                    if pending and not _can_merge(pending[-1][1], changeset):
+                        await self.__insert_steps(pending, results)
+                        pending = []
+                    pending.append((name, changeset))
+                    continue
+
+                if pending:
+                    await self.__insert_steps(pending, results)
+                    pending = []
+
+                if callable(value) and action != RUN:
+                    value = self.__step(name, results, value, results)
+
+                if action == INSERT:
+                    operation = self.insert(value)
+                elif action == UPDATE:
+                    operation = self.update(value)
+                elif action == DELETE:
+                    operation = self.delete(value)
+                else:
+                    operation = value(self, dict(results))
+
+                results[name] = await self.__step_async(name, results, operation)
+
+            if pending:
+                await self.__insert_steps(pending, results)
+
+        return results
 
     async def preload(
         self, records: Union[Model, List[Model]], preloads: List[str]
@@ -213,7 +955,168 @@ class Repo:
         preloads = to_tree(to_list(preloads))
         await self.__preload(records, preloads)
 
+    async def load_columns(
+        self, records: Union[Model, List[Model]], *names: str
+    ) -> None:
+        """
+        Loads columns that were deferred by the model or left out by
+        `Query.only`, using a single query for all of the records. When no
+        names are given, every column that isn't loaded is fetched.
+
+        Examples::
+
+            posts = await repo.all(Query(Post).only("title"))
+            await repo.load_columns(posts, "body")
+        """
+        records = to_list(records)
+        if not names:
+            unloaded = [record._unloaded_columns() for record in records]
+            names = tuple(sorted(frozenset().union(*unloaded)))
+        if not records or not names:
+            return
+
+        by_id: Dict[Any, List[Model]] = {}
+        for record in records:
+            by_id.setdefault(record.id, []).append(record)
+
+        model = records[0].__class__
+        query = Query(model).where(id__in=list(by_id)).select(["id", *names])
+        for row in await self.__connection().fetch_all(query.to_sql()):
+            values = dict(row)
+            for record in by_id[values.pop("id")]:
+                record._load_columns(values)
+
+    async def __insert_steps(
+        self, steps: List[Tuple[str, Changeset]], results: Dict[str, Any]
+    ) -> None:
+        names = [name for name, _ in steps]
+        changesets = [changeset for _, changeset in steps]
+        operation = self.__insert_rows(changesets)
+        ids = await self.__step_async(names[0], results, operation)
+
+        for name, changeset, record_id in zip(names, changesets, ids):
+            record = changeset.change({"id": record_id}).apply_changes()
+            results[name] = _saved(record)
+
+    async def __insert_savepoint(self, changesets: List[Changeset]) -> List[Any]:
+        # A failed statement aborts the enclosing transaction on PostgreSQL,
+        # so each batch of coalesced rows, and each retry of a row, is written
+        # in its own transaction or savepoint. Batches that share a connection,
+        # like under `force_rollback`, take turns so that savepoints nest.
+        connection = self.database.connection()
+        lock = self.__savepoint_locks.setdefault(connection, asyncio.Lock())
+        async with lock, connection.transaction():
+            return await self.__insert_rows(changesets)
+
+    async def __insert_rows(self, changesets: List[Changeset]) -> List[Any]:
+        table = changesets[0].data.__table__
+        rows = [changeset.changes for changeset in changesets]
+
+        if len(rows) == 1:
+            return [await self.__connection().execute(table.insert().values(**rows[0]))]
+
+        sql = table.insert().values(rows)
+        if all("id" in row for row in rows):
+            await self.__connection().execute(sql)
+            return [row["id"] for row in rows]
+
+        if self.database.url.dialect == "postgresql":
+            records = await self.__connection().fetch_all(sql.returning(table.c.id))
+            return [record["id"] for record in records]
+
+        # Other databases only report one generated ID per statement, and the
+        # IDs of a multi-row statement aren't always consecutive, like with
+        # concurrent inserts or an increment other than one.
+        connection = self.__connection()
+        return [await connection.execute(table.insert().values(**row)) for row in rows]
+
+    def __step(
+        self, name: str, results: Dict[str, Any], func: Callable, *args: Any
+    ) -> Any:
+        try:
+            return func(*args)
+        except Exception as error:
+            raise MultiStepError(name, error, dict(results)) from error
+
+    async def __step_async(
+        self, name: str, results: Dict[str, Any], operation: Awaitable
+    ) -> Any:
+        try:
+            return await operation
+        except Exception as error:
+            raise MultiStepError(name, error, dict(results)) from error
+
+    async def __batched(
+        self,
+        query: Query,
+        operation: Callable[[Query], Awaitable[Union[int, List[Model]]]],
+        batch_size: int,
+        sleep: float,
+        after: Any,
+        progress: Optional[Callable[[BatchProgress], Any]],
+        returning: bool,
+    ) -> Union[int, List[Model]]:
+        records: List[Model] = []
+        count = 0
+        query = query.reorder("id").select("id").limit(batch_size)
+
+        while True:
+            batch = query if after is None else query.where(id__gt=after)
+            ids = await self.all(batch)
+            if not ids:
+                break
+
+            result = await operation(Query(query._model).where(id__in=ids))
+            if isinstance(result, list):
+                records.extend(result)
+                result = len(result)
+
+            count += result
+            after = ids[-1]
+
+            if progress is not None:
+                progress(BatchProgress(count, after))
+
+            if len(ids) < batch_size:
+                break
+
+            await asyncio.sleep(sleep)
+
+        return records if returning else count
+
+    async def __execute_count(self, sql: Any) -> int:
+        dialect = self.database.url.dialect
+        if dialect == "postgresql":
+            rows = sql.returning(literal_column("1")).cte("affected")
+            count = select([func.count()]).select_from(rows)
+            return await self.__connection().fetch_val(count)
+
+        # The row count is only reported to the connection that ran the
+        # statement, so the connection must be held for both queries.
+        async with self.__acquire() as connection:
+            await connection.execute(sql)
+            return await connection.fetch_val(ROW_COUNT[dialect])
+
+    async def __fetch_returning(self, query: Query, sql: Any) -> List[Model]:
+        model = query._model
+        sql = sql.returning(*model.__table__.columns)
+        rows = await self.__connection().fetch_all(sql)
+        return [model._deserialize(row) for row in rows]
+
+    async def __where_ids(self, query: Query) -> Query:
+        ids = await self.all(query.select("id"))
+        return Query(query._model).where(id__in=ids)
+
+    def __acquire(self) -> Connection:
+        return pinned_connection(self.database) or self.database.connection()
+
+    def __connection(self) -> Union[Database, Connection]:
+        return pinned_connection(self.database) or self.database
+
     async def __preload(self, owners: List[Model], preloads: dict) -> None:
+        if not owners:
+            return
+
         for name, subpreloads in preloads.items():
             model = owners[0].__class__
             assoc = model.association(name)
@@ -226,6 +1129,112 @@ class Repo:
             await self.__preload(preloaded, subpreloads)
 
 
+def _is_simple(query: Query) -> bool:
+    return (
+        query._limit is None
+        and query._offset is None
+        and not query._group_bys
+        and not query._compounds
+        and query._source is None
+        and query._distinct is None
+    )
+
+
+def _can_count_over(database: Database, query: Query) -> bool:
+    # `COUNT(*) OVER ()` is computed before `DISTINCT` or `distinct_roots`
+    # removes any rows. The rows of raw SQL are read by name, so no column
+    # can be added to them.
+    if (
+        query._compounds
+        or query._source is not None
+        or query._distinct is not None
+        or query._distinct_roots
+    ):
+        return False
+    if database.url.dialect == "sqlite":
+        return sqlite3.sqlite_version_info >= (3, 25, 0)
+    return True
+
+
+def _distinct_roots(rows: List[Mapping], key: str) -> List[Mapping]:
+    unique: Dict[Any, Mapping] = {}
+    for row in rows:
+        unique.setdefault(row[key], row)
+
+    if key == "id":
+        return list(unique.values())
+    return [_RowWithoutKey(row) for row in unique.values()]
+
+
+class _RowWithoutKey(Mapping[str, Any]):
+    """
+    A row without the last column, which holds the primary key that was only
+    selected for `distinct_roots`. Selected values are read by position, so
+    columns whose names repeat are kept.
+    """
+
+    def __init__(self, row: Mapping):
+        self._keys = list(row.keys())[:-1]
+        self._values = list(row.values())[:-1]
+
+    def __getitem__(self, key: str) -> Any:
+        return self._values[self._keys.index(key)]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def values(self) -> Any:
+        return self._values
+
+
+def _select_from(query: Query, column: ColumnElement) -> Select:
+    sql = query.to_sql().with_only_columns([column])
+    return sql.select_from(query._model.__table__)
+
+
+def _key_bounds(query: Query, key: str) -> Query:
+    return query.reorder().select((agg("min", key), agg("max", key)))
+
+
+def _map_partition(
+    url: str, options: dict, query: Query, func: Callable[[Any], Any]
+) -> List[Any]:
+    return asyncio.run(_map_partition_async(url, options, query, func))
+
+
+async def _map_partition_async(
+    url: str, options: dict, query: Query, func: Callable[[Any], Any]
+) -> List[Any]:
+    async with Database(url, **options) as database:
+        records = await Repo(database).all(query)
+    return [func(record) for record in records]
+
+
+def _insert_changeset(value: Union[Model, Changeset]) -> Changeset:
+    changeset = cast_changeset(value)
+    if not changeset.is_valid:
+        raise InvalidChangesetError(action="insert", changeset=changeset)
+    return changeset
+
+
+def _can_merge(a: Changeset, b: Changeset) -> bool:
+    return a.data.__table__ is b.data.__table__ and a.changes.keys() == b.changes.keys()
+
+
+def _update_row(changeset: Changeset, names: FrozenSet[str]) -> Dict[str, Any]:
+    row = {"id": changeset.data.id}
+    row.update((name, changeset.changes[name]) for name in sorted(names))
+    return row
+
+
+def _saved(record: Model) -> Model:
+    record._mark_loaded()
+    return record
+
+
 def cast_changeset(model_or_changeset: Union[Model, Changeset]) -> Changeset:
     if isinstance(model_or_changeset, Model):
         changes = model_or_changeset.attributes
@@ -237,6 +1246,14 @@ def cast_changeset(model_or_changeset: Union[Model, Changeset]) -> Changeset:
         raise ValueError("Must be Model instance or Changeset.")
 
 
+def _in_order(records: List[Model], ids: List[Any]) -> List[Model]:
+    """
+    Sorts records that were fetched by their IDs into the order of the IDs.
+    """
+    by_id = {record.id: record for record in records}
+    return [by_id[record_id] for record_id in ids if record_id in by_id]
+
+
 def _resolve_preloads(
     owners: List[Model], preloaded: List[Model], assoc: Association
 ) -> None:
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import random
+from contextvars import ContextVar, Token
+from typing import Any, Callable, Mapping, Optional
+
+from databases import Database
+from databases.core import Connection
+from databases.core import Transaction as DatabaseTransaction
+
+RETRYABLE_SQLSTATES = {"40001", "40P01"}
+RETRYABLE_MYSQL_CODES = {1205, 1213}
+RETRYABLE_MESSAGES = ("database is locked",)
+
+# The connection of the current transaction on each database, so that every
+# `Repo` of a database performs its queries in that transaction.
+_pinned: ContextVar[Mapping[Database, Connection]] = ContextVar("pinned", default={})
+
+
+def pinned_connection(database: Database) -> Optional[Connection]:
+    """
+    Returns the connection of the transaction that is open on the database
+    in the current context, if any.
+    """
+    return _pinned.get().get(database)
+
+
+class Retry:
+    """
+    A policy for retrying transactions that fail with a serialization
+    failure, a deadlock or a lock timeout.
+
+    Attempts are separated by a random delay between zero and an
+    exponentially increasing ceiling.
+
+    Examples::
+
+        @repo.transaction(retry=Retry(attempts=5))
+        async def transfer(source, target, amount):
+            ...
+    """
+
+    def __init__(
+        self, attempts: int = 3, base_delay: float = 0.05, max_delay: float = 1.0
+    ):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int) -> float:
+        ceiling = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return random.uniform(0, ceiling)
+
+
+class Transaction:
+    """
+    A transaction that pins the `Repo` to a single connection.
+
+    Transactions can be nested. The inner transactions use savepoints.
+
+    This is used through `Repo.transaction`.
+    """
+
+    def __init__(self, database: Database, retry: Optional[Retry] = None):
+        self.database = database
+        self.retry = retry
+        self._transaction: Optional[DatabaseTransaction] = None
+        self._token: Optional[Token] = None
+
+    async def __aenter__(self) -> Transaction:
+        if self.retry is not None:
+            raise TypeError("a transaction can only be retried as a decorator")
+
+        connection = pinned_connection(self.database) or self.database.connection()
+        self._transaction = connection.transaction()
+        await self._transaction.start()
+        self._token = _pinned.set({**_pinned.get(), self.database: connection})
+        return self
+
+    async def __aexit__(self, exc_type: Any, *args: Any) -> None:
+        assert self._transaction is not None and self._token is not None
+        _pinned.reset(self._token)
+
+        if exc_type is None:
+            await self._transaction.commit()
+        else:
+            await self._transaction.rollback()
+
+    def __call__(self, func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            retry = self.retry
+            if retry is None or pinned_connection(self.database) is not None:
+                retry = Retry(attempts=1)
+
+            attempt = 1
+            while True:
+                try:
+                    async with Transaction(self.database):
+                        return await func(*args, **kwargs)
+                except Exception as error:
+                    if attempt >= retry.attempts or not is_retryable(error):
+                        raise
+
+                await asyncio.sleep(retry.delay(attempt))
+                attempt += 1
+
+        return wrapper
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Check if an error was caused by a serialization failure, a deadlock or
+    a lock timeout.
+    """
+    for name in ("sqlstate", "pgcode"):
+        if getattr(error, name, None) in RETRYABLE_SQLSTATES:
+            return True
+
+    code = error.args[0] if error.args else None
+    if isinstance(code, int) and code in RETRYABLE_MYSQL_CODES:
+        return True
+
+    message = str(error)
+    return any(fragment in message for fragment in RETRYABLE_MESSAGES)
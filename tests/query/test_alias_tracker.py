@@ -3,7 +3,7 @@ from sqlalchemy.sql.expression import Alias
 
 from datamapper.errors import ConflictingAliasError, UnknownAliasError
 from datamapper.query.alias_tracker import AliasTracker
-from tests.support import User
+from tests.support import Pet, User
 
 
 def test_put() -> None:
@@ -58,3 +58,26 @@ def test_fetch_unknown() -> None:
 
     with pytest.raises(UnknownAliasError, match=message):
         tracker.fetch("trash")
+
+
+def test_fetch_root() -> None:
+    tracker = AliasTracker(root=User.__table__)
+    assert tracker.fetch("users") is User.__table__
+
+
+def test_fetch_parent() -> None:
+    parent = AliasTracker(root=User.__table__)
+    parent.put(User.__table__, "u")
+    tracker = AliasTracker(root=Pet.__table__, parent=parent)
+
+    assert tracker.fetch("pets") is Pet.__table__
+    assert tracker.fetch("users") is User.__table__
+    assert isinstance(tracker.fetch("u"), Alias)
+
+
+def test_tables() -> None:
+    tracker = AliasTracker(root=User.__table__)
+    pets = tracker.put(Pet.__table__, "p")
+    tracker.add("o", User.__table__.select().cte("o"))
+
+    assert tracker.tables == [pets]
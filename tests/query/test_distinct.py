@@ -0,0 +1,41 @@
+import sqlalchemy as sa
+
+from datamapper.query.distinct import distinct_on
+from tests.support import Pet, User, to_sql
+
+TABLE = Pet.__table__
+SQL = distinct_on(TABLE.select(), [TABLE.c.id], [TABLE.c.owner_id], [TABLE.c.age])
+
+
+def test_distinct_on_postgresql():
+    assert to_sql(SQL) == (
+        "SELECT DISTINCT ON (pets.owner_id) pets.id, pets.name, pets.owner_id, "
+        "pets.age \nFROM pets \nWHERE true"
+    )
+
+
+def test_distinct_on_emulated():
+    dialect = sa.dialects.sqlite.dialect()
+    sql = str(SQL.compile(dialect=dialect))
+    assert sql.startswith("SELECT pets.id, pets.name, pets.owner_id, pets.age")
+    assert (
+        "WHERE pets.id IN (SELECT ranked.distinct_key0 \nFROM (SELECT pets.id AS "
+        "distinct_key0, row_number() OVER (PARTITION BY pets.owner_id ORDER BY "
+        "pets.age) AS distinct_rank \nFROM pets) AS ranked \n"
+        "WHERE ranked.distinct_rank = ?)"
+    ) in sql
+
+
+def test_distinct_on_emulated_keys():
+    users = User.__table__
+    joined = users.select().select_from(users.join(TABLE))
+    keys = [users.c.id, TABLE.c.id]
+    sql = distinct_on(joined, keys, [users.c.name], [])
+
+    dialect = sa.dialects.sqlite.dialect()
+    sql = str(sql.compile(dialect=dialect))
+    assert "WHERE EXISTS (SELECT ranked.distinct_key0" in sql
+    assert (
+        "WHERE ranked.distinct_rank = ? AND ranked.distinct_key0 IS users.id "
+        "AND ranked.distinct_key1 IS pets.id)"
+    ) in sql
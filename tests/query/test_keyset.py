@@ -0,0 +1,89 @@
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import UUID
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.dialects import mssql, sqlite
+
+from datamapper.errors import InvalidCursorError
+from datamapper.query.keyset import Keyset, decode_cursor, encode_cursor
+from tests.support import User, to_sql
+
+ID = User.__table__.c.id
+NAME = User.__table__.c.name
+
+events = sa.Table(
+    "events",
+    sa.MetaData(),
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("at", sa.Integer, nullable=False),
+)
+
+
+def test_cursor_roundtrip() -> None:
+    values = [
+        1,
+        "Fred",
+        None,
+        datetime(2020, 5, 1, 12, 30),
+        date(2020, 5, 1),
+        Decimal("1.50"),
+        UUID("12345678123456781234567812345678"),
+    ]
+    assert decode_cursor(encode_cursor(values)) == values
+
+
+def test_cursor_malformed() -> None:
+    with pytest.raises(InvalidCursorError, match="invalid cursor: cursor is malformed"):
+        decode_cursor("garbage")
+
+
+def test_keyset_row_value() -> None:
+    keyset = Keyset([events.c.at, events.c.id], ["asc", "asc"], [1, 9])
+    assert to_sql(keyset) == "(events.at, events.id) > (1, 9)"
+
+
+def test_keyset_row_value_desc() -> None:
+    keyset = Keyset([events.c.at, events.c.id], ["desc", "desc"], [1, 9])
+    assert to_sql(keyset) == "(events.at, events.id) < (1, 9)"
+
+
+def test_keyset_nullable() -> None:
+    keyset = Keyset([NAME, ID], ["asc", "asc"], ["Fred", 9])
+    assert to_sql(keyset) == (
+        "users.name > 'Fred' OR users.name IS NULL "
+        "OR users.name = 'Fred' AND users.id > 9"
+    )
+    assert to_sqlite(keyset) == (
+        "users.name > 'Fred' OR users.name = 'Fred' AND users.id > 9"
+    )
+
+
+def test_keyset_null_value() -> None:
+    keyset = Keyset([NAME, ID], ["asc", "asc"], [None, 9])
+    assert to_sql(keyset) == "users.name IS NULL AND users.id > 9"
+    assert to_sqlite(keyset) == (
+        "users.name IS NOT NULL OR users.name IS NULL AND users.id > 9"
+    )
+    assert to_sql(Keyset([NAME], ["asc"], [None])) == "false"
+
+
+def test_keyset_mixed() -> None:
+    keyset = Keyset([NAME, ID], ["desc", "asc"], ["Fred", 9])
+    assert to_sql(keyset) == (
+        "users.name < 'Fred' OR users.name = 'Fred' AND users.id > 9"
+    )
+
+
+def test_keyset_without_row_values() -> None:
+    keyset = Keyset([NAME, ID], ["asc", "asc"], ["Fred", 9])
+    sql = str(keyset.compile(dialect=mssql.dialect()))
+    assert sql == (
+        "users.name > :param_1 OR users.name = :param_2 AND users.id > :param_3"
+    )
+
+
+def to_sqlite(keyset: Keyset) -> str:
+    options = {"literal_binds": True}
+    return str(keyset.compile(dialect=sqlite.dialect(), compile_kwargs=options))
@@ -1,4 +1,4 @@
-from datamapper.query.parser import parse_column, parse_order, parse_where
+from datamapper.query.parser import parse_column, parse_having, parse_order, parse_where
 
 
 def test_parse_column() -> None:
@@ -47,3 +47,8 @@ def test_parse_where_alias() -> None:
     name, op = parse_where("p__name__like")
     assert name == "p__name"
     assert op == "like"
+
+
+def test_parse_having() -> None:
+    assert parse_having("count__id") == ("count", "id", "__eq__")
+    assert parse_having("max__p__age__lt") == ("max", "p__age", "__lt__")
@@ -0,0 +1,26 @@
+from datamapper import Query, dec, expr, inc
+from datamapper.query.update import has_expressions, to_update_values
+from tests.support import Pet, to_sql
+
+
+def test_inc():
+    values = to_update_values(Pet.__table__, {"age": inc(), "name": "A"})
+    sql = to_sql(Query(Pet).to_update_sql().values(values))
+    assert "SET name='A', age=(pets.age + 1)" in sql
+
+
+def test_dec():
+    values = to_update_values(Pet.__table__, {"age": dec(2)})
+    sql = to_sql(Query(Pet).to_update_sql().values(values))
+    assert "SET age=(pets.age - 2)" in sql
+
+
+def test_expr():
+    values = to_update_values(Pet.__table__, {"age": expr(lambda age: age * 2)})
+    sql = to_sql(Query(Pet).to_update_sql().values(values))
+    assert "SET age=(pets.age * 2)" in sql
+
+
+def test_has_expressions():
+    assert has_expressions({"age": inc(), "name": "A"})
+    assert not has_expressions({"name": "A"})
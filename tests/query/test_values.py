@@ -0,0 +1,24 @@
+from datamapper.query.values import update_from_values, update_with_case
+from tests.support import Pet, to_sql
+
+ROWS = [{"id": 1, "name": "A", "age": 2}, {"id": 2, "name": "B", "age": None}]
+
+
+def test_update_from_values():
+    sql = to_sql(update_from_values(Pet.__table__, ROWS))
+    assert sql == (
+        "UPDATE pets SET name=v.name, age=v.age FROM (VALUES "
+        "(CAST(1 AS INTEGER), CAST('A' AS VARCHAR(255)), CAST(2 AS INTEGER)), "
+        "(CAST(2 AS INTEGER), CAST('B' AS VARCHAR(255)), CAST(NULL AS INTEGER))) "
+        "AS v (id, name, age) WHERE pets.id = v.id"
+    )
+
+
+def test_update_with_case():
+    sql = to_sql(update_with_case(Pet.__table__, ROWS))
+    assert sql == (
+        "UPDATE pets "
+        "SET name=CASE pets.id WHEN 1 THEN 'A' WHEN 2 THEN 'B' ELSE pets.name END, "
+        "age=CASE pets.id WHEN 1 THEN 2 WHEN 2 THEN NULL ELSE pets.age END "
+        "WHERE pets.id IN (1, 2)"
+    )
@@ -44,7 +44,8 @@ class Pet(Model):
         metadata,
         sa.Column("id", sa.Integer, primary_key=True),
         sa.Column("name", sa.String(255)),
-        sa.Column("owner_id", sa.Integer, sa.ForeignKey("users.id")),
+        sa.Column("owner_id", sa.Integer, sa.ForeignKey("users.id"), index=True),
+        sa.Column("age", sa.Integer),
     )
 
     __associations__ = Associations(BelongsTo("owner", User, "owner_id"))
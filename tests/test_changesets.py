@@ -4,6 +4,7 @@ import pytest
 import sqlalchemy as sa
 
 from datamapper.changeset import Changeset
+from datamapper.changeset.schema import model_schema
 from datamapper.model import Associations, HasMany, HasOne, Model, Table
 from tests.support import Home, User, metadata
 
@@ -89,6 +90,20 @@ def test_cast_type_check(key, val, valid, error):
         assert changeset.errors[key] == [error]
 
 
+def test_cast_schema_is_cached():
+    assert model_schema(Book) is model_schema(Book)
+    assert model_schema(Book).types["pages"] is int
+    assert model_schema(Book).checks["pages"] == (int, "Not a valid integer.")
+
+
+def test_cast_params():
+    params = {"title": "Emma", "pages": "six", "slug": "", "foo": "bar"}
+    changeset = Changeset(Book()).cast(params, ["title", "pages", "slug"])
+    assert changeset.params == {"title": "Emma", "pages": "six"}
+    assert changeset.changes == {"title": "Emma"}
+    assert changeset.errors == {"pages": ["Not a valid integer."]}
+
+
 def test_cast_default_empty_values():
     params = {"title": "", "slug": "not-empty", "pages": None}
     assert (Changeset(Book()).cast(params, ["title", "slug", "pages"])).changes == {
@@ -384,6 +399,15 @@ def test_validate_length_exact():
     ).errors["isbn"] == ["should be 10 characters"]
 
 
+def test_validate_multiple_errors():
+    changeset = (
+        Changeset(Book())
+        .cast({"pages": "six"}, ["pages"])
+        .add_error("pages", "is required")
+    )
+    assert changeset.errors == {"pages": ["Not a valid integer.", "is required"]}
+
+
 def test_validate_length_minimum():
     assert (
         Changeset(Book())
@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+from datamapper import Changeset
+from datamapper._coalesce import InsertCoalescer
+from tests.support import Pet, User
+
+
+@pytest.mark.asyncio
+async def test_coalesce_groups():
+    batches = []
+
+    async def insert_rows(changesets):
+        batches.append([c.changes for c in changesets])
+        return list(range(len(changesets)))
+
+    coalescer = InsertCoalescer(insert_rows, window=0.001, size=10)
+    ids = await asyncio.gather(
+        coalescer.insert(Changeset(User()).change({"name": "A"})),
+        coalescer.insert(Changeset(Pet()).change({"name": "B"})),
+        coalescer.insert(Changeset(User()).change({"name": "C"})),
+    )
+
+    assert ids == [0, 0, 1]
+    assert sorted(batches, key=len) == [
+        [{"name": "B"}],
+        [{"name": "A"}, {"name": "C"}],
+    ]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_cancelled():
+    async def insert_rows(changesets):
+        return list(range(len(changesets)))
+
+    coalescer = InsertCoalescer(insert_rows, window=0.001, size=10)
+    task = asyncio.ensure_future(
+        coalescer.insert(Changeset(User()).change({"name": "A"}))
+    )
+    await asyncio.sleep(0)
+    task.cancel()
+
+    # The cancelled insert is still written with the rest of its batch.
+    assert await coalescer.insert(Changeset(User()).change({"name": "B"})) == 1
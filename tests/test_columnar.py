@@ -0,0 +1,42 @@
+from array import array
+
+import pytest
+import sqlalchemy as sa
+
+import datamapper._columnar as columnar
+from datamapper._columnar import to_array, to_columns
+
+
+def test_to_columns():
+    rows = [{"id": 1, "name": "Fred"}, {"id": 2, "name": "Sue"}]
+    types = [sa.Integer(), sa.String()]
+    result = to_columns(["id", "name"], types, rows)
+    assert list(result["id"]) == [1, 2]
+    assert list(result["name"]) == ["Fred", "Sue"]
+
+
+def test_to_columns_untyped():
+    result = to_columns(["value"], [sa.types.NullType()], [{"value": 1}])
+    assert list(result["value"]) == [1]
+
+
+def test_to_columns_empty():
+    result = to_columns(["id"], [sa.Integer()], [])
+    assert list(result["id"]) == []
+
+
+def test_to_array_numpy():
+    numpy = pytest.importorskip("numpy")
+    assert to_array([1, 2], int).dtype == numpy.int64
+    assert to_array([1.5], float).dtype == numpy.float64
+    assert to_array(["a"], str).dtype == object
+    assert to_array([1, None], int).dtype == object
+
+
+def test_to_array_fallback(monkeypatch):
+    monkeypatch.setattr(columnar, "HAS_NUMPY", False)
+    assert to_array([1, 2], int) == array("q", [1, 2])
+    assert to_array([1.5], float) == array("d", [1.5])
+    assert to_array(["a"], str) == ["a"]
+    assert to_array([1, None], int) == [1, None]
+    assert to_array([1], None) == [1]
@@ -0,0 +1,158 @@
+import pytest
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from datamapper import Query
+from datamapper.errors import MissingIndexWarning
+from datamapper.explain import (
+    Explain,
+    check_indexes,
+    is_indexed,
+    parse_mysql,
+    parse_plan,
+    parse_postgresql,
+    parse_sqlite,
+)
+from tests.support import Pet, User
+
+POSTGRESQL_PLAN = """
+[
+  {
+    "Plan": {
+      "Node Type": "Limit",
+      "Total Cost": 8.17,
+      "Plan Rows": 1,
+      "Actual Rows": 1,
+      "Plans": [
+        {
+          "Node Type": "Index Scan",
+          "Relation Name": "users",
+          "Index Name": "users_pkey",
+          "Total Cost": 8.17,
+          "Plan Rows": 1,
+          "Actual Rows": 1
+        }
+      ]
+    }
+  }
+]
+"""
+
+MYSQL_PLAN = """
+-> Limit: 1 row(s)  (cost=0.35 rows=1) (actual time=0.031..0.033 rows=1 loops=1)
+    -> Nested loop inner join  (cost=0.70 rows=1)
+        -> Table scan on users  (cost=0.35 rows=1)
+        -> Index lookup on p using ix_pets_owner_id (owner_id=users.id)  (cost=0.35 rows=1)
+"""
+
+
+def test_explain_compile():
+    sql = Explain(Query(User).where(id=1).to_sql())
+    assert str(sql.compile(dialect=sqlite.dialect())).startswith(
+        "EXPLAIN QUERY PLAN SELECT"
+    )
+    assert str(sql.compile(dialect=mysql.dialect())).startswith(
+        "EXPLAIN FORMAT=TREE SELECT"
+    )
+    assert str(sql.compile(dialect=postgresql.dialect())).startswith(
+        "EXPLAIN (FORMAT JSON) SELECT"
+    )
+    assert str(sql.compile()).startswith("EXPLAIN SELECT")
+
+
+def test_explain_compile_analyze():
+    sql = Explain(Query(User).to_sql(), analyze=True)
+    assert str(sql.compile(dialect=mysql.dialect())).startswith(
+        "EXPLAIN ANALYZE SELECT"
+    )
+    assert str(sql.compile(dialect=postgresql.dialect())).startswith(
+        "EXPLAIN (ANALYZE, FORMAT JSON) SELECT"
+    )
+    assert str(sql.compile()).startswith("EXPLAIN ANALYZE SELECT")
+
+
+def test_parse_postgresql():
+    plan = parse_postgresql(POSTGRESQL_PLAN)
+    assert plan.node_type == "Limit"
+    assert plan.cost == 8.17
+    assert plan.rows == 1
+    assert plan.actual_rows == 1
+
+    scan = plan.children[0]
+    assert scan.node_type == "Index Scan"
+    assert scan.relation == "users"
+    assert scan.index == "users_pkey"
+
+
+def test_parse_mysql():
+    plan = parse_mysql(MYSQL_PLAN)
+    assert plan.node_type == "Limit"
+    assert plan.rows == 1
+    assert plan.actual_rows == 1
+    assert plan.cost == 0.35
+
+    join = plan.children[0]
+    assert join.node_type == "Nested loop inner join"
+    assert join.actual_rows is None
+
+    scan, lookup = join.children
+    assert scan.node_type == "Table scan"
+    assert scan.relation == "users"
+    assert scan.index is None
+    assert lookup.node_type == "Index lookup"
+    assert lookup.relation == "p"
+    assert lookup.index == "ix_pets_owner_id"
+
+
+def test_parse_sqlite():
+    plan = parse_sqlite(
+        [
+            (2, 0, 0, "SEARCH users USING INTEGER PRIMARY KEY (rowid=?)"),
+            (8, 0, 0, "LIST SUBQUERY 1"),
+            (10, 8, 0, "SCAN pets USING COVERING INDEX ix_pets_owner_id"),
+        ]
+    )
+    assert plan.node_type == "Query Plan"
+
+    search, subquery = plan.children
+    assert search.node_type == "SEARCH"
+    assert search.relation == "users"
+    assert search.index == "INTEGER PRIMARY KEY"
+    assert subquery.node_type == "LIST SUBQUERY 1"
+    assert subquery.children[0].index == "ix_pets_owner_id"
+    assert [node.node_type for node in plan.walk()] == [
+        "Query Plan",
+        "SEARCH",
+        "LIST SUBQUERY 1",
+        "SCAN",
+    ]
+
+
+def test_parse_plan_unsupported():
+    with pytest.raises(NotImplementedError):
+        parse_plan("oracle", [])
+
+
+def test_is_indexed():
+    assert is_indexed(User.__table__, "id")
+    assert is_indexed(Pet.__table__, "owner_id")
+    assert not is_indexed(User.__table__, "name")
+
+
+def test_check_indexes():
+    query = Query(User).join("pets", "p").where(p__owner_id=1).order_by("name")
+
+    with pytest.warns(MissingIndexWarning) as record:
+        check_indexes(query._referenced_columns())
+
+    assert len(record) == 1
+    assert str(record[0].message) == "column 'name' is not indexed for table 'users'"
+
+
+def test_check_indexes_compound():
+    query = Query(User).where(name="A").union(Query(User).where(id=1))
+    query = query.where(name="B")
+
+    with pytest.warns(MissingIndexWarning) as record:
+        check_indexes(query._referenced_columns())
+
+    assert len(record) == 1
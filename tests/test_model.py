@@ -1,9 +1,15 @@
+import pickle
+
 import pytest
 
 from datamapper import Associations, BelongsTo, HasMany, HasOne, Model
-from datamapper.errors import NotLoadedError, UnknownAssociationError
+from datamapper.errors import (
+    ColumnNotLoadedError,
+    NotLoadedError,
+    UnknownAssociationError,
+)
 from datamapper.model import Cardinality
-from tests.support import Home, User
+from tests.support import Home, Pet, User
 
 
 def test_model_associations():
@@ -117,3 +123,128 @@ def test_associations():
     assert associations["user"] == user
     assert len(associations) == 1
     assert list(associations) == ["user"]
+
+
+class Row(dict):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reads = []
+
+    def __getitem__(self, key):
+        self.reads.append(key)
+        return super().__getitem__(key)
+
+
+def test_model_deserialize_lazy():
+    row = Row(id=1, name="Foo")
+    user = User._deserialize(row, lazy=True)
+    assert row.reads == []
+    assert user.name == "Foo"
+    assert user.name == "Foo"
+    assert row.reads == ["name"]
+
+
+def test_model_deserialize_lazy_attributes():
+    row = Row(id=1, name="Foo")
+    user = User._deserialize(row, lazy=True)
+    assert user.attributes == {"id": 1, "name": "Foo"}
+    assert user.id == 1
+    assert row.reads == ["id", "name"]
+
+
+def test_model_deserialize_lazy_setattr():
+    user = User._deserialize(Row(id=1, name="Foo"), lazy=True)
+    user.name = "Bar"
+    assert user.attributes == {"id": 1, "name": "Bar"}
+
+
+def test_model_pickle():
+    user = User(id=1, name="Foo")
+    user._Model__loaded_associations["pets"] = [Pet(id=2, owner_id=1)]
+
+    restored = pickle.loads(pickle.dumps(user))
+    assert restored.attributes == {"id": 1, "name": "Foo"}
+    assert restored.pets[0].owner_id == 1
+
+
+def test_model_pickle_lazy():
+    user = User._deserialize(Row(id=1, name="Foo"), lazy=True)
+    restored = pickle.loads(pickle.dumps(user))
+    assert restored.attributes == {"id": 1, "name": "Foo"}
+
+
+def test_model_changed_attributes():
+    user = User._deserialize({"id": 1, "name": "Foo"})
+    assert user.changed_attributes == {}
+
+    user.name = "Bar"
+    assert user.changed_attributes == {"name": "Bar"}
+
+    user.name = "Foo"
+    assert user.changed_attributes == {}
+
+
+def test_model_changed_attributes_lazy():
+    row = Row(id=1, name="Foo")
+    user = User._deserialize(row, lazy=True)
+    assert user.changed_attributes == {}
+    assert row.reads == []
+
+    user.name = "Bar"
+    assert user.changed_attributes == {"name": "Bar"}
+
+
+def test_model_changed_attributes_new():
+    assert User(name="Foo").changed_attributes == {"name": "Foo"}
+
+
+def test_model_pickle_changed_attributes():
+    user = User._deserialize({"id": 1, "name": "Foo"})
+    user.name = "Bar"
+
+    restored = pickle.loads(pickle.dumps(user))
+    assert restored.changed_attributes == {"name": "Bar"}
+
+
+def test_model_unloaded_column():
+    user = User._deserialize({"id": 1}, unloaded=frozenset(["name"]))
+    assert user.id == 1
+    assert user.attributes == {"id": 1}
+    assert user._unloaded_columns() == {"name"}
+
+    message = "column 'name' is not loaded for model 'User'"
+    with pytest.raises(ColumnNotLoadedError, match=message):
+        user.name
+
+
+def test_model_unloaded_column_lazy():
+    user = User._deserialize(Row(id=1), lazy=True, unloaded=frozenset(["name"]))
+    assert user.attributes == {"id": 1}
+
+    with pytest.raises(ColumnNotLoadedError):
+        user.name
+
+
+def test_model_unloaded_column_setattr():
+    user = User._deserialize({"id": 1}, unloaded=frozenset(["name"]))
+    user.name = "Foo"
+    assert user.name == "Foo"
+    assert user._unloaded_columns() == frozenset()
+    assert user.changed_attributes == {"name": "Foo"}
+
+
+def test_model_load_columns():
+    user = User._deserialize({"id": 1}, unloaded=frozenset(["name"]))
+    user._load_columns({"name": "Foo"})
+    assert user.name == "Foo"
+    assert user._unloaded_columns() == frozenset()
+    assert user.changed_attributes == {}
+
+
+def test_model_pickle_unloaded_column():
+    user = User._deserialize({"id": 1}, unloaded=frozenset(["name"]))
+    restored = pickle.loads(pickle.dumps(user))
+    assert restored._unloaded_columns() == {"name"}
+
+    with pytest.raises(ColumnNotLoadedError):
+        restored.name
@@ -0,0 +1,24 @@
+import pytest
+
+from datamapper import Multi
+from datamapper.errors import ConflictingStepError
+from tests.support import User
+
+
+def test_multi_steps():
+    multi = Multi().insert("a", User(name="A")).delete("b", User(id=1))
+    assert [(step.name, step.action) for step in multi.steps] == [
+        ("a", "insert"),
+        ("b", "delete"),
+    ]
+
+
+def test_multi_immutable():
+    multi = Multi()
+    multi.insert("a", User(name="A"))
+    assert multi.steps == []
+
+
+def test_multi_conflicting_step():
+    with pytest.raises(ConflictingStepError):
+        Multi().insert("a", User(name="A")).insert("a", User(name="B"))
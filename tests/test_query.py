@@ -1,14 +1,24 @@
 import pytest
 from sqlalchemy import text
+from sqlalchemy.dialects import mysql, sqlite
 from sqlalchemy.sql.expression import Select
 
-from datamapper import Query, call, raw
+from datamapper import Query, agg, call, raw, ref
 from datamapper.errors import (
+    InvalidAggregateError,
+    InvalidCursorError,
     InvalidExpressionError,
+    InvalidLockError,
+    InvalidQueryError,
     InvalidSelectError,
     MissingJoinError,
+    UnknownColumnError,
 )
-from tests.support import User, to_sql
+from tests.support import Home, Pet, User, to_sql
+
+
+class DeferredPet(Pet):
+    __deferred__ = ("age",)
 
 
 def test_to_sql():
@@ -136,6 +146,320 @@ def test_where_invalid():
         query.to_sql()
 
 
+def test_where_ref():
+    query = Query(Pet).join("owner", "o").where(name=ref("o__name"))
+    assert "WHERE pets.name = o.name" in to_sql(query.to_sql())
+
+
+def test_where_in_subquery():
+    query = Query(User).where(id__in=Query(Pet).select("owner_id"))
+    sql = to_sql(query.to_sql())
+    assert "WHERE users.id IN (SELECT pets.owner_id \nFROM pets)" in sql
+
+
+def test_where_scalar_subquery():
+    subquery = Query(Pet).select(agg("max", "owner_id"))
+    query = Query(User).where(id=subquery)
+    assert "WHERE users.id = (SELECT max(pets.owner_id)" in to_sql(query.to_sql())
+
+
+def test_where_exists():
+    query = Query(User).where_exists(Query(Pet).where(owner_id=ref("users__id")))
+    sql = to_sql(query.to_sql())
+    assert "WHERE EXISTS (SELECT" in sql
+    assert "WHERE pets.owner_id = users.id)" in sql
+
+
+def test_where_exists_outer_alias():
+    subquery = Query(Pet).where(id=ref("p__id"))
+    query = Query(User).join("pets", "p").where_exists(subquery)
+    assert "WHERE pets.id = p.id)" in to_sql(query.to_sql())
+
+
+def test_where_exists_association():
+    query = Query(User).where_exists("pets", name="Fido")
+    sql = to_sql(query.to_sql())
+    assert "WHERE EXISTS (SELECT" in sql
+    assert "WHERE pets.name = 'Fido' AND pets.owner_id = users.id)" in sql
+
+
+def test_where_exists_nested_association():
+    query = Query(Home).where_exists("owner.pets", name="Fido")
+    sql = to_sql(query.to_sql())
+    assert "WHERE pets.name = 'Fido' AND pets.owner_id = users.id))" in sql
+    assert "AND users.id = homes.owner_id)" in sql
+
+
+def test_where_not_exists():
+    query = Query(User).where_not_exists("pets")
+    sql = to_sql(query.to_sql())
+    assert "WHERE NOT (EXISTS (SELECT" in sql
+    assert "WHERE pets.owner_id = users.id))" in sql
+
+
+def test_with_cte():
+    owners = Query(Pet).where(name="Fido").select("owner_id")
+    query = Query(User).with_cte("o", owners).where(id=ref("o__owner_id"))
+    sql = to_sql(query.to_sql())
+    assert sql.startswith("WITH o AS")
+    assert "WHERE users.id = o.owner_id" in sql
+
+
+def test_only():
+    query = Query(User).only("name")
+    assert to_sql(query.to_sql()).startswith("SELECT users.id, users.name \nFROM")
+
+    query = Query(Pet).only("name")
+    assert to_sql(query.to_sql()).startswith("SELECT pets.id, pets.name \nFROM")
+    assert query._deserialize({"id": 1, "name": "Fido"})._unloaded_columns() == {
+        "owner_id",
+        "age",
+    }
+
+
+def test_only_preload():
+    query = Query(Pet).only("name").preload("owner")
+    sql = to_sql(query.to_sql())
+    assert sql.startswith("SELECT pets.id, pets.name, pets.owner_id \nFROM")
+
+
+def test_only_invalid():
+    with pytest.raises(UnknownColumnError):
+        Query(User).only("trash")
+
+
+def test_deferred():
+    query = Query(DeferredPet)
+    assert to_sql(query.to_sql()).startswith("SELECT pets.id, pets.name, pets.owner_id")
+    assert query._column_names() == ["id", "name", "owner_id"]
+
+    query = Query(DeferredPet).only("age")
+    assert to_sql(query.to_sql()).startswith("SELECT pets.id, pets.age \nFROM")
+
+
+def test_lock():
+    query = Query(User).lock()
+    assert to_sql(query.to_sql()).rstrip().endswith("FOR UPDATE")
+
+
+def test_lock_options():
+    query = Query(User).lock("share", skip_locked=True)
+    assert to_sql(query.to_sql()).rstrip().endswith("FOR SHARE SKIP LOCKED")
+
+    query = Query(User).lock("no_key_update", nowait=True)
+    assert to_sql(query.to_sql()).rstrip().endswith("FOR NO KEY UPDATE NOWAIT")
+
+    query = Query(User).lock("key_share")
+    assert to_sql(query.to_sql()).rstrip().endswith("FOR KEY SHARE")
+
+    with pytest.raises(ValueError):
+        Query(User).lock(skip_locked=True, nowait=True)
+
+
+def test_lock_mysql():
+    def to_mysql(query):
+        return str(query.to_sql().compile(dialect=mysql.dialect())).rstrip()
+
+    assert to_mysql(Query(User).lock()).endswith("FOR UPDATE")
+    assert to_mysql(Query(User).lock("share")).endswith("LOCK IN SHARE MODE")
+
+    query = Query(User).limit(1).lock("share", skip_locked=True)
+    assert to_mysql(query).endswith("LIMIT %s FOR SHARE SKIP LOCKED")
+
+    query = Query(User).lock("key_share", nowait=True)
+    assert to_mysql(query).endswith("FOR SHARE NOWAIT")
+
+    query = Query(User).lock("no_key_update", skip_locked=True)
+    assert to_mysql(query).endswith("FOR UPDATE SKIP LOCKED")
+
+
+def test_lock_other_dialects():
+    sql = Query(User).lock().to_sql().compile(dialect=sqlite.dialect())
+    assert "FOR" not in str(sql)
+
+    # Dialects without their own lock syntax use plain `FOR UPDATE`.
+    sql = Query(User).lock("share", nowait=True).to_sql()
+    assert str(sql).rstrip().endswith("FOR UPDATE NOWAIT")
+
+
+def test_lock_update_sql():
+    query = Query(User).where(id=1).lock()
+    assert "FOR UPDATE" not in to_sql(query.to_update_sql())
+
+
+def test_lock_invalid():
+    with pytest.raises(InvalidLockError, match="lock mode 'trash' is not supported"):
+        Query(User).lock("trash")
+
+
+def test_union():
+    query = Query(User).where(id=1).union(Query(User).where(id=2).order_by("name"))
+    sql = to_sql(query.to_sql())
+    assert sql.startswith("SELECT anon_1.id, anon_1.name \nFROM (SELECT")
+    assert "WHERE users.id = 1 UNION SELECT" in sql
+    assert sql.endswith("WHERE users.id = 2) AS anon_1")
+
+
+def test_union_all():
+    query = Query(User).where(id=1).union_all(Query(User).where(id=2))
+    assert "WHERE users.id = 1 UNION ALL SELECT" in to_sql(query.to_sql())
+
+
+def test_intersect():
+    query = Query(User).where(id=1).intersect(Query(User).where(name="Sue"))
+    assert "WHERE users.id = 1 INTERSECT SELECT" in to_sql(query.to_sql())
+
+
+def test_union_order_limit():
+    query = Query(User).union(Query(User)).order_by("-name", text("id")).limit(1)
+    sql = to_sql(query.to_sql())
+    assert sql.endswith(") AS anon_1 ORDER BY anon_1.name DESC, id \n LIMIT 1")
+
+
+def test_union_mixed():
+    other = Query(User).where(id=2)
+    query = Query(User).where(id=1).union(other).intersect(other)
+    sql = to_sql(query.to_sql())
+    assert sql.startswith("SELECT anon_1.id, anon_1.name \nFROM (SELECT anon_2.id")
+    assert "WHERE users.id = 2) AS anon_2 INTERSECT SELECT" in sql
+
+
+def test_union_outer_clauses():
+    query = Query(User).where(id=1).union(Query(User).where(id=2))
+    query = query.where(name="Sue").select("name").distinct()
+    sql = to_sql(query.to_sql())
+    assert sql.startswith("SELECT DISTINCT anon_1.name \nFROM (SELECT")
+    assert sql.endswith(") AS anon_1 \nWHERE anon_1.name = 'Sue'")
+
+    # A compound query with outer clauses becomes the first part.
+    sql = to_sql(query.union(Query(User).select("name")).to_sql())
+    assert sql.startswith("SELECT anon_1.name \nFROM (SELECT DISTINCT anon_2.name")
+
+    with pytest.raises(UnknownColumnError):
+        query = Query(User).select("id").union(Query(User).select("id"))
+        query.where(name="Sue").to_sql()
+
+
+def test_union_subquery():
+    users = Query(User).where(id=1).union(Query(User).where(id=2)).select("id")
+    sql = to_sql(Query(Pet).where(owner_id__in=users).to_sql())
+    assert "WHERE pets.owner_id IN (SELECT anon_1.id" in sql
+    assert "WHERE users.id = 1 UNION SELECT" in sql
+
+
+def test_union_invalid():
+    query = Query(User).union(Query(User))
+
+    with pytest.raises(InvalidQueryError, match="can't update or delete"):
+        query.to_update_sql()
+
+    with pytest.raises(InvalidQueryError, match="can't update or delete"):
+        query.to_delete_sql()
+
+    with pytest.raises(InvalidQueryError, match="can't be joined"):
+        query.join("pets").to_sql()
+
+    with pytest.raises(InvalidQueryError, match="can't be locked"):
+        query.lock().to_sql()
+
+
+def test_union_shape():
+    query = Query(User).select("name").union(Query(User).select("name"))
+    assert query._column_names() == ["name"]
+    assert query._deserialize({"name": "Sue"}) == "Sue"
+
+    query = Query(User).union(Query(User)).as_records()
+    assert query._column_names() == ["id", "name"]
+    assert query._deserialize({"id": 1, "name": "Sue"}).name == "Sue"
+
+
+def test_from_sql():
+    query = Query(User).from_sql("SELECT * FROM users WHERE name = :name", name="Sue")
+    assert to_sql(query.to_sql()) == (
+        "SELECT * \nFROM (SELECT * FROM users WHERE name = 'Sue') AS anon_1"
+    )
+
+
+def test_from_sql_clauses():
+    query = Query(User).from_sql("SELECT * FROM users")
+    query = query.where(name="Sue").order_by("-id").limit(2).select(("id", "name"))
+    assert to_sql(query.to_sql()) == (
+        "SELECT anon_1.id, anon_1.name \n"
+        "FROM (SELECT * FROM users) AS anon_1 \n"
+        "WHERE anon_1.name = 'Sue' ORDER BY anon_1.id DESC \n"
+        " LIMIT 2"
+    )
+
+
+def test_from_sql_deserialize():
+    query = Query(User).from_sql("SELECT id FROM users")
+    user = query._deserialize({"id": 1, "extra": 2})
+    assert user.id == 1
+    assert user._unloaded_columns() == {"name"}
+
+
+def test_from_sql_select():
+    query = Query(User).from_sql("SELECT name, id FROM users")
+    query = query.select({"id": "id", "name": call(str.upper, "name"), "x": raw(1)})
+    row = {"id": 1, "name": "sue", "x": 1}
+    assert query._deserialize(row) == {"id": 1, "name": "SUE", "x": 1}
+
+    query = Query(User).from_sql("SELECT count(*) AS n FROM users").select("n")
+    assert query._column_names() == ["n"]
+    assert query._deserialize({"n": 2}) == 2
+
+
+def test_from_sql_invalid():
+    query = Query(User).from_sql("SELECT * FROM users")
+
+    with pytest.raises(InvalidQueryError, match="can't update or delete"):
+        query.to_update_sql()
+
+    with pytest.raises(InvalidQueryError, match="can't update or delete"):
+        query.to_delete_sql()
+
+    with pytest.raises(InvalidQueryError, match="raw SQL queries can't be joined"):
+        query.join("pets").to_sql()
+
+    with pytest.raises(InvalidQueryError, match="raw SQL queries can't be locked"):
+        query.lock().to_sql()
+
+
+def test_distinct():
+    query = Query(Pet).select("name").distinct()
+    assert to_sql(query.to_sql()).startswith("SELECT DISTINCT pets.name")
+
+
+def test_distinct_on():
+    query = Query(User).join("pets", "p").distinct_on("p__name").order_by("p__name")
+    sql = to_sql(query.to_sql())
+    assert sql.startswith("SELECT DISTINCT ON (p.name) users.id")
+    assert sql.endswith("ORDER BY p.name ASC")
+
+
+def test_distinct_on_params():
+    query = Query(Pet).where(age__gt=1).where(text("pets.age < :x").bindparams(x=9))
+    compiled = query.distinct_on("owner_id").to_sql().compile(dialect=sqlite.dialect())
+    assert len(set(compiled.positiontup)) == len(compiled.positiontup) == 5
+
+
+def test_distinct_roots_select():
+    query = Query(User).join("pets", "p").select("p__name").distinct_roots()
+    sql = to_sql(query.to_sql())
+    assert sql.startswith("SELECT p.name, users.id AS root_key_for_distinct")
+    assert query._root_key() == "root_key_for_distinct"
+    assert Query(User).distinct_roots()._root_key() == "id"
+
+    query = Query(User).from_sql("SELECT * FROM users").distinct_roots()
+    with pytest.raises(InvalidQueryError, match="can't use distinct_roots"):
+        query.to_sql()
+
+
+def test_distinct_update_sql():
+    query = Query(User).where(id=1).distinct()
+    assert "DISTINCT" not in to_sql(query.to_update_sql())
+
+
 def test_order_by():
     query = Query(User).order_by("name")
     assert "ORDER BY users.name ASC" in to_sql(query.to_sql())
@@ -306,3 +630,109 @@ def test_select_invalid():
 
     with pytest.raises(InvalidExpressionError, match=message):
         query._deserialize({})
+
+
+def test_column_names():
+    assert Query(User)._column_names() == ["id", "name"]
+    assert Query(User).select("name")._column_names() == ["name"]
+    assert Query(User).select(["id", "p__id"])._column_names() == ["id", "p__id"]
+    assert Query(User).select({"pet": "p__id"})._column_names() == ["pet"]
+    assert Query(User).select(User.__table__.c.id)._column_names() == ["id"]
+    assert Query(User).select(text("1"))._column_names() == ["column0"]
+
+
+def test_column_names_invalid():
+    with pytest.raises(InvalidExpressionError):
+        Query(User).select(raw(1))._column_names()
+
+
+def test_paginate_after_first_page():
+    query = Query(User).order_by("-name").paginate_after(None, 10)
+    sql = to_sql(query.to_sql())
+    assert "WHERE" not in sql
+    assert "ORDER BY users.name DESC, users.id ASC" in sql
+    assert "LIMIT 10" in sql
+
+
+def test_paginate_after():
+    cursor = Query(User).order_by("name")._cursor(User(id=9, name="Fred"))
+    query = Query(User).order_by("name").paginate_after(cursor, 10)
+    sql = to_sql(query.to_sql())
+    assert "WHERE users.name > 'Fred' OR users.name IS NULL OR" in sql
+    assert "ORDER BY users.name ASC, users.id ASC" in sql
+
+    cursor = Query(User).order_by("-id")._cursor(User(id=9))
+    query = Query(User).order_by("-id").paginate_after(cursor, 10)
+    assert "WHERE (users.id) < (9)" in to_sql(query.to_sql())
+
+
+def test_paginate_after_mismatch():
+    cursor = Query(User)._cursor(User(id=9))
+    query = Query(User).order_by("name").paginate_after(cursor, 10)
+
+    with pytest.raises(InvalidCursorError, match="doesn't match"):
+        query.to_sql()
+
+
+def test_paginate_after_shape():
+    user = User(id=9, name="Fred")
+
+    with pytest.raises(InvalidCursorError, match="have no position"):
+        Query(User).as_tuples()._cursor((9, "Fred"))
+
+    with pytest.raises(InvalidCursorError, match="have no position"):
+        Query(User).select("id")._cursor(9)
+
+    with pytest.raises(InvalidCursorError, match="'name' is not in the results"):
+        Query(User).only().order_by("name")._cursor(user)
+
+    with pytest.raises(InvalidCursorError, match="'p__name' is not in the results"):
+        Query(User).join("pets", "p").order_by("p__name")._cursor(user)
+
+
+def test_paginate_after_clause():
+    query = Query(User).order_by(text("1")).paginate_after(None, 10)
+
+    with pytest.raises(InvalidCursorError, match="ordered by column names"):
+        query.to_sql()
+
+
+def test_reorder():
+    query = Query(User).order_by("name").reorder("-id")
+    assert "ORDER BY users.id DESC" in to_sql(query.to_sql())
+    assert "ORDER BY" not in to_sql(query.reorder().to_sql())
+
+
+def test_select_agg():
+    query = Query(Pet).select(("owner_id", agg("sum", "age"), agg("count")))
+    assert "SELECT pets.owner_id, sum(pets.age) AS sum_1, count(pets.id)" in to_sql(
+        query.to_sql()
+    )
+
+
+def test_select_agg_invalid():
+    with pytest.raises(InvalidAggregateError):
+        Query(Pet).select(agg("median", "age")).to_sql()
+
+
+def test_group_by():
+    query = Query(User).join("pets", "p").group_by("id", "p__name", text("1"))
+    assert "GROUP BY users.id, p.name, 1" in to_sql(query.to_sql())
+
+
+def test_group_by_invalid():
+    with pytest.raises(InvalidExpressionError):
+        Query(User).group_by(1).to_sql()
+
+
+def test_having():
+    query = Query(User).join("pets", "p").group_by("id").having(count__p__id__gt=1)
+    assert "HAVING count(p.id) > 1" in to_sql(query.to_sql())
+
+    query = Query(User).group_by("id").having(text("1 = 1"))
+    assert "HAVING 1 = 1" in to_sql(query.to_sql())
+
+
+def test_having_invalid():
+    with pytest.raises(InvalidExpressionError):
+        Query(User).group_by("id").having(1).to_sql()
@@ -1,9 +1,35 @@
+import asyncio
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 from databases import Database
 from sqlalchemy import text
-
-from datamapper import Changeset, Query, Repo, call, raw
-from datamapper.errors import InvalidChangesetError
+from sqlalchemy.exc import CompileError
+
+from datamapper import (
+    Changeset,
+    Multi,
+    Query,
+    Repo,
+    Retry,
+    agg,
+    call,
+    dec,
+    expr,
+    inc,
+    raw,
+    ref,
+)
+from datamapper.errors import (
+    ColumnNotLoadedError,
+    InvalidAggregateError,
+    InvalidChangesetError,
+    InvalidCursorError,
+    InvalidQueryError,
+    MissingIndexWarning,
+    MultiStepError,
+)
 from tests.support import DATABASE_URLS, Home, Pet, User, provision_database
 
 
@@ -86,6 +112,333 @@ async def test_count(repo):
     assert await repo.count(User) == 1
 
 
+@pytest.mark.asyncio
+async def test_count_query(repo):
+    for name in ["A", "B", "C"]:
+        user = await repo.insert(User(name=name))
+        await repo.insert(Pet(owner_id=user.id))
+
+    query = Query(User).join("pets", "p").where(name__not_eq="C").order_by("name")
+    assert await repo.count(query) == 2
+    assert await repo.count(query.limit(1)) == 1
+    assert await repo.count(Query(Pet).group_by("owner_id")) == 3
+
+
+@pytest.mark.asyncio
+async def test_all_subquery(repo):
+    fred = await repo.insert(User(name="Fred"))
+    await repo.insert(User(name="Sue"))
+    await repo.insert(Pet(name="Fido", owner_id=fred.id))
+
+    owners = Query(Pet).where(name="Fido").select("owner_id")
+    has_pets = Query(Pet).where(owner_id=ref("users__id"))
+
+    users = await repo.all(Query(User).where(id__in=owners))
+    assert [user.name for user in users] == ["Fred"]
+
+    users = await repo.all(Query(User).where_exists(has_pets))
+    assert [user.name for user in users] == ["Fred"]
+
+    users = await repo.all(
+        Query(User).with_cte("o", owners).where(id=ref("o__owner_id"))
+    )
+    assert [user.name for user in users] == ["Fred"]
+
+
+@pytest.mark.asyncio
+async def test_all_where_exists_association(repo):
+    fred = await repo.insert(User(name="Fred"))
+    await repo.insert(User(name="Sue"))
+    await repo.insert(Pet(name="Fido", owner_id=fred.id))
+    await repo.insert(Pet(name="Fido", owner_id=fred.id))
+
+    users = await repo.all(Query(User).where_exists("pets", name="Fido"))
+    assert [user.name for user in users] == ["Fred"]
+
+    users = await repo.all(Query(User).where_not_exists("pets"))
+    assert [user.name for user in users] == ["Sue"]
+
+
+@pytest.mark.asyncio
+async def test_load_columns(repo):
+    fred = await repo.insert(User(name="Fred"))
+    await repo.insert(Pet(name="Fido", age=3, owner_id=fred.id))
+    await repo.insert(Pet(name="Spot", age=5, owner_id=fred.id))
+
+    pets = await repo.all(Query(Pet).only("name").order_by("name"))
+    assert [pet.name for pet in pets] == ["Fido", "Spot"]
+
+    with pytest.raises(ColumnNotLoadedError):
+        pets[0].age
+
+    await repo.load_columns(pets, "age")
+    assert [pet.age for pet in pets] == [3, 5]
+    assert pets[0]._unloaded_columns() == {"owner_id"}
+
+    await repo.load_columns(pets)
+    assert [pet.owner_id for pet in pets] == [fred.id, fred.id]
+    assert pets[0].changed_attributes == {}
+
+    await repo.load_columns(pets)
+    await repo.load_columns([])
+
+
+@pytest.mark.asyncio
+async def test_update_unloaded(repo):
+    await repo.insert(Pet(name="Fido", age=3))
+    pet = await repo.one(Query(Pet).only("name"))
+
+    pet = await repo.update(Changeset(pet).cast({"name": "Spot"}, ["name"]))
+    assert pet.name == "Spot"
+
+    with pytest.raises(ColumnNotLoadedError):
+        pet.age
+
+    pet = await repo.update(Changeset(pet).cast({"age": 4}, ["age"]))
+    assert pet.age == 4
+    assert pet._unloaded_columns() == {"owner_id"}
+
+    changeset = Changeset(pet).cast({"owner_id": None}, ["owner_id"])
+    assert changeset.changes == {"owner_id": None}
+
+
+@pytest.mark.asyncio
+async def test_all_union(repo):
+    for name in ["A", "B", "C"]:
+        await repo.insert(User(name=name))
+
+    a = Query(User).where(name="A")
+    b = Query(User).where(name="B")
+    ab = Query(User).where(name__in=["A", "B"])
+
+    users = await repo.all(a.union(b).union(ab).order_by("-name"))
+    assert [user.name for user in users] == ["B", "A"]
+
+    users = await repo.all(a.union_all(ab).order_by("name").limit(2))
+    assert [user.name for user in users] == ["A", "A"]
+
+    names = await repo.all(ab.select("name").intersect(b.select("name")))
+    assert names == ["B"]
+
+    assert await repo.count(a.union_all(ab)) == 3
+
+
+@pytest.mark.asyncio
+async def test_union_outer_clauses(repo):
+    for name in ["A", "B", "C", "D"]:
+        await repo.insert(User(name=name))
+
+    query = Query(User).where(name__in=["A", "B"]).union(Query(User).where(name="D"))
+    users = await repo.all(query.where(name__not_eq="B").order_by("name"))
+    assert [user.name for user in users] == ["A", "D"]
+
+    users, cursor = await repo.paginate(query.order_by("name"), 2)
+    assert [user.name for user in users] == ["A", "B"]
+    users, cursor = await repo.paginate(query.order_by("name"), 2, cursor)
+    assert [user.name for user in users] == ["D"]
+    assert cursor is None
+
+    chunks = [chunk async for chunk in repo.chunked(query, size=2)]
+    assert [[user.name for user in chunk] for chunk in chunks] == [["A", "B"], ["D"]]
+
+    columns = await repo.all_columnar(query.order_by("name"))
+    assert list(columns["name"]) == ["A", "B", "D"]
+
+    assert await repo.aggregate(query, "count") == 3
+    assert await repo.aggregate(query, "max", "name") == "D"
+    assert await repo.exists(query.where(name="D"))
+
+
+@pytest.mark.asyncio
+async def test_union_write(repo):
+    for name in ["A", "B", "C"]:
+        await repo.insert(User(name=name))
+
+    query = Query(User).where(name="A").union(Query(User).where(name="B"))
+
+    with pytest.raises(InvalidQueryError):
+        await repo.delete_all(query)
+
+    with pytest.raises(InvalidQueryError):
+        await repo.update_all_with(query, {"name": "Z"}, batch_size=1)
+
+    assert await list_users(repo) == ["A", "B", "C"]
+
+
+@pytest.mark.asyncio
+async def test_all_raw(repo):
+    fred = await repo.insert(User(name="Fred"))
+    await repo.insert(Pet(name="Fido", owner_id=fred.id))
+
+    sql = "SELECT id, name FROM users WHERE name = :name"
+    users = await repo.all_raw(sql, {"name": "Fred"}, model=User)
+    assert [user.name for user in users] == ["Fred"]
+
+    rows = await repo.all_raw("SELECT count(*) AS n FROM pets")
+    assert rows == [{"n": 1}]
+
+
+@pytest.mark.asyncio
+async def test_all_from_sql(repo):
+    fred = await repo.insert(User(name="Fred"))
+    await repo.insert(Pet(name="Fido", owner_id=fred.id))
+
+    query = Query(User).from_sql("SELECT id FROM users").preload("pets")
+    users = await repo.all(query)
+    assert users[0].pets[0].name == "Fido"
+
+    users = await repo.all(query.lazy())
+    assert users[0].id == fred.id
+
+    records = await repo.all(query.as_records())
+    assert records[0].id == fred.id
+
+    assert await repo.count(query) == 1
+
+
+@pytest.mark.asyncio
+async def test_from_sql_records(repo):
+    for name in ["A", "B"]:
+        await repo.insert(User(name=name))
+
+    query = Query(User).from_sql("SELECT name FROM users ORDER BY name")
+    records = await repo.all(query.as_records())
+    assert [record.name for record in records] == ["A", "B"]
+    assert type(records[0]) is type(records[1])
+    assert records[0]._fields == ("name",)
+
+
+@pytest.mark.asyncio
+async def test_from_sql_outer_clauses(repo):
+    for name in ["Fred", "Sue", "Bob"]:
+        await repo.insert(User(name=name))
+
+    query = Query(User).from_sql("SELECT * FROM users WHERE name != :name", name="Bob")
+
+    users = await repo.all(query.where(name="Sue"))
+    assert [user.name for user in users] == ["Sue"]
+
+    users = await repo.all(query.order_by("-name").limit(1))
+    assert [user.name for user in users] == ["Sue"]
+
+    users, cursor = await repo.paginate(query.order_by("name"), 1)
+    assert [user.name for user in users] == ["Fred"]
+    users, cursor = await repo.paginate(query.order_by("name"), 1, cursor)
+    assert [user.name for user in users] == ["Sue"]
+    assert cursor is None
+
+    chunks = [chunk async for chunk in repo.chunked(query, size=1)]
+    assert [[user.name for user in chunk] for chunk in chunks] == [["Fred"], ["Sue"]]
+
+    assert await repo.count(query) == 2
+    assert await repo.aggregate(query, "count") == 2
+    assert await repo.exists(query.where(name="Sue"))
+    assert not await repo.exists(query.where(name="Bob"))
+
+    columns = await repo.all_columnar(query.order_by("id"))
+    assert list(columns["name"]) == ["Fred", "Sue"]
+    assert list(columns) == ["id", "name"]
+
+
+@pytest.mark.asyncio
+async def test_from_sql_write(repo):
+    await repo.insert(User(name="Fred"))
+    query = Query(User).from_sql("SELECT * FROM users WHERE name = 'Sue'")
+
+    with pytest.raises(InvalidQueryError):
+        await repo.delete_all(query)
+
+    with pytest.raises(InvalidQueryError):
+        await repo.update_all(query, name="Bob")
+
+    assert await repo.count(User) == 1
+
+
+@pytest.mark.asyncio
+async def test_all_distinct(repo):
+    fred = await repo.insert(User(name="Fred"))
+    sue = await repo.insert(User(name="Sue"))
+    await repo.insert(Pet(name="Fido", age=3, owner_id=fred.id))
+    await repo.insert(Pet(name="Spot", age=5, owner_id=fred.id))
+    await repo.insert(Pet(name="Fido", age=1, owner_id=sue.id))
+
+    names = await repo.all(Query(Pet).select("name").distinct().order_by("name"))
+    assert names == ["Fido", "Spot"]
+
+    query = Query(Pet).distinct_on("owner_id").order_by("owner_id", "-age")
+    pets = await repo.all(query)
+    assert [pet.name for pet in pets] == ["Spot", "Fido"]
+    assert await repo.count(query) == 2
+
+    pets, total = await repo.page(query, 1)
+    assert [pet.name for pet in pets] == ["Spot"]
+    assert total == 2
+
+    pets = await repo.all(query.where(age__lt=5, name__not_eq="Spot"))
+    assert [pet.name for pet in pets] == ["Fido", "Fido"]
+    assert [pet.age for pet in pets] == [3, 1]
+
+    query = Query(User).join("pets", "p").order_by("name")
+    users = await repo.all(query.distinct_roots())
+    assert [user.name for user in users] == ["Fred", "Sue"]
+    assert len(await repo.all(query)) == 3
+
+    assert await repo.count(query.distinct_roots()) == 2
+    users, total = await repo.page(query.distinct_roots(), 3)
+    assert [user.name for user in users] == ["Fred", "Sue"]
+    assert total == 2
+
+    names = query.distinct_roots().select("name")
+    assert await repo.all(names) == ["Fred", "Sue"]
+    assert await repo.all(names.select(("name", "p__name"))) == [
+        ("Fred", "Fido"),
+        ("Sue", "Fido"),
+    ]
+    assert await repo.count(names) == 2
+
+    columns = await repo.all_columnar(query.distinct_roots())
+    assert list(columns["name"]) == ["Fred", "Sue"]
+    columns = await repo.all_columnar(names)
+    assert list(columns) == ["name"]
+    assert list(columns["name"]) == ["Fred", "Sue"]
+
+
+@pytest.mark.asyncio
+async def test_distinct_on_join(repo):
+    a = await repo.insert(User(name="A"))
+    await repo.insert(User(name="B"))
+    await repo.insert(Pet(name="Fido", age=3, owner_id=a.id))
+    await repo.insert(Pet(name="Spot", age=5, owner_id=a.id))
+
+    query = (
+        Query(User).join("pets", "p").distinct_on("name").order_by("name", "-p__age")
+    )
+    users = await repo.all(query)
+    assert [user.name for user in users] == ["A"]
+    assert await repo.count(query) == 1
+    assert await repo.all(query.select("p__name")) == ["Spot"]
+
+    query = Query(User).outerjoin("pets", "p").distinct_on("name")
+    users = await repo.all(query.order_by("name", "p__age"))
+    assert [user.name for user in users] == ["A", "B"]
+
+
+@pytest.mark.asyncio
+async def test_count_estimate(repo):
+    await repo.insert(User(name="Foo"))
+    assert await repo.count(User, estimate=True) >= 0
+
+
+@pytest.mark.asyncio
+async def test_exists(repo):
+    assert not await repo.exists(User)
+    await repo.insert(User(name="Foo"))
+    assert await repo.exists(Query(User).where(name="Foo"))
+    assert not await repo.exists(Query(User).where(name="Bar"))
+    assert await repo.exists(Query(User).limit(1))
+    assert not await repo.exists(Query(User).offset(1))
+
+
 @pytest.mark.asyncio
 async def test_insert_can_take_a_model(repo):
     user = await repo.insert(User(name="Foo"))
@@ -161,6 +514,18 @@ async def test_update_all(repo):
     assert await list_users(repo) == ["Buzz", "Buzz"]
 
 
+@pytest.mark.asyncio
+async def test_update_all_option_names(repo):
+    await repo.insert(User(name="Foo"))
+
+    # Values are kept apart from the options, so `progress` names a column.
+    with pytest.raises(CompileError, match="Unconsumed column names: progress"):
+        await repo.update_all(User, progress=0)
+
+    with pytest.raises(CompileError, match="Unconsumed column names: progress"):
+        await repo.update_all_with(User, {"progress": 0}, batch_size=1)
+
+
 @pytest.mark.asyncio
 async def test_update_all_query(repo):
     await repo.insert(User(name="Foo"))
@@ -170,6 +535,214 @@ async def test_update_all_query(repo):
     assert await list_users(repo) == ["Buzz", "Bar", "Buzz"]
 
 
+@pytest.mark.asyncio
+async def test_update_all_count(repo):
+    await repo.insert(User(name="Foo"))
+    await repo.insert(User(name="Foo"))
+    await repo.insert(User(name="Bar"))
+
+    assert await repo.update_all(Query(User).where(name="Foo"), name="Buzz") == 2
+    assert await repo.update_all(Query(User).where(name="Nope"), name="Buzz") == 0
+
+
+@pytest.mark.asyncio
+async def test_update_all_expressions(repo):
+    await repo.insert(Pet(name="A", age=1))
+    await repo.insert(Pet(name="B", age=5))
+
+    await repo.update_all(Query(Pet).where(name="A"), age=inc())
+    await repo.update_all(Query(Pet).where(name="B"), age=dec(2))
+    await repo.update_all(Pet, age=expr(lambda age: age * 10))
+
+    pets = await repo.all(Query(Pet).order_by("name"))
+    assert [pet.age for pet in pets] == [20, 30]
+
+
+@pytest.mark.asyncio
+async def test_update_all_returning(repo):
+    await repo.insert(Pet(name="A", age=1))
+    await repo.insert(Pet(name="B", age=1))
+
+    query = Query(Pet).where(name="A")
+    pets = await repo.update_all_with(query, {"age": inc()}, returning=True)
+    assert [(pet.name, pet.age) for pet in pets] == [("A", 2)]
+
+
+@pytest.mark.asyncio
+async def test_update_expressions(repo):
+    pet = await repo.insert(Pet(name="A", age=1))
+    changeset = Changeset(pet).cast({"name": "B"}, ["name"])
+
+    pet = await repo.update(changeset, age=inc(2))
+    assert (pet.name, pet.age) == ("B", 3)
+
+    pet = await repo.get(Pet, pet.id)
+    assert (pet.name, pet.age) == ("B", 3)
+
+
+@pytest.mark.asyncio
+async def test_save(repo):
+    user = await repo.save(User(name="Foo"))
+    assert user.id is not None
+    assert user.changed_attributes == {}
+
+    user = await repo.get(User, user.id)
+    user.name = "Bar"
+    user = await repo.save(user)
+    assert user.changed_attributes == {}
+    assert (await repo.get(User, user.id)).name == "Bar"
+
+
+@pytest.mark.asyncio
+async def test_save_unchanged(repo):
+    user = await repo.insert(User(name="Foo"))
+    await repo.update_all(User, name="Bar")
+
+    # Nothing changed locally, so the stale name is not written back.
+    await repo.save(user)
+    assert (await repo.get(User, user.id)).name == "Bar"
+
+
+@pytest.mark.asyncio
+async def test_save_applied_changes(repo):
+    user = await repo.insert(User(name="Foo"))
+    await repo.update_all(User, name="Bar")
+
+    user = Changeset(user).cast({"name": "Baz"}, ["name"]).apply_changes()
+    assert user.changed_attributes == {"name": "Baz"}
+
+    user = await repo.save(user)
+    assert user.changed_attributes == {}
+    assert await repo.count(User) == 1
+    assert (await repo.get(User, user.id)).name == "Baz"
+
+
+@pytest.mark.asyncio
+async def test_update_many(repo):
+    pets = [await repo.insert(Pet(name=name, age=1)) for name in ["A", "B", "C"]]
+    changesets = [
+        Changeset(pets[0]).cast({"name": "X", "age": 10}, ["name", "age"]),
+        Changeset(pets[1]).cast({"name": "Y", "age": 20}, ["name", "age"]),
+        Changeset(pets[2]).cast({"age": 30}, ["age"]),
+    ]
+
+    updated = await repo.update_many(changesets, batch_size=1)
+    assert [(pet.name, pet.age) for pet in updated] == [
+        ("X", 10),
+        ("Y", 20),
+        ("C", 30),
+    ]
+
+    pets = await repo.all(Query(Pet).order_by("id"))
+    assert [(pet.name, pet.age) for pet in pets] == [("X", 10), ("Y", 20), ("C", 30)]
+
+
+@pytest.mark.asyncio
+async def test_update_many_invalid(repo):
+    pets = [await repo.insert(Pet(name=name)) for name in ["A", "B"]]
+    changesets = [
+        Changeset(pets[0]).cast({"name": "X"}, ["name"]),
+        Changeset(pets[1]).cast({"age": "old"}, ["age"]),
+    ]
+
+    with pytest.raises(InvalidChangesetError):
+        await repo.update_many(changesets)
+
+    pets = await repo.all(Query(Pet).order_by("id"))
+    assert [pet.name for pet in pets] == ["A", "B"]
+
+
+@pytest.mark.asyncio
+async def test_delete_all_count(repo):
+    await repo.insert(User(name="Foo"))
+    await repo.insert(User(name="Bar"))
+    assert await repo.delete_all(Query(User).where(name="Foo")) == 1
+
+
+@pytest.mark.asyncio
+async def test_delete_all_batched(repo):
+    for name in ["A", "B", "C", "D", "E"]:
+        await repo.insert(User(name=name))
+
+    reports = []
+    query = Query(User).where(name__not_eq="E")
+    count = await repo.delete_all(query, batch_size=2, progress=reports.append)
+
+    assert count == 4
+    assert [report.affected for report in reports] == [2, 4]
+    assert [user.name for user in await repo.all(User)] == ["E"]
+
+
+@pytest.mark.asyncio
+async def test_delete_all_batched_resume(repo):
+    users = [await repo.insert(User(name=name)) for name in ["A", "B", "C"]]
+
+    count = await repo.delete_all(User, batch_size=2, after=users[0].id)
+    assert count == 2
+    assert [user.name for user in await repo.all(User)] == ["A"]
+
+
+@pytest.mark.asyncio
+async def test_update_all_batched(repo):
+    for name in ["A", "B", "C"]:
+        await repo.insert(Pet(name=name, age=1))
+
+    reports = []
+    pets = await repo.update_all_with(
+        Pet, {"age": inc()}, batch_size=2, returning=True, progress=reports.append
+    )
+
+    pets = sorted(pets, key=lambda pet: pet.id)
+    assert [(pet.name, pet.age) for pet in pets] == [("A", 2), ("B", 2), ("C", 2)]
+    assert [report.last_id for report in reports] == [pets[1].id, pets[2].id]
+
+
+@pytest.mark.asyncio
+async def test_delete_all_returning(repo):
+    await repo.insert(User(name="Foo"))
+    await repo.insert(User(name="Bar"))
+
+    users = await repo.delete_all(Query(User).where(name="Foo"), returning=True)
+    assert [user.name for user in users] == ["Foo"]
+    assert await repo.count(User) == 1
+
+
+@pytest.mark.asyncio
+async def test_claim(repo):
+    for name in ["A", "B", "C"]:
+        await repo.insert(User(name=name))
+
+    query = Query(User).where(name__in=["A", "B", "C"]).order_by("name")
+
+    users = await repo.claim(query.limit(2), name="claimed")
+    assert sorted(user.name for user in users) == ["claimed", "claimed"]
+
+    users = await repo.claim(query, name="claimed")
+    assert [user.name for user in users] == ["claimed"]
+
+    assert await repo.claim(query, name="claimed") == []
+    assert await repo.count(Query(User).where(name="claimed")) == 3
+
+
+@pytest.mark.asyncio
+async def test_claim_order(repo):
+    for name in ["A", "B", "C"]:
+        await repo.insert(Pet(name=name, age=1))
+
+    query = Query(Pet).where(age=1).order_by("-name").limit(2)
+    pets = await repo.claim(query, age=2)
+    assert [(pet.name, pet.age) for pet in pets] == [("C", 2), ("B", 2)]
+
+
+@pytest.mark.asyncio
+async def test_lock(repo):
+    await repo.insert(User(name="Fred"))
+
+    async with repo.transaction():
+        users = await repo.all(Query(User).lock(skip_locked=True))
+        assert [user.name for user in users] == ["Fred"]
+
+
 @pytest.mark.asyncio
 async def test_delete_all(repo):
     await repo.insert(User(name="Foo"))
@@ -262,6 +835,16 @@ async def test_preload_from_query(repo):
     assert home.owner.id == user.id
 
 
+@pytest.mark.asyncio
+async def test_preload_only(repo):
+    user = await repo.insert(User())
+    await repo.insert(Pet(name="Fido", owner_id=user.id))
+
+    pet = await repo.one(Query(Pet).only("name").preload("owner"))
+    assert pet.owner.id == user.id
+    assert pet._unloaded_columns() == {"age"}
+
+
 @pytest.mark.asyncio
 async def test_insert_from_valid_changeset(repo):
     changeset = Changeset(User()).cast({"name": "Richard"}, ["name"])
@@ -383,3 +966,601 @@ def handle_call(*args, **kwargs):
 
 async def list_users(repo):
     return [user.name for user in await repo.all(Query(User).order_by("id"))]
+
+
+@pytest.mark.asyncio
+async def test_aggregate(repo):
+    user = await repo.insert(User(name="Foo"))
+    for age in [1, 2, 6]:
+        await repo.insert(Pet(age=age, owner_id=user.id))
+
+    assert await repo.aggregate(Pet, "sum", "age") == 9
+    assert await repo.aggregate(Pet, "avg", "age") == 3
+    assert await repo.aggregate(Pet, "min", "age") == 1
+    assert await repo.aggregate(Query(Pet).where(age__lt=6), "max", "age") == 2
+    assert await repo.aggregate(Pet, "count") == 3
+    assert await repo.aggregate(Query(User).join("pets", "p"), "sum", "p__age") == 9
+
+
+@pytest.mark.asyncio
+async def test_aggregate_limit(repo):
+    for age in [1, 2, 6]:
+        await repo.insert(Pet(age=age))
+
+    query = Query(Pet).order_by("age").limit(2)
+    assert await repo.aggregate(query, "sum", "age") == 3
+
+    with pytest.raises(InvalidAggregateError):
+        await repo.aggregate(query, "median", "age")
+
+
+@pytest.mark.asyncio
+async def test_group_by(repo):
+    a = await repo.insert(User(name="A"))
+    b = await repo.insert(User(name="B"))
+    for owner, age in [(a, 1), (a, 3), (b, 5)]:
+        await repo.insert(Pet(age=age, owner_id=owner.id))
+
+    query = (
+        Query(User)
+        .join("pets", "p")
+        .group_by("name")
+        .having(count__p__id__gt=1)
+        .select(
+            {"name": "name", "pets": agg("count", "p__id"), "age": agg("sum", "p__age")}
+        )
+    )
+    assert await repo.all(query) == [{"name": "A", "pets": 2, "age": 4}]
+
+    query = Query(Pet).group_by("owner_id").order_by("owner_id")
+    query = query.select(("owner_id", agg("max", "age"))).as_records()
+    records = await repo.all(query)
+    assert [(r.owner_id, r.max) for r in records] == [(a.id, 3), (b.id, 5)]
+
+
+@pytest.mark.asyncio
+async def test_explain(repo):
+    plan = await repo.explain(Query(User).where(id=1))
+    assert any(node.index for node in plan.walk())
+
+
+@pytest.mark.asyncio
+async def test_explain_check(repo):
+    with pytest.warns(MissingIndexWarning, match="column 'name' is not indexed"):
+        await repo.explain(Query(User).where(name="Fred"), check=True)
+
+
+@pytest.mark.asyncio
+async def test_explain_check_raw(repo):
+    # The columns that raw SQL filters by are unknown, so none are checked.
+    query = Query(User).from_sql("SELECT * FROM users WHERE name = :name", name="A")
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", MissingIndexWarning)
+        plan = await repo.explain(query, check=True)
+    assert any(node.relation == "users" for node in plan.walk())
+
+
+@pytest.mark.asyncio
+async def test_all_columnar(repo):
+    await repo.insert(User(name="Foo"))
+    await repo.insert(User(name="Bar"))
+
+    result = await repo.all_columnar(Query(User).order_by("id"))
+    assert list(result) == ["id", "name"]
+    assert list(result["name"]) == ["Foo", "Bar"]
+
+
+@pytest.mark.asyncio
+async def test_all_columnar_select(repo):
+    user = await repo.insert(User(name="Foo"))
+    pet = await repo.insert(Pet(owner_id=user.id))
+
+    query = Query(User).join("pets", "p").select({"user": "id", "pet": "p__id"})
+    result = await repo.all_columnar(query)
+    assert list(result["user"]) == [user.id]
+    assert list(result["pet"]) == [pet.id]
+
+
+@pytest.mark.asyncio
+async def test_as_tuples(repo):
+    user = await repo.insert(User(name="Foo"))
+    assert await repo.all(Query(User).as_tuples()) == [(user.id, "Foo")]
+    assert await repo.all(Query(User).select("name").as_tuples()) == [("Foo",)]
+
+
+@pytest.mark.asyncio
+async def test_as_dicts(repo):
+    user = await repo.insert(User(name="Foo"))
+    assert await repo.all(Query(User).as_dicts()) == [{"id": user.id, "name": "Foo"}]
+
+
+@pytest.mark.asyncio
+async def test_as_records(repo):
+    user = await repo.insert(User(name="Foo"))
+    records = await repo.all(Query(User).as_records().preload("pets"))
+    assert records[0].id == user.id
+    assert records[0].name == "Foo"
+    assert type(records[0]).__name__ == "UserRecord"
+
+    records = await repo.all(Query(User).select({"user_name": "name"}).as_records())
+    assert records[0].user_name == "Foo"
+
+
+@pytest.mark.asyncio
+async def test_lazy(repo):
+    user = await repo.insert(User(name="Foo"))
+    await repo.insert(Pet(owner_id=user.id))
+
+    users = await repo.all(Query(User).lazy().preload("pets"))
+    assert users[0].name == "Foo"
+    assert len(users[0].pets) == 1
+
+    updated = await repo.update(Changeset(users[0]).cast({"name": "Bar"}, ["name"]))
+    assert updated.attributes == {"id": user.id, "name": "Bar"}
+
+
+@pytest.mark.asyncio
+async def test_paginate(repo):
+    for name in ["A", "B", "B", "C", "D"]:
+        await repo.insert(User(name=name))
+
+    query = Query(User).order_by("-name")
+    pages = []
+    cursor = None
+    while True:
+        users, cursor = await repo.paginate(query, 2, cursor)
+        pages.append([user.name for user in users])
+        if cursor is None:
+            break
+
+    assert pages == [["D", "C"], ["B", "B"], ["A"]]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("order", ["name", "-name"])
+async def test_paginate_nulls(repo, order):
+    for name in [None, "A", None, "B"]:
+        await repo.insert(User(name=name))
+
+    query = Query(User).order_by(order)
+    names = []
+    cursor = None
+    while True:
+        users, cursor = await repo.paginate(query, 1, cursor)
+        names.extend(user.name for user in users)
+        if cursor is None:
+            break
+
+    assert names == [user.name for user in await repo.all(query.order_by("id"))]
+
+
+@pytest.mark.asyncio
+async def test_paginate_tuples(repo):
+    with pytest.raises(InvalidCursorError, match="have no position"):
+        await repo.paginate(Query(User).as_tuples(), 1)
+
+
+@pytest.mark.asyncio
+async def test_paginate_dicts(repo):
+    await repo.insert(User(name="A"))
+    await repo.insert(User(name="B"))
+
+    query = Query(User).order_by("name").as_dicts()
+    users, cursor = await repo.paginate(query, 1)
+    assert [user["name"] for user in users] == ["A"]
+
+    users, cursor = await repo.paginate(query, 1, cursor)
+    assert [user["name"] for user in users] == ["B"]
+    assert cursor is None
+
+
+@pytest.mark.asyncio
+async def test_page(repo):
+    for name in ["A", "B", "C"]:
+        user = await repo.insert(User(name=name))
+        await repo.insert(Pet(name=name, owner_id=user.id))
+
+    query = Query(User).order_by("name").preload("pets")
+    users, total = await repo.page(query, 2)
+    assert [user.name for user in users] == ["A", "B"]
+    assert users[0].pets[0].name == "A"
+    assert total == 3
+
+    names, total = await repo.page(Query(User).order_by("name").select("name"), 2, 2)
+    assert names == ["C"]
+    assert total == 3
+
+    assert await repo.page(query, 2, 10) == ([], 3)
+    assert await repo.page(query.where(name="D"), 2) == ([], 0)
+
+
+@pytest.mark.asyncio
+async def test_page_compound(repo):
+    for name in ["A", "B", "C"]:
+        await repo.insert(User(name=name))
+
+    query = Query(User).where(name="A").union(Query(User).where(name="C"))
+    users, total = await repo.page(query.order_by("name"), 1, 1)
+    assert [user.name for user in users] == ["C"]
+    assert total == 2
+
+
+@pytest.mark.asyncio
+async def test_page_raw(repo):
+    for name in ["A", "B", "C"]:
+        await repo.insert(User(name=name))
+
+    query = Query(User).from_sql("SELECT * FROM users WHERE name != 'B'")
+    users, total = await repo.page(query.order_by("name"), 1)
+    assert [user.name for user in users] == ["A"]
+    assert total == 2
+
+    users, total = await repo.page(query.order_by("name"), 1, 1)
+    assert [user.name for user in users] == ["C"]
+    assert total == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("prefetch", [False, True])
+async def test_chunked(repo, prefetch):
+    for name in ["A", "B", "C", "D"]:
+        user = await repo.insert(User(name=name))
+        await repo.insert(Pet(owner_id=user.id))
+
+    query = Query(User).order_by("-name").preload("pets")
+    chunks = [chunk async for chunk in repo.chunked(query, size=2, prefetch=prefetch)]
+    assert [[user.name for user in chunk] for chunk in chunks] == [
+        ["A", "B"],
+        ["C", "D"],
+    ]
+    assert all(len(user.pets) == 1 for chunk in chunks for user in chunk)
+
+
+@pytest.mark.asyncio
+async def test_chunked_partial(repo):
+    for name in ["A", "B", "C"]:
+        await repo.insert(User(name=name))
+
+    chunks = [chunk async for chunk in repo.chunked(User, size=2)]
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+
+
+@pytest.mark.asyncio
+async def test_chunked_dicts(repo):
+    for name in ["A", "B", "C"]:
+        await repo.insert(User(name=name))
+
+    query = Query(User).as_dicts()
+    chunks = [chunk async for chunk in repo.chunked(query, size=2)]
+    assert [[user["name"] for user in chunk] for chunk in chunks] == [["A", "B"], ["C"]]
+
+    for query in [Query(User).as_tuples(), Query(User).select(("id", "name"))]:
+        with pytest.raises(InvalidCursorError, match="have no position"):
+            [chunk async for chunk in repo.chunked(query)]
+
+
+@pytest.mark.asyncio
+async def test_chunked_repeated_key(repo):
+    for name in ["A", "A", "B", "B", "C", "C"]:
+        await repo.insert(User(name=name))
+
+    chunks = [chunk async for chunk in repo.chunked(User, size=2, key="name")]
+    assert [[user.name for user in chunk] for chunk in chunks] == [
+        ["A", "A"],
+        ["B", "B"],
+        ["C", "C"],
+    ]
+
+    chunks = [chunk async for chunk in repo.chunked(User, size=3, key="name")]
+    assert [len(chunk) for chunk in chunks] == [3, 3]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("prefetch", [False, True])
+async def test_chunked_break(repo, prefetch):
+    for name in ["A", "B", "C"]:
+        await repo.insert(User(name=name))
+
+    async for chunk in repo.chunked(User, size=1, prefetch=prefetch):
+        assert chunk[0].name == "A"
+        break
+
+
+@pytest.mark.asyncio
+async def test_multi(repo):
+    user = await repo.insert(User(name="Old"))
+
+    async def rename(repo, results):
+        return await repo.update_all(Query(Pet).where(name="A"), name="Z")
+
+    multi = (
+        Multi()
+        .insert("a", User(name="A"))
+        .insert("b", Changeset(User()).cast({"name": "B"}, ["name"]))
+        .insert("pet", lambda results: Pet(name="A", owner_id=results["b"].id))
+        .update("user", Changeset(user).cast({"name": "New"}, ["name"]))
+        .delete("deleted", lambda results: results["user"])
+        .run("rename", rename)
+    )
+
+    results = await repo.multi(multi)
+    assert results["a"].name == "A"
+    assert results["b"].name == "B"
+    assert results["a"].id + 1 == results["b"].id
+    assert results["pet"].owner_id == results["b"].id
+    assert results["user"].name == "New"
+
+    users = await repo.all(Query(User).order_by("id"))
+    assert [(u.id, u.name) for u in users] == [
+        (results["a"].id, "A"),
+        (results["b"].id, "B"),
+    ]
+
+    pet = await repo.one(Pet)
+    assert pet.name == "Z"
+
+
+@pytest.mark.asyncio
+async def test_multi_merges_inserts(repo):
+    multi = Multi()
+    for name in ["A", "B", "C"]:
+        multi = multi.insert(name, User(name=name))
+
+    results = await repo.multi(multi)
+    users = await repo.all(Query(User).order_by("id"))
+    assert [(u.id, u.name) for u in users] == [
+        (results[name].id, name) for name in ["A", "B", "C"]
+    ]
+
+
+@pytest.mark.asyncio
+async def test_multi_inserts_with_gaps(repo):
+    if repo.database.url.dialect != "sqlite":
+        pytest.skip("the trigger is written for SQLite")
+
+    # Another row takes the next ID after "A", so the IDs of the inserted
+    # rows aren't consecutive.
+    await repo.database.execute(
+        "CREATE TRIGGER gap AFTER INSERT ON users WHEN NEW.name = 'A' "
+        "BEGIN INSERT INTO users (name) VALUES ('gap'); END"
+    )
+    try:
+        multi = Multi().insert("a", User(name="A")).insert("b", User(name="B"))
+        results = await repo.multi(multi)
+        for name in ["a", "b"]:
+            user = await repo.get(User, results[name].id)
+            assert user.name == results[name].name
+    finally:
+        await repo.database.execute("DROP TRIGGER gap")
+
+
+@pytest.mark.asyncio
+async def test_multi_merges_inserts_by_table(repo):
+    multi = (
+        Multi()
+        .insert("a", User(id=10, name="A"))
+        .insert("b", User(id=11, name="B"))
+        .insert("pet", Pet(name="P", owner_id=10))
+        .insert("c", User(name="C"))
+    )
+
+    results = await repo.multi(multi)
+    assert [results[name].id for name in ["a", "b"]] == [10, 11]
+    assert results["pet"].owner_id == 10
+    assert await repo.count(User) == 3
+
+
+@pytest.mark.asyncio
+async def test_multi_rollback_database_error(repo):
+    multi = (
+        Multi()
+        .insert("user", User(name="A"))
+        .insert("duplicate", lambda results: User(id=results["user"].id))
+    )
+
+    with pytest.raises(MultiStepError, match="step 'duplicate' failed") as info:
+        await repo.multi(multi)
+
+    assert list(info.value.results) == ["user"]
+    assert await repo.count(User) == 0
+
+
+@pytest.mark.asyncio
+async def test_multi_rollback(repo):
+    multi = (
+        Multi()
+        .insert("user", User(name="A"))
+        .insert("invalid", Changeset(User()).validate_required(["name"]))
+    )
+
+    with pytest.raises(MultiStepError) as info:
+        await repo.multi(multi)
+
+    assert info.value.step == "invalid"
+    assert isinstance(info.value.error, InvalidChangesetError)
+    assert await repo.count(User) == 0
+
+
+@pytest.mark.asyncio
+async def test_multi_rollback_function(repo):
+    multi = (
+        Multi()
+        .insert("user", User(name="A"))
+        .update("missing", lambda results: results["missing"])
+    )
+
+    with pytest.raises(MultiStepError, match="step 'missing' failed"):
+        await repo.multi(multi)
+
+    assert await repo.count(User) == 0
+
+
+@pytest.mark.asyncio
+async def test_transaction(repo):
+    async with repo.transaction():
+        await repo.insert(User(name="A"))
+
+        with pytest.raises(RuntimeError):
+            async with repo.transaction():
+                await repo.insert(User(name="B"))
+                raise RuntimeError()
+
+    users = await repo.all(User)
+    assert [user.name for user in users] == ["A"]
+
+
+@pytest.mark.asyncio
+async def test_transaction_rollback(repo):
+    with pytest.raises(RuntimeError):
+        async with repo.transaction():
+            await repo.insert(User(name="A"))
+            raise RuntimeError()
+
+    assert await repo.count(User) == 0
+
+
+@pytest.mark.asyncio
+async def test_transaction_shared_database(repo):
+    other = Repo(repo.database)
+
+    with pytest.raises(RuntimeError):
+        async with repo.transaction():
+            await other.insert(User(name="A"))
+            raise RuntimeError()
+
+    assert await other.count(User) == 0
+
+
+@pytest.mark.asyncio
+async def test_transaction_retry(repo):
+    attempts = []
+
+    @repo.transaction(retry=Retry(attempts=3, base_delay=0))
+    async def insert(name):
+        await repo.insert(User(name=name))
+        attempts.append(name)
+        if len(attempts) < 3:
+            raise Exception(1213, "Deadlock found when trying to get lock")
+
+    await insert("A")
+    assert len(attempts) == 3
+    assert await repo.count(User) == 1
+
+
+@pytest.mark.asyncio
+async def test_transaction_retry_nested(repo):
+    attempts = []
+
+    @repo.transaction(retry=Retry(attempts=3, base_delay=0))
+    async def fail():
+        attempts.append(1)
+        raise Exception(1213, "Deadlock found when trying to get lock")
+
+    with pytest.raises(Exception, match="Deadlock"):
+        async with repo.transaction():
+            await fail()
+
+    assert len(attempts) == 1
+
+
+@pytest.mark.asyncio
+async def test_transaction_retry_exhausted(repo):
+    attempts = []
+
+    @repo.transaction(retry=Retry(attempts=2, base_delay=0))
+    async def fail():
+        attempts.append(1)
+        raise Exception(1213, "Deadlock found when trying to get lock")
+
+    with pytest.raises(Exception, match="Deadlock"):
+        await fail()
+
+    assert len(attempts) == 2
+
+
+@pytest.mark.asyncio
+async def test_transaction_retry_context_manager(repo):
+    with pytest.raises(TypeError):
+        async with repo.transaction(retry=Retry()):
+            pass
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("size", [2, 500])
+async def test_insert_coalesce(repo, size):
+    repo = Repo(repo.database, coalesce=True, coalesce_size=size)
+    names = ["A", "B", "C", "D", "E"]
+    users = await asyncio.gather(*[repo.insert(User(name=name)) for name in names])
+
+    assert [user.name for user in users] == names
+    assert len({user.id for user in users}) == len(names)
+
+    for user in users:
+        assert (await repo.get(User, user.id)).name == user.name
+
+
+@pytest.mark.asyncio
+async def test_insert_coalesce_failure(repo):
+    repo = Repo(repo.database, coalesce=True)
+    results = await asyncio.gather(
+        repo.insert(User(id=100, name="A")),
+        repo.insert(User(id=100, name="B")),
+        repo.insert(User(id=101, name="C")),
+        return_exceptions=True,
+    )
+
+    assert results[0].name == "A"
+    assert isinstance(results[1], Exception)
+    assert results[2].name == "C"
+    assert await repo.count(User) == 2
+
+
+@pytest.mark.asyncio
+async def test_insert_coalesce_transaction(repo):
+    repo = Repo(repo.database, coalesce=True, coalesce_window=60)
+    async with repo.transaction():
+        user = await repo.insert(User(name="A"))
+
+    assert user.id is not None
+
+
+def _user_name(user):
+    return user.name
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("url", DATABASE_URLS)
+@pytest.mark.parametrize("ordered", [True, False])
+@pytest.mark.parametrize("executor", [None, ThreadPoolExecutor])
+async def test_parallel_map(url, ordered, executor):
+    if executor is not None:
+        executor = executor(2)
+
+    async with Database(url) as database:
+        repo = Repo(database)
+        try:
+            for name in ["A", "B", "C", "D", "E"]:
+                await repo.insert(User(name=name))
+
+            query = Query(User).where(name__not_eq="E")
+            results = repo.parallel_map(
+                query, _user_name, partitions=2, ordered=ordered, executor=executor
+            )
+            names = [name async for name in results]
+
+            if ordered:
+                assert names == ["A", "B", "C", "D"]
+            else:
+                assert sorted(names) == ["A", "B", "C", "D"]
+        finally:
+            await repo.delete_all(User)
+
+
+@pytest.mark.asyncio
+async def test_parallel_map_empty(repo):
+    assert [name async for name in repo.parallel_map(User, _user_name)] == []
+
+
+@pytest.mark.asyncio
+async def test_preload_empty(repo):
+    assert await repo.all(Query(User).preload("pets")) == []
@@ -0,0 +1,21 @@
+import sqlite3
+
+from datamapper.transaction import Retry, is_retryable
+
+
+class SerializationError(Exception):
+    sqlstate = "40001"
+
+
+def test_retry_delay():
+    retry = Retry(base_delay=0.1, max_delay=0.3)
+    assert 0 <= retry.delay(1) <= 0.2
+    assert all(0 <= retry.delay(10) <= 0.3 for _ in range(10))
+
+
+def test_is_retryable():
+    assert is_retryable(SerializationError())
+    assert is_retryable(Exception(1213, "Deadlock found when trying to get lock"))
+    assert is_retryable(sqlite3.OperationalError("database is locked"))
+    assert not is_retryable(Exception(1062, "Duplicate entry"))
+    assert not is_retryable(ValueError("invalid"))